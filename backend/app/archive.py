@@ -0,0 +1,255 @@
+"""
+Hot/cold history tiering for Finance Dashboard.
+
+Closed months are moved out of finance.db into one archive file per year
+(archive_YYYY.db). Each archive keeps the raw transactions and items (still
+searchable and listable) plus a frozen `daily_summary` rollup, so summaries
+over old periods read a few pre-aggregated rows instead of scanning history.
+
+finance.db keeps a small manifest (`archive_partitions`) with the day range of
+every archive. Read functions consult it and only open the archives a date
+range actually overlaps; the 1D/7D/1M dashboard presets never touch them.
+Archived rows are read-only.
+
+Move everything before the last three months into archives with:
+
+    python -m app.archive --db /data/finance.db --archive-dir /data/archive --keep-months 3
+"""
+import argparse
+import os
+import sqlite3
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from . import shards
+
+MANIFEST_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS archive_partitions (
+        path TEXT PRIMARY KEY,
+        first_day INTEGER NOT NULL,
+        last_day INTEGER NOT NULL,
+        row_count INTEGER NOT NULL,
+        archived_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+'''
+
+SUMMARY_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {schema}.daily_summary (
+        email_user TEXT,
+        date_day INTEGER NOT NULL,
+        category TEXT,
+        platform TEXT,
+        total REAL NOT NULL,
+        count INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS {schema}.idx_daily_summary_user_day ON daily_summary(email_user, date_day);
+'''
+
+
+# Output column of summary_rows for each grouping
+_GROUP_COLUMNS = {
+    'category': ('category', 'category'),
+    'platform': ('platform', 'platform'),
+    'date': ("date(date_day * 86400, 'unixepoch')", 'date_day'),
+}
+
+
+def init_manifest(cursor) -> None:
+    cursor.executescript(MANIFEST_SCHEMA)
+
+
+def archive_filename(year: int) -> str:
+    return f"archive_{year}.db"
+
+
+def partitions_for(cursor, filters: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Archive files whose day range overlaps the date filters, newest first."""
+    from .database import _DAY_PARAM_SQL
+
+    query = "SELECT path FROM archive_partitions WHERE 1=1"
+    params = []
+    if filters:
+        if filters.get('date_from'):
+            query += f" AND last_day >= {_DAY_PARAM_SQL}"
+            params.append(filters['date_from'])
+        if filters.get('date_to'):
+            query += f" AND first_day <= {_DAY_PARAM_SQL}"
+            params.append(filters['date_to'])
+    query += " ORDER BY first_day DESC"
+    cursor.execute(query, params)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def summary_rows(paths: List[str], filters: Optional[Dict[str, Any]], group: Optional[str]) -> List[Dict]:
+    """Totals from the frozen daily_summary of each archive in `paths`.
+
+    `group` is 'category', 'platform', 'date' or None for a single total; rows
+    have the same shape as the live GROUP BY queries so they can be merged.
+    """
+    from .database import _DAY_PARAM_SQL
+
+    where = "WHERE 1=1"
+    params: List[Any] = []
+    if filters:
+        if filters.get('date_from'):
+            where += f" AND date_day >= {_DAY_PARAM_SQL}"
+            params.append(filters['date_from'])
+        if filters.get('date_to'):
+            where += f" AND date_day <= {_DAY_PARAM_SQL}"
+            params.append(filters['date_to'])
+        if group is not None and filters.get('platform'):
+            where += " AND platform = ?"
+            params.append(filters['platform'])
+        if group is not None and filters.get('category'):
+            if isinstance(filters['category'], list):
+                placeholders = ', '.join(['?'] * len(filters['category']))
+                where += f" AND category IN ({placeholders})"
+                params.extend(filters['category'])
+            else:
+                where += " AND category = ?"
+                params.append(filters['category'])
+        if filters.get('email'):
+            where += " AND email_user = ?"
+            params.append(filters['email'])
+
+    if group is None:
+        query = f"SELECT COALESCE(SUM(total), 0) as total FROM daily_summary {where}"
+    else:
+        expression, group_by = _GROUP_COLUMNS[group]
+        query = f'''
+            SELECT {expression} as {group}, SUM(total) as total, SUM(count) as count
+            FROM daily_summary {where} GROUP BY {group_by}
+        '''
+
+    rows: List[Dict] = []
+    for path in paths:
+        conn = sqlite3.connect(path, timeout=20)
+        try:
+            cursor = conn.execute(query, params)
+            names = [col[0] for col in cursor.description]
+            rows.extend(dict(zip(names, row)) for row in cursor.fetchall())
+        finally:
+            conn.close()
+    return rows
+
+
+def _first_day(year: int, month: int) -> int:
+    return (date(year, month, 1) - date(1970, 1, 1)).days
+
+
+def cutoff_day(keep_months: int, today: Optional[date] = None) -> int:
+    """Day number of the first day of the oldest month that stays hot."""
+    today = today or date.today()
+    months = today.year * 12 + (today.month - 1) - keep_months
+    return _first_day(months // 12, months % 12 + 1)
+
+
+def archive_before(db_path: str, archive_dir: str, before_day: int) -> Dict[int, int]:
+    """Move transactions dated before day `before_day` into yearly archives.
+
+    Returns the number of transactions moved per year. Rows without a
+    parsable date are never archived.
+    """
+    from . import database
+
+    if shards.enabled():
+        raise RuntimeError("Archiving is not supported together with per-user shards")
+
+    os.makedirs(archive_dir, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=20)
+    moved: Dict[int, int] = {}
+    try:
+        cursor = conn.cursor()
+        init_manifest(cursor)
+        cursor.execute('''
+            SELECT DISTINCT CAST(strftime('%Y', date_day * 86400, 'unixepoch') AS INTEGER)
+            FROM transactions WHERE date_day < ? ORDER BY 1
+        ''', (before_day,))
+        years = [row[0] for row in cursor.fetchall()]
+
+        for year in years:
+            path = os.path.abspath(os.path.join(archive_dir, archive_filename(year)))
+            shards.copy_table_schema(cursor, path)
+            database.migrate_partition(path)
+
+            first = _first_day(year, 1)
+            last = min(_first_day(year + 1, 1), before_day) - 1
+            selected = "SELECT id FROM main.transactions WHERE date_day BETWEEN ? AND ?"
+
+            conn.execute("ATTACH DATABASE ? AS archive", (path,))
+            try:
+                conn.executescript(SUMMARY_SCHEMA.format(schema='archive'))
+                tx_cols = ', '.join(shards._columns(conn, 'archive', 'transactions'))
+                item_cols = ', '.join(shards._columns(conn, 'archive', 'items'))
+
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO archive.transactions ({tx_cols})
+                    SELECT {tx_cols} FROM main.transactions WHERE id IN ({selected})
+                ''', (first, last))
+                moved[year] = conn.execute("SELECT changes()").fetchone()[0]
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO archive.items ({item_cols})
+                    SELECT {item_cols} FROM main.items WHERE transaction_id IN ({selected})
+                ''', (first, last))
+                conn.execute('''
+                    INSERT OR REPLACE INTO archive.parsed_items (transaction_id, description_hash, items)
+                    SELECT transaction_id, description_hash, items FROM main.parsed_items
+                    WHERE transaction_id IN ({selected})
+                '''.format(selected=selected), (first, last))
+                conn.execute('''
+                    INSERT INTO archive.daily_summary (email_user, date_day, category, platform, total, count)
+                    SELECT email_user, date_day, category, platform, SUM(amount), COUNT(*)
+                    FROM main.transactions WHERE date_day BETWEEN ? AND ?
+                    GROUP BY email_user, date_day, category, platform
+                ''', (first, last))
+
+                conn.execute(f"DELETE FROM main.items WHERE transaction_id IN ({selected})", (first, last))
+                conn.execute("DELETE FROM main.transactions WHERE date_day BETWEEN ? AND ?", (first, last))
+
+                conn.execute('''
+                    INSERT INTO archive_partitions (path, first_day, last_day, row_count)
+                    SELECT ?, MIN(date_day), MAX(date_day), COUNT(*) FROM archive.transactions WHERE 1
+                    ON CONFLICT(path) DO UPDATE SET
+                        first_day = excluded.first_day,
+                        last_day = excluded.last_day,
+                        row_count = excluded.row_count,
+                        archived_at = CURRENT_TIMESTAMP
+                ''', (path,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.execute("DETACH DATABASE archive")
+
+            # Archives are written once; compact them
+            archive_conn = sqlite3.connect(path, timeout=20)
+            try:
+                archive_conn.execute("VACUUM")
+            finally:
+                archive_conn.close()
+    finally:
+        conn.close()
+    return moved
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move closed months of finance.db into yearly archives.")
+    parser.add_argument("--db", default="/data/finance.db", help="Path to finance.db")
+    parser.add_argument("--archive-dir", required=True, help="Directory for the archive_YYYY.db files")
+    parser.add_argument("--keep-months", type=int, default=3,
+                        help="Full months (besides the current one) to keep in finance.db")
+    args = parser.parse_args()
+
+    from . import database
+    database.DB_PATH = args.db
+    database.init_db()
+
+    moved = archive_before(args.db, args.archive_dir, cutoff_day(args.keep_months))
+    for year, count in moved.items():
+        print(f"{year}: {count} transactions archived")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Cross-process result cache for Finance Dashboard.
+
+Entries live in a small SQLite file (CACHE_PATH, FINANCE_CACHE_PATH in the
+environment) shared by every worker process, fronted by a per-process dict.
+Each entry is tagged with the data generation of finance.db (see
+database.get_data_version), which triggers bump on every write to
+transactions, items or categories - including writes made by the finance
+agent - so a write anywhere invalidates cached results in all workers. Keys
+also carry the database's identity, so other databases using the same cache
+file (benchmarks, CLIs, a recreated finance.db) never share entries.
+"""
+import functools
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+import orjson
+
+CACHE_PATH = os.environ.get("FINANCE_CACHE_PATH", "/tmp/finance_cache.db")
+
+# Per-process entries; values are stored serialized so callers can never
+# mutate a shared object.
+_local: Dict[Tuple[str, int], bytes] = {}
+_LOCAL_MAX_ENTRIES = 512
+_local_lock = threading.Lock()
+_conn_state = threading.local()
+
+
+def _cache_conn() -> sqlite3.Connection:
+    """One connection to the shared cache file per thread."""
+    conn = getattr(_conn_state, 'conn', None)
+    if conn is None or getattr(_conn_state, 'path', None) != CACHE_PATH:
+        conn = sqlite3.connect(CACHE_PATH, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL,
+                value BLOB NOT NULL
+            )
+        ''')
+        _conn_state.conn = conn
+        _conn_state.path = CACHE_PATH
+    return conn
+
+
+def get(key: str, generation: int):
+    """Return the cached bytes for `key` at `generation`, or None."""
+    value = _local.get((key, generation))
+    if value is not None:
+        return value
+    try:
+        row = _cache_conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND generation = ?", (key, generation)
+        ).fetchone()
+    except sqlite3.Error:
+        return None
+    if row is None:
+        return None
+    _remember(key, generation, row[0])
+    return row[0]
+
+
+def put(key: str, generation: int, value: bytes, scope: str = '') -> None:
+    """Store `value` for `key` at `generation` locally and in the shared file.
+
+    Older generations of keys starting with `scope` are dropped.
+    """
+    _remember(key, generation, value)
+    try:
+        conn = _cache_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, generation, value) VALUES (?, ?, ?)",
+            (key, generation, value),
+        )
+        conn.execute("DELETE FROM cache WHERE generation < ? AND substr(key, 1, ?) = ?",
+                     (generation, len(scope), scope))
+    except sqlite3.Error:
+        # The shared tier is best effort; a busy cache file must not fail a request
+        pass
+
+
+def clear() -> None:
+    """Drop every cached entry in this process and in the shared file."""
+    with _local_lock:
+        _local.clear()
+    try:
+        _cache_conn().execute("DELETE FROM cache")
+    except sqlite3.Error:
+        pass
+
+
+def _remember(key: str, generation: int, value: bytes) -> None:
+    with _local_lock:
+        if len(_local) >= _LOCAL_MAX_ENTRIES:
+            # Entries of older generations can never be hit again
+            for stale in [k for k in _local if k[1] < generation]:
+                del _local[stale]
+            if len(_local) >= _LOCAL_MAX_ENTRIES:
+                _local.clear()
+        _local[(key, generation)] = value
+
+
+def cached(version: Callable[[], Tuple[str, int]]):
+    """Cache a function's JSON-serializable result until `version()` changes.
+
+    `version` returns (scope, generation): the scope identifies the database
+    and prefixes every key, the generation invalidates its entries.
+    """
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            scope, gen = version()
+            scope += '|'
+            key = scope + fn.__name__ + ':' + orjson.dumps([args, kwargs], option=orjson.OPT_SORT_KEYS).decode()
+            hit = get(key, gen)
+            if hit is not None:
+                return orjson.loads(hit)
+            result = fn(*args, **kwargs)
+            put(key, gen, orjson.dumps(result), scope)
+            return result
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
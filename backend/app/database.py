@@ -2,19 +2,33 @@
 Database module for Finance Dashboard.
 Handles SQLite database operations.
 """
+import calendar
+import functools
+import os
+import re
 import sqlite3
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+import threading
+import zlib
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import date, datetime, timedelta
 from contextlib import contextmanager
 
+import orjson
+
+from . import archive, profiling, shards
+from .cache import cached
+from .writer import WriteQueue
+
 DB_PATH = "/data/finance.db"
+DEFAULT_EMAIL = "ice@imice.im"
 
 
 @contextmanager
-def get_db_connection():
-    """Context manager for database connections."""
-    conn = sqlite3.connect(DB_PATH, timeout=20)
+def get_db_connection(path: Optional[str] = None):
+    """Context manager for database connections (finance.db unless a shard `path` is given)."""
+    conn = sqlite3.connect(path or DB_PATH, timeout=20)
     conn.row_factory = sqlite3.Row
+    finish_trace = profiling.trace(conn, path or DB_PATH)
     try:
         yield conn
         conn.commit()
@@ -22,9 +36,59 @@ def get_db_connection():
         conn.rollback()
         raise e
     finally:
+        finish_trace()
         conn.close()
 
 
+def _connect_writer(path: Optional[str] = None) -> sqlite3.Connection:
+    conn = sqlite3.connect(path or DB_PATH, timeout=20, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+# Every mutation below runs on a single writer thread per database file (see app.writer)
+writer = WriteQueue(_connect_writer, prepare=lambda conn: profiling.trace(conn, DB_PATH))
+_shard_writers: Dict[str, WriteQueue] = {}
+_shard_writers_lock = threading.Lock()
+
+
+def _writer_for(path: Optional[str]) -> WriteQueue:
+    if path is None or path == DB_PATH:
+        return writer
+    with _shard_writers_lock:
+        if path not in _shard_writers:
+            _shard_writers[path] = WriteQueue(lambda: _connect_writer(path),
+                                              prepare=lambda conn: profiling.trace(conn, path))
+        return _shard_writers[path]
+
+
+def stop_writers() -> None:
+    """Flush and stop the writer threads of finance.db and every shard."""
+    writer.stop()
+    with _shard_writers_lock:
+        for shard_writer in _shard_writers.values():
+            shard_writer.stop()
+
+
+# (cursor.description, column names) of the last result set _dict_row saw. Holding
+# the description keeps its identity from being reused by another result set.
+_row_names: Tuple[Any, Tuple[str, ...]] = (None, ())
+
+
+def _dict_row(cursor, row) -> Dict[str, Any]:
+    """Row factory building plain dicts directly, without an intermediate sqlite3.Row.
+
+    Column names are taken from cursor.description once per result set, not once per row.
+    """
+    global _row_names
+    description, names = _row_names
+    if cursor.description is not description:
+        description = cursor.description
+        names = tuple(col[0] for col in description)
+        _row_names = (description, names)
+    return dict(zip(names, row))
+
+
 def init_db():
     """Initialize categories if needed."""
     with get_db_connection() as conn:
@@ -62,8 +126,376 @@ def init_db():
 
         cursor.execute('SELECT COUNT(*) FROM categories')
         if cursor.fetchone()[0] == 0:
-            for category in default_categories:
-                cursor.execute('INSERT OR IGNORE INTO categories (name, type, color) VALUES (?, ?, ?)', category)
+            cursor.executemany('INSERT OR IGNORE INTO categories (name, type, color) VALUES (?, ?, ?)',
+                               default_categories)
+
+        _migrate_date_columns(cursor)
+        _migrate_data_generation(cursor)
+        _migrate_parsed_items(cursor)
+        archive.init_manifest(cursor)
+
+        shard_paths = []
+        if shards.enabled():
+            shards.init_directory(cursor)
+            shards.init_change_log(cursor)
+            shard_paths = list(shards.list_shards(cursor).values())
+
+    for path in shard_paths:
+        migrate_partition(path)
+
+
+def migrate_partition(path: str) -> None:
+    """Bring a shard or archive file's schema, triggers, search index and rollups up to date."""
+    from .distribution import init_distribution_sketches
+    from .item_stats import init_item_stats
+    from .search import init_search_index
+
+    outdated = _schema_version(path) != SCHEMA_VERSION
+    with get_db_connection(path) as conn:
+        cursor = conn.cursor()
+        _migrate_date_columns(cursor)
+        _migrate_data_generation(cursor)
+        _migrate_parsed_items(cursor)
+    init_search_index(path)
+    init_item_stats(path)
+    init_distribution_sketches(path)
+    if outdated:
+        _set_schema_version(path)
+
+
+# Stored in PRAGMA user_version once a file has been migrated. Triggers are
+# recreated and parsed items backfilled on every start regardless; the version
+# only gates full-table data migrations, so bump it when one of those changes
+# (currently the date_epoch/date_day normalization).
+SCHEMA_VERSION = 2
+
+
+def _schema_version(path: Optional[str] = None) -> int:
+    with get_db_connection(path) as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _set_schema_version(path: Optional[str] = None) -> None:
+    with get_db_connection(path) as conn:
+        # Until the agent has created transactions there was nothing to migrate;
+        # leave the version alone so its first rows are migrated on the next start
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='transactions'").fetchone():
+            conn.execute(f"PRAGMA user_version = {int(SCHEMA_VERSION)}")
+
+
+def bootstrap() -> None:
+    """Set up finance.db (and shards) for this version of the service.
+
+    Every start recreates the triggers and parses items for rows the agent
+    wrote since the last one; tables, indexes and rollups are only built when
+    missing. Full-table data migrations run when the file's version differs
+    from SCHEMA_VERSION, so a finance.db recreated by the agent (version 0)
+    is migrated again.
+    """
+    from .distribution import init_distribution_sketches
+    from .item_stats import init_item_stats
+    from .rules import init_rules
+    from .search import init_search_index
+
+    outdated = _schema_version() != SCHEMA_VERSION
+    init_db()
+    init_rules()
+    init_search_index()
+    init_item_stats()
+    init_distribution_sketches()
+    if outdated:
+        _set_schema_version()
+
+
+# Normalized timestamp of a transaction date. The finance agent writes `date`
+# as free-form TEXT (plain dates, "YYYY-MM-DD HH:MM:SS", ISO with offsets) and
+# occasionally as a unix timestamp, so everything is folded into epoch seconds
+# here. The column has TEXT affinity, so timestamps arrive as digit-only text.
+# Only built-in SQL functions are used because the triggers below also fire
+# for rows written by the agent's own connection.
+_EPOCH_SQL = (
+    "CASE WHEN typeof({col}) IN ('integer', 'real') "
+    "OR ({col} GLOB '[0-9]*' AND {col} NOT GLOB '*[^0-9.]*') THEN CAST({col} AS INTEGER) "
+    "ELSE CAST(strftime('%s', {col}) AS INTEGER) END"
+)
+
+# Day number (days since 1970-01-01) of a transaction. ISO dates keep the local
+# calendar day they were written with, so '2024-02-01T01:00:00+07:00' is
+# 2024-02-01 like the plain string comparison it replaced; only timestamps
+# fall back to the UTC day.
+_DAY_SQL = (
+    "CASE WHEN {col} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*' "
+    "THEN CAST(strftime('%s', substr({col}, 1, 10)) AS INTEGER) / 86400 "
+    f"ELSE ({_EPOCH_SQL}) / 86400 END"
+)
+
+# Day number of a bound filter value such as date_from.
+_DAY_PARAM_SQL = "CAST(strftime('%s', substr(?, 1, 10)) AS INTEGER) / 86400"
+
+# Columns added to the agent's transactions table for indexing only; never returned by the API
+_INTERNAL_COLUMNS = ('date_epoch', 'date_day')
+
+
+def _recreate_trigger(cursor, name: str, definition: str) -> None:
+    """Replace trigger `name` so files set up by an older version get the current body.
+
+    Dropped and created in one savepoint so agent writes never run without it.
+    """
+    cursor.execute("SAVEPOINT recreate_trigger")
+    cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    cursor.execute(f"CREATE TRIGGER {name} {definition}")
+    cursor.execute("RELEASE recreate_trigger")
+
+
+def _migrate_date_columns(cursor):
+    """Add indexed date_epoch/date_day columns to transactions and backfill them."""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='transactions'")
+    if not cursor.fetchone():
+        return
+
+    cursor.execute("PRAGMA table_info(transactions)")
+    columns = {row['name'] for row in cursor.fetchall()}
+    if 'date_epoch' not in columns:
+        cursor.execute("ALTER TABLE transactions ADD COLUMN date_epoch INTEGER")
+    if 'date_day' not in columns:
+        cursor.execute("ALTER TABLE transactions ADD COLUMN date_day INTEGER")
+
+    epoch, day = _EPOCH_SQL.format(col='NEW.date'), _DAY_SQL.format(col='NEW.date')
+    for event in ('INSERT', 'UPDATE OF date'):
+        _recreate_trigger(cursor, 'trg_transactions_date_' + event.split()[0].lower(), f'''
+            AFTER {event} ON transactions
+            BEGIN
+                UPDATE transactions
+                SET date_epoch = {epoch}, date_day = {day}
+                WHERE rowid = NEW.rowid;
+            END
+        ''')
+
+    # Backfill rows written before the triggers existed or normalized differently;
+    # rollup triggers follow the date_day changes. This scans the whole table, so
+    # it only runs when the file was migrated by an older version.
+    cursor.execute("PRAGMA user_version")
+    if cursor.fetchone()[0] != SCHEMA_VERSION:
+        epoch, day = _EPOCH_SQL.format(col='date'), _DAY_SQL.format(col='date')
+        cursor.execute(f'''
+            UPDATE transactions
+            SET date_epoch = {epoch}, date_day = {day}
+            WHERE date IS NOT NULL AND (date_epoch IS NOT {epoch} OR date_day IS NOT {day})
+        ''')
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_date_day ON transactions(date_day)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_user_day ON transactions(email_user, date_day)")
+
+
+def _migrate_data_generation(cursor):
+    """Create the write counter that invalidates cached results across processes."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_generation (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            value INTEGER NOT NULL,
+            instance TEXT
+        )
+    ''')
+    cursor.execute("PRAGMA table_info(data_generation)")
+    if 'instance' not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE data_generation ADD COLUMN instance TEXT")
+    cursor.execute("INSERT OR IGNORE INTO data_generation (id, value) VALUES (1, 0)")
+    # Random id of this file, so a recreated finance.db restarting at generation 0
+    # never matches entries cached for its predecessor
+    cursor.execute("UPDATE data_generation SET instance = lower(hex(randomblob(8))) "
+                   "WHERE id = 1 AND instance IS NULL")
+
+    for table in ('transactions', 'items', 'categories'):
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,))
+        if not cursor.fetchone():
+            continue
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            _recreate_trigger(cursor, f'trg_{table}_generation_{event.lower()}', f'''
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE data_generation SET value = value + 1 WHERE id = 1;
+                END
+            ''')
+
+
+def _migrate_parsed_items(cursor):
+    """Create the parsed_items cache of description-derived items and fill it for existing rows."""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='transactions'")
+    if not cursor.fetchone():
+        return
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS parsed_items (
+            transaction_id INTEGER PRIMARY KEY,
+            description_hash INTEGER NOT NULL,
+            items TEXT NOT NULL
+        )
+    ''')
+    # Drop entries as soon as their description changes or the row goes away,
+    # including changes made by the finance agent
+    _recreate_trigger(cursor, 'trg_transactions_parsed_items_update', '''
+        AFTER UPDATE OF description ON transactions
+        BEGIN
+            DELETE FROM parsed_items WHERE transaction_id = OLD.id;
+        END
+    ''')
+    _recreate_trigger(cursor, 'trg_transactions_parsed_items_delete', '''
+        AFTER DELETE ON transactions
+        BEGIN
+            DELETE FROM parsed_items WHERE transaction_id = OLD.id;
+        END
+    ''')
+    backfill_parsed_items(cursor)
+
+
+def backfill_parsed_items(cursor, batch_size: int = 5000) -> int:
+    """Parse and store items for every transaction missing from parsed_items; returns the count."""
+    done = 0
+    while True:
+        cursor.execute('''
+            SELECT t.id, t.description FROM transactions t
+            LEFT JOIN parsed_items p ON p.transaction_id = t.id
+            WHERE p.transaction_id IS NULL
+            LIMIT ?
+        ''', (batch_size,))
+        rows = [(row[0], row[1]) for row in cursor.fetchall()]
+        if not rows:
+            return done
+        _store_parsed_items(cursor, rows)
+        done += len(rows)
+
+
+_generation_conn = threading.local()
+
+
+def get_data_version() -> Tuple[str, int]:
+    """Identity of finance.db and its write generation, which changes whenever cached data may be stale.
+
+    The identity is DB_PATH plus the file's random instance id, so databases
+    sharing a cache file never read each other's entries.
+    """
+    # Checked on every cached call, so keep one autocommit connection per thread
+    # instead of paying for a connect each time
+    conns = getattr(_generation_conn, 'conns', None)
+    if conns is None:
+        conns = _generation_conn.conns = {}
+
+    scope, total = DB_PATH, 0
+    for path in [DB_PATH] + (_all_shard_paths() if shards.enabled() else []):
+        # A file recreated at the same path gets a new inode; reconnect to read it
+        inode = os.stat(path).st_ino
+        conn, known = conns.get(path, (None, None))
+        if known != inode:
+            if conn is not None:
+                conn.close()
+            conn = sqlite3.connect(path, timeout=20, isolation_level=None)
+            conns[path] = (conn, inode)
+        row = conn.execute("SELECT value, instance FROM data_generation WHERE id = 1").fetchone()
+        if row is None:
+            continue
+        total += row[0]
+        if path == DB_PATH:
+            scope += '#' + (row[1] or '')
+    return scope, total
+
+
+def _all_shard_paths() -> List[str]:
+    with get_db_connection() as conn:
+        return list(shards.list_shards(conn.cursor()).values())
+
+
+def _paths_for(filters: Optional[Dict[str, Any]] = None,
+               include_archive: bool = False) -> List[Optional[str]]:
+    """Database files holding the transactions selected by `filters`.
+
+    None stands for finance.db. In sharded mode an email filter selects one
+    shard; without one every shard is queried and the results are merged.
+    With `include_archive`, archives overlapping the date range are added.
+    """
+    if not shards.enabled():
+        return [None] + (_archive_paths(filters) if include_archive else [])
+    with get_db_connection() as conn:
+        all_shards = shards.list_shards(conn.cursor())
+    if filters and filters.get('email'):
+        path = all_shards.get(filters['email'])
+        return [path] if path else []
+    return list(all_shards.values())
+
+
+def _archive_paths(filters: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Archive files (see app.archive) a query with `filters` has to read."""
+    if shards.enabled():
+        return []
+    with get_db_connection() as conn:
+        return archive.partitions_for(conn.cursor(), filters)
+
+
+def _is_archive(path: Optional[str]) -> bool:
+    """Whether `path` from _paths_for/_archive_paths is an archive file rather than finance.db or a shard."""
+    # finance.db is always passed as None and archives are only read without shards
+    return path is not None and not shards.enabled()
+
+
+def _owner_of(table: str, row_id) -> Tuple[Optional[str], Optional[str]]:
+    """(email, database file) holding transaction/item `row_id`; (None, None) means finance.db."""
+    if not shards.enabled():
+        return None, None
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        email = shards.lookup(cursor, table, row_id)
+        return email, shards.list_shards(cursor).get(email) if email else None
+
+
+def _path_for_row(table: str, row_id) -> Optional[str]:
+    return _owner_of(table, row_id)[1]
+
+
+def _write_to_row(table: str):
+    """Run the decorated mutation on the writer of the file holding row `row_id` (first argument)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(row_id, *args, **kwargs):
+            return _writer_for(_path_for_row(table, row_id)).call(fn, row_id, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _allocate_in_shard(cursor, table: str, email: str) -> Tuple[str, int]:
+    """Runs on the finance.db writer: create the user's shard if needed and reserve an id."""
+    path = shards.list_shards(cursor).get(email)
+    if path is None:
+        path = shards.create_shard(cursor, email)
+        migrate_partition(path)
+    return path, shards.allocate_id(cursor, table, email)
+
+
+def _query_all(paths: List[Optional[str]], query: str, params: List[Any],
+               with_items: bool = False) -> List[Dict]:
+    """Run `query` on each database in `paths` and concatenate the rows."""
+    rows: List[Dict] = []
+    for path in paths:
+        with get_db_connection(path) as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = _dict_row
+            cursor.execute(query, params)
+            result = cursor.fetchall()
+            rows.extend(_attach_items(cursor, result, path) if with_items else result)
+    return rows
+
+
+def _merge_groups(rows: List[Dict], key: str) -> List[Dict]:
+    """Combine per-shard GROUP BY rows that share `key` by summing total and count."""
+    merged: Dict[Any, Dict] = {}
+    for row in rows:
+        if row[key] in merged:
+            merged[row[key]]['total'] += row['total']
+            merged[row[key]]['count'] += row['count']
+        else:
+            merged[row[key]] = dict(row)
+    return list(merged.values())
+
+
+_PAREN_RE = re.compile(r'\((.*?)\)')
 
 
 def _parse_items(description: str):
@@ -71,9 +503,8 @@ def _parse_items(description: str):
     if not description:
         return []
     # Check for items in parentheses or comma separated
-    import re
     # Try to extract items from inside parentheses first e.g. "Name (item1, item2)"
-    paren_match = re.search(r'\((.*?)\)', description)
+    paren_match = _PAREN_RE.search(description)
     if paren_match:
         items_str = paren_match.group(1)
         items = [i.strip() for i in items_str.split(',') if i.strip()]
@@ -84,170 +515,382 @@ def _parse_items(description: str):
     return items if len(items) > 1 else []
 
 
+def _description_hash(description: Optional[str]) -> int:
+    return zlib.crc32((description or '').encode('utf-8'))
+
+
+def _store_parsed_items(cursor, rows: List[Tuple[Any, Optional[str]]]) -> None:
+    """Parse the (transaction id, description) pairs once and cache the item names."""
+    cursor.executemany(
+        "INSERT OR REPLACE INTO parsed_items (transaction_id, description_hash, items) VALUES (?, ?, ?)",
+        [(row_id, _description_hash(description), orjson.dumps(_parse_items(description)).decode())
+         for row_id, description in rows],
+    )
+
+
+def _format_item(name: str, quantity: float) -> str:
+    """Display string for an item, e.g. "Coffee (x2)"."""
+    return f"{name} (x{int(quantity)})" if quantity > 1 else name
+
+
+# Cached description parse of each transaction, selected alongside it (see _attach_items)
+_PARSED_ITEMS_COLUMNS = "parsed_items.description_hash as parsed_hash, parsed_items.items as parsed_names"
+_PARSED_ITEMS_JOIN = "LEFT JOIN parsed_items ON parsed_items.transaction_id = {id}"
+
+
+def _attach_items(cursor, transactions: List[Dict], path: Optional[str] = None) -> List[Dict]:
+    """Attach 'items' and 'item_count' to each transaction using one batched items query.
+
+    Transactions without rows in `items` fall back to the item names parsed from
+    their description, which queries select from parsed_items as
+    `parsed_hash`/`parsed_names`. Rows the cache does not cover yet (written by
+    the finance agent since startup) are parsed here and stored through the
+    writer of `path` in the background, except for read-only archive files.
+    """
+    by_id: Dict[Any, List[Dict]] = {}
+    ids = [t['id'] for t in transactions]
+    # Stay well below SQLITE_MAX_VARIABLE_NUMBER on older SQLite builds
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        placeholders = ', '.join(['?'] * len(chunk))
+        cursor.execute(
+            f"SELECT transaction_id, name, quantity, unit_price FROM items WHERE transaction_id IN ({placeholders}) ORDER BY id",
+            chunk,
+        )
+        for item in cursor.fetchall():
+            by_id.setdefault(item['transaction_id'], []).append({
+                "name": item['name'],
+                "quantity": item['quantity'],
+                "unit_price": item['unit_price'],
+                "formatted": _format_item(item['name'], item['quantity'])
+            })
+
+    misses = []
+    for t in transactions:
+        items = by_id.get(t['id'])
+        parsed_hash = t.pop('parsed_hash', None)
+        parsed_names = t.pop('parsed_names', None)
+        if not items:
+            # Fallback to the items parsed from the description
+            if parsed_names is not None and parsed_hash == _description_hash(t['description']):
+                names = orjson.loads(parsed_names)
+            else:
+                names = _parse_items(t['description'])
+                misses.append((t['id'], t['description']))
+            items = [{"name": name, "quantity": 1, "unit_price": 0, "formatted": name} for name in names]
+        t['items'] = items
+        t['item_count'] = len(items)
+
+    if misses and not _is_archive(path):
+        _writer_for(path).submit(_store_parsed_items, misses)
+    return transactions
+
+
 def get_transactions(filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
     """Fetch transactions with optional filters and real items from the items table."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        query = """
-            SELECT id, date, amount, category, description, 'expense' as transaction_type, platform, email_user
-            FROM transactions WHERE 1=1
-        """
-        params = []
-
-        if filters:
-            if filters.get('date_from'):
-                query += " AND date >= ?"
-                params.append(filters['date_from'])
-            if filters.get('date_to'):
-                query += " AND date <= ?"
-                params.append(filters['date_to'])
-            if filters.get('category'):
-                query += " AND category = ?"
-                params.append(filters['category'])
-            if filters.get('platform'):
-                query += " AND platform = ?"
-                params.append(filters['platform'])
-            if filters.get('email'):
-                query += " AND email_user = ?"
-                params.append(filters['email'])
-
-        query += " ORDER BY date DESC"
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-
-        result = []
-        for row in rows:
-            d = dict(row)
-            # Fetch real items from 'items' table
-            cursor.execute("SELECT name, quantity, unit_price FROM items WHERE transaction_id = ?", (d['id'],))
-            db_items = cursor.fetchall()
-            
-            if db_items:
-                items = [
-                    {
-                        "name": item['name'],
-                        "quantity": item['quantity'],
-                        "unit_price": item['unit_price'],
-                        "formatted": f"{item['name']} (x{int(item['quantity'])})" if item['quantity'] > 1 else item['name']
-                    }
-                    for item in db_items
-                ]
-                d['items'] = items
-                d['item_count'] = len(items)
-            else:
-                # Fallback to description parsing
-                parsed_names = _parse_items(d['description'])
-                d['items'] = [{"name": name, "quantity": 1, "unit_price": 0, "formatted": name} for name in parsed_names]
-                d['item_count'] = len(parsed_names)
-                
-            result.append(d)
-        return result
+    query = f"""
+        SELECT id, date, amount, category, description, 'expense' as transaction_type, platform, email_user,
+               date_epoch, {_PARSED_ITEMS_COLUMNS}
+        FROM transactions {_PARSED_ITEMS_JOIN.format(id='transactions.id')} WHERE 1=1
+    """
+    params = []
+
+    if filters:
+        if filters.get('date_from'):
+            query += f" AND date_day >= {_DAY_PARAM_SQL}"
+            params.append(filters['date_from'])
+        if filters.get('date_to'):
+            query += f" AND date_day <= {_DAY_PARAM_SQL}"
+            params.append(filters['date_to'])
+        if filters.get('category'):
+            query += " AND category = ?"
+            params.append(filters['category'])
+        if filters.get('platform'):
+            query += " AND platform = ?"
+            params.append(filters['platform'])
+        if filters.get('email'):
+            query += " AND email_user = ?"
+            params.append(filters['email'])
+
+    query += " ORDER BY date_epoch DESC, id DESC"
+    paths = _paths_for(filters, include_archive=True)
+    rows = _query_all(paths, query, params, with_items=True)
+    if len(paths) > 1:
+        rows.sort(key=lambda t: (t['date_epoch'] is not None, t['date_epoch'] or 0, t['id']), reverse=True)
+    for t in rows:
+        del t['date_epoch']
+    return rows
 
 
 def get_transaction_by_id(transaction_id: str) -> Optional[Dict]:
-    """Fetch a single transaction by ID with real items."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT *, "expense" as transaction_type FROM transactions WHERE id = ?', (transaction_id,))
-        row = cursor.fetchone()
-        if not row: return None
-        d = dict(row)
-        
-        # Fetch real items
-        cursor.execute("SELECT name, quantity, unit_price FROM items WHERE transaction_id = ?", (transaction_id,))
-        db_items = cursor.fetchall()
-        
-        if db_items:
-            items = [
-                {
-                    "name": item['name'],
-                    "quantity": item['quantity'],
-                    "unit_price": item['unit_price'],
-                    "formatted": f"{item['name']} (x{int(item['quantity'])})" if item['quantity'] > 1 else item['name']
-                }
-                for item in db_items
-            ]
-            d['items'] = items
-            d['item_count'] = len(items)
-        else:
-            parsed_names = _parse_items(d['description'])
-            d['items'] = [{"name": name, "quantity": 1, "unit_price": 0, "formatted": name} for name in parsed_names]
-            d['item_count'] = len(parsed_names)
-            
-        return d
+    """Fetch a single transaction by ID with real items.
 
+    Transactions found in an archive are returned with 'archived': True.
+    """
+    paths = [_path_for_row('transactions', transaction_id)]
+    for path in paths + _archive_paths():
+        with get_db_connection(path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT transactions.*, "expense" as transaction_type, {_PARSED_ITEMS_COLUMNS}
+                FROM transactions {_PARSED_ITEMS_JOIN.format(id='transactions.id')}
+                WHERE id = ?
+            ''', (transaction_id,))
+            row = cursor.fetchone()
+            if not row:
+                continue
+            transaction = dict(row)
+            for column in _INTERNAL_COLUMNS:
+                transaction.pop(column, None)
+            transaction = _attach_items(cursor, [transaction], path)[0]
+            if path not in paths:
+                transaction['archived'] = True
+            return transaction
+    return None
 
+
+@cached(get_data_version)
 def get_summary_by_category(filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
     """Get transaction summary grouped by category."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        query = 'SELECT category, SUM(amount) as total, COUNT(*) as count FROM transactions WHERE 1=1'
-        params = []
-        if filters:
-            if filters.get('date_from'):
-                query += " AND date >= ?"
-                params.append(filters['date_from'])
-            if filters.get('date_to'):
-                query += " AND date <= ?"
-                params.append(filters['date_to'])
-            if filters.get('platform'):
-                query += " AND platform = ?"
-                params.append(filters['platform'])
-            if filters.get('category'):
-                if isinstance(filters['category'], list):
-                    placeholders = ', '.join(['?'] * len(filters['category']))
-                    query += f" AND category IN ({placeholders})"
-                    params.extend(filters['category'])
-                else:
-                    query += " AND category = ?"
-                    params.append(filters['category'])
-            if filters.get('email'):
-                query += " AND email_user = ?"
-                params.append(filters['email'])
-        query += " GROUP BY category ORDER BY total DESC"
-        cursor.execute(query, params)
-        return [dict(row) for row in cursor.fetchall()]
+    query = 'SELECT category, SUM(amount) as total, COUNT(*) as count FROM transactions WHERE 1=1'
+    params = []
+    if filters:
+        if filters.get('date_from'):
+            query += f" AND date_day >= {_DAY_PARAM_SQL}"
+            params.append(filters['date_from'])
+        if filters.get('date_to'):
+            query += f" AND date_day <= {_DAY_PARAM_SQL}"
+            params.append(filters['date_to'])
+        if filters.get('platform'):
+            query += " AND platform = ?"
+            params.append(filters['platform'])
+        if filters.get('category'):
+            if isinstance(filters['category'], list):
+                placeholders = ', '.join(['?'] * len(filters['category']))
+                query += f" AND category IN ({placeholders})"
+                params.extend(filters['category'])
+            else:
+                query += " AND category = ?"
+                params.append(filters['category'])
+        if filters.get('email'):
+            query += " AND email_user = ?"
+            params.append(filters['email'])
+    query += " GROUP BY category ORDER BY total DESC"
+    rows = _query_all(_paths_for(filters), query, params)
+    rows += archive.summary_rows(_archive_paths(filters), filters, 'category')
+    summary = _merge_groups(rows, 'category')
+    return sorted(summary, key=lambda row: row['total'], reverse=True)
 
 
+@cached(get_data_version)
 def get_summary_by_date(filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
     """Get transaction summary grouped by date for trend chart."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        
-        # We need to decide the grouping level based on range
-        # Default to day
-        group_format = '%Y-%m-%d'
-        
-        query = f"SELECT strftime('{group_format}', date) as date, SUM(amount) as total, COUNT(*) as count FROM transactions WHERE 1=1"
-        params = []
-        
-        if filters:
-            if filters.get('date_from'):
-                query += " AND date >= ?"
-                params.append(filters['date_from'])
-            if filters.get('date_to'):
-                query += " AND date <= ?"
-                params.append(filters['date_to'])
-            if filters.get('platform'):
-                query += " AND platform = ?"
-                params.append(filters['platform'])
-            if filters.get('category'):
-                if isinstance(filters['category'], list):
-                    placeholders = ', '.join(['?'] * len(filters['category']))
-                    query += f" AND category IN ({placeholders})"
-                    params.extend(filters['category'])
-                else:
-                    query += " AND category = ?"
-                    params.append(filters['category'])
-            if filters.get('email'):
-                query += " AND email_user = ?"
-                params.append(filters['email'])
-
-        query += f" GROUP BY strftime('{group_format}', date) ORDER BY date ASC"
-        cursor.execute(query, params)
-        return [dict(row) for row in cursor.fetchall()]
+    # Group on the integer day number and only format once per group
+    query = "SELECT date(date_day * 86400, 'unixepoch') as date, SUM(amount) as total, COUNT(*) as count FROM transactions WHERE date_day IS NOT NULL"
+    params = []
+
+    if filters:
+        if filters.get('date_from'):
+            query += f" AND date_day >= {_DAY_PARAM_SQL}"
+            params.append(filters['date_from'])
+        if filters.get('date_to'):
+            query += f" AND date_day <= {_DAY_PARAM_SQL}"
+            params.append(filters['date_to'])
+        if filters.get('platform'):
+            query += " AND platform = ?"
+            params.append(filters['platform'])
+        if filters.get('category'):
+            if isinstance(filters['category'], list):
+                placeholders = ', '.join(['?'] * len(filters['category']))
+                query += f" AND category IN ({placeholders})"
+                params.extend(filters['category'])
+            else:
+                query += " AND category = ?"
+                params.append(filters['category'])
+        if filters.get('email'):
+            query += " AND email_user = ?"
+            params.append(filters['email'])
+
+    query += " GROUP BY date_day ORDER BY date_day ASC"
+    rows = _query_all(_paths_for(filters), query, params)
+    rows += archive.summary_rows(_archive_paths(filters), filters, 'date')
+    summary = _merge_groups(rows, 'date')
+    return sorted(summary, key=lambda row: row['date'])
+
+
+@cached(get_data_version)
+def get_summary_by_platform(filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
+    """Get transaction summary grouped by platform."""
+    query = 'SELECT platform, SUM(amount) as total, COUNT(*) as count FROM transactions WHERE 1=1'
+    params = []
+    if filters:
+        if filters.get('date_from'):
+            query += f" AND date_day >= {_DAY_PARAM_SQL}"
+            params.append(filters['date_from'])
+        if filters.get('date_to'):
+            query += f" AND date_day <= {_DAY_PARAM_SQL}"
+            params.append(filters['date_to'])
+        if filters.get('platform'):
+            query += " AND platform = ?"
+            params.append(filters['platform'])
+        if filters.get('category'):
+            if isinstance(filters['category'], list):
+                placeholders = ', '.join(['?'] * len(filters['category']))
+                query += f" AND category IN ({placeholders})"
+                params.extend(filters['category'])
+            else:
+                query += " AND category = ?"
+                params.append(filters['category'])
+        if filters.get('email'):
+            query += " AND email_user = ?"
+            params.append(filters['email'])
+    query += " GROUP BY platform ORDER BY total DESC"
+    rows = _query_all(_paths_for(filters), query, params)
+    rows += archive.summary_rows(_archive_paths(filters), filters, 'platform')
+    summary = _merge_groups(rows, 'platform')
+    return sorted(summary, key=lambda row: row['total'], reverse=True)
+
+
+_OFFSET_RE = re.compile(r'^(\d+)([DWMY])$')
+_EPOCH_DATE = datetime(1970, 1, 1).date()
+
+
+def _shift_months(day, months: int):
+    """`day` moved back by `months`, clamped to the end of shorter months."""
+    index = day.year * 12 + day.month - 1 - months
+    year, month = index // 12, index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
 
 
+def parse_day(value: Any) -> date:
+    """The calendar day a 'YYYY-MM-DD...' string starts with; raises ValueError otherwise."""
+    try:
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid date {value!r}, expected YYYY-MM-DD") from None
+
+
+def comparison_window(date_from: str, date_to: str, offset: str) -> Tuple[str, str]:
+    """Baseline (date_from, date_to) of the window compared against the current one.
+
+    `offset` is 'previous' (the equally long window just before) or a count and
+    unit such as '7D', '2W', '1M', '1Y'. Raises ValueError for anything else,
+    including baselines before year 1.
+    """
+    start, end = parse_day(date_from), parse_day(date_to)
+    match = _OFFSET_RE.match(offset.upper())
+    if offset != 'previous' and not match:
+        raise ValueError(f"Invalid comparison offset: {offset}")
+    try:
+        if offset == 'previous':
+            length = end - start + timedelta(days=1)
+            return (start - length).isoformat(), (end - length).isoformat()
+        count, unit = int(match.group(1)), match.group(2)
+        if unit in ('D', 'W'):
+            shift = timedelta(days=count * (7 if unit == 'W' else 1))
+            return (start - shift).isoformat(), (end - shift).isoformat()
+        months = count * (12 if unit == 'Y' else 1)
+        return _shift_months(start, months).isoformat(), _shift_months(end, months).isoformat()
+    except (OverflowError, ValueError):
+        raise ValueError(f"Comparison offset {offset} is out of range") from None
+
+
+def _change(current: float, baseline: float) -> Optional[float]:
+    return round((current - baseline) / baseline * 100, 2) if baseline else None
+
+
+@cached(get_data_version)
+def get_period_comparison(filters: Dict[str, Any], offsets: List[str]) -> List[Dict]:
+    """Compare a date range against baseline windows per category and platform.
+
+    `filters` needs date_from and date_to. All windows are aggregated by one
+    statement that joins a VALUES list of windows to the (email_user, date_day)
+    index, so each window's rows are read once for both dimensions and
+    overlapping windows are still counted in each. Returns one row per
+    (dimension, key, baseline) where dimension is 'total', 'category' or 'platform'.
+    """
+    windows = [(filters['date_from'][:10], filters['date_to'][:10])]
+    windows += [comparison_window(filters['date_from'], filters['date_to'], offset) for offset in offsets]
+    window_params: List[Any] = []
+    for n, (lo, hi) in enumerate(windows):
+        window_params += [n, (datetime.strptime(lo, '%Y-%m-%d').date() - _EPOCH_DATE).days,
+                          (datetime.strptime(hi, '%Y-%m-%d').date() - _EPOCH_DATE).days]
+
+    where = "t.date_day BETWEEN w.lo AND w.hi"
+    params = list(window_params)
+    if filters.get('platform'):
+        where += " AND t.platform = ?"
+        params.append(filters['platform'])
+    if filters.get('category'):
+        if isinstance(filters['category'], list):
+            placeholders = ', '.join(['?'] * len(filters['category']))
+            where += f" AND t.category IN ({placeholders})"
+            params.extend(filters['category'])
+        else:
+            where += " AND t.category = ?"
+            params.append(filters['category'])
+    if filters.get('email'):
+        where += " AND t.email_user = ?"
+        params.append(filters['email'])
+
+    values = ', '.join(['(?, ?, ?)'] * len(windows))
+
+    def window_query(table: str, amount: str, count: str) -> str:
+        return f'''
+            WITH w(n, lo, hi) AS (VALUES {values})
+            SELECT w.n as window, t.category as category, t.platform as platform,
+                   SUM({amount}) as total, SUM({count}) as count
+            FROM w JOIN {table} t ON {where}
+            GROUP BY w.n, t.category, t.platform
+        '''
+
+    archive_paths = sorted({path for lo, hi in windows
+                            for path in _archive_paths({'date_from': lo, 'date_to': hi})})
+    rows = _query_all(_paths_for(filters), window_query('transactions', 't.amount', '1'), params)
+    rows += _query_all(archive_paths, window_query('daily_summary', 't.total', 't.count'), params)
+
+    # Fold the (window, category, platform) groups into the three dimensions
+    groups: Dict[Tuple[str, Any], List[float]] = {('total', None): [0] * (2 * len(windows))}
+    for row in rows:
+        for key in (('total', None), ('category', row['category']), ('platform', row['platform'])):
+            acc = groups.setdefault(key, [0] * (2 * len(windows)))
+            acc[2 * row['window']] += row['total']
+            acc[2 * row['window'] + 1] += row['count']
+
+    result = []
+    for (dimension, key), values in groups.items():
+        current_total, current_count = values[0], values[1]
+        for n, offset in enumerate(offsets, start=1):
+            baseline_total, baseline_count = values[2 * n], values[2 * n + 1]
+            result.append({
+                'dimension': dimension,
+                'key': key,
+                'baseline': offset,
+                'current_total': current_total,
+                'current_count': current_count,
+                'baseline_total': baseline_total,
+                'baseline_count': baseline_count,
+                'delta': current_total - baseline_total,
+                'pct_change': _change(current_total, baseline_total),
+            })
+    order = {'total': 0, 'category': 1, 'platform': 2}
+    return sorted(result, key=lambda row: (order[row['dimension']], offsets.index(row['baseline']),
+                                           -row['current_total']))
+
+
+@cached(get_data_version)
+def get_platforms() -> List[str]:
+    """Get all unique platforms from transactions."""
+    rows = _query_all(_paths_for(include_archive=True), '''
+        SELECT DISTINCT platform
+        FROM transactions
+        WHERE platform IS NOT NULL
+        AND platform != ''
+    ''', [])
+    return sorted({row['platform'] for row in rows})
+
+
+@cached(get_data_version)
 def get_category_colors() -> Dict[str, str]:
     """Get category color mappings."""
     with get_db_connection() as conn:
@@ -256,6 +899,7 @@ def get_category_colors() -> Dict[str, str]:
         return {row['name']: row['color'] for row in cursor.fetchall()}
 
 
+@cached(get_data_version)
 def get_all_categories() -> List[Dict]:
     """Get all categories."""
     with get_db_connection() as conn:
@@ -264,136 +908,225 @@ def get_all_categories() -> List[Dict]:
         return [dict(row) for row in cursor.fetchall()]
 
 
+@cached(get_data_version)
 def get_balance(filters: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
     """Get total summary."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        query = 'SELECT COALESCE(SUM(amount), 0) as total FROM transactions WHERE 1=1'
-        params = []
-        if filters:
-            if filters.get('date_from'):
-                query += " AND date >= ?"
-                params.append(filters['date_from'])
-            if filters.get('date_to'):
-                query += " AND date <= ?"
-                params.append(filters['date_to'])
-            if filters.get('email'):
-                query += " AND email_user = ?"
-                params.append(filters['email'])
-        cursor.execute(query, params)
-        expenses = cursor.fetchone()['total']
-        return {
-            'income': 0,
-            'expenses': expenses,
-            'balance': -expenses
-        }
-
-
-def update_transaction(transaction_id: str, **kwargs) -> int:
+    query = 'SELECT COALESCE(SUM(amount), 0) as total FROM transactions WHERE 1=1'
+    params = []
+    if filters:
+        if filters.get('date_from'):
+            query += f" AND date_day >= {_DAY_PARAM_SQL}"
+            params.append(filters['date_from'])
+        if filters.get('date_to'):
+            query += f" AND date_day <= {_DAY_PARAM_SQL}"
+            params.append(filters['date_to'])
+        if filters.get('email'):
+            query += " AND email_user = ?"
+            params.append(filters['email'])
+    rows = _query_all(_paths_for(filters), query, params)
+    rows += archive.summary_rows(_archive_paths(filters), filters, None)
+    expenses = sum(row['total'] for row in rows)
+    return {
+        'income': 0,
+        'expenses': expenses,
+        'balance': -expenses
+    }
+
+
+@_write_to_row('transactions')
+def update_transaction(cursor, transaction_id: str, **kwargs) -> int:
     """Update transaction details and return the updated transaction ID."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        updates = []
-        params = []
-
-        if 'description' in kwargs:
-            updates.append("description = ?")
-            params.append(kwargs['description'])
-        if 'category' in kwargs:
-            updates.append("category = ?")
-            params.append(kwargs['category'])
-        if 'amount' in kwargs:
-            updates.append("amount = ?")
-            params.append(kwargs['amount'])
-        if 'date' in kwargs:
-            updates.append("date = ?")
-            params.append(kwargs['date'])
-        if 'platform' in kwargs:
-            updates.append("platform = ?")
-            params.append(kwargs['platform'])
-
-        if not updates:
-            return transaction_id
-
-        params.append(transaction_id)
-        query = f"UPDATE transactions SET {', '.join(updates)} WHERE id = ?"
-        cursor.execute(query, params)
+    updates = []
+    params = []
+
+    if 'description' in kwargs:
+        updates.append("description = ?")
+        params.append(kwargs['description'])
+    if 'category' in kwargs:
+        updates.append("category = ?")
+        params.append(kwargs['category'])
+    if 'amount' in kwargs:
+        updates.append("amount = ?")
+        params.append(kwargs['amount'])
+    if 'date' in kwargs:
+        updates.append("date = ?")
+        params.append(kwargs['date'])
+    if 'platform' in kwargs:
+        updates.append("platform = ?")
+        params.append(kwargs['platform'])
+
+    if not updates:
         return transaction_id
 
+    params.append(transaction_id)
+    query = f"UPDATE transactions SET {', '.join(updates)} WHERE id = ?"
+    cursor.execute(query, params)
+    if 'description' in kwargs:
+        _store_parsed_items(cursor, [(transaction_id, kwargs['description'])])
+    return transaction_id
+
+
+def _insert_transaction(cursor, new_id: Optional[int], description: str, amount: float, category: str,
+                        date: str, platform: Optional[str], transaction_type: str,
+                        email_user: Optional[str]) -> int:
+    columns = ['description', 'amount', 'category', 'date', 'platform', 'transaction_type']
+    values = [description, amount, category, date, platform, transaction_type]
+    if new_id is not None:
+        columns.append('id')
+        values.append(new_id)
+    if email_user:
+        columns.append('email_user')
+        values.append(email_user)
+    placeholders = ', '.join(['?'] * len(values))
+    cursor.execute(f"INSERT INTO transactions ({', '.join(columns)}) VALUES ({placeholders})", values)
+    transaction_id = cursor.lastrowid
+    _store_parsed_items(cursor, [(transaction_id, description)])
+    return transaction_id
+
 
 def create_transaction(description: str, amount: float, category: str, date: str,
-                       platform: Optional[str] = None, transaction_type: str = 'expense') -> int:
+                       platform: Optional[str] = None, transaction_type: str = 'expense',
+                       email_user: Optional[str] = None) -> int:
     """Create a new transaction and return the transaction ID."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO transactions (description, amount, category, date, platform, transaction_type)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (description, amount, category, date, platform, transaction_type))
-        return cursor.lastrowid
+    args = (description, amount, category, date, platform, transaction_type, email_user)
+    if not shards.enabled():
+        return writer.call(_insert_transaction, None, *args)
+    path, new_id = writer.call(_allocate_in_shard, 'transactions', email_user or DEFAULT_EMAIL)
+    return _writer_for(path).call(_insert_transaction, new_id, *args)
+
+
+def _insert_transactions(cursor, new_ids: Optional[List[int]], rows: List[Dict[str, Any]]) -> List[int]:
+    return [
+        _insert_transaction(cursor, new_ids[n] if new_ids else None, row['description'], row['amount'],
+                            row['category'], row['date'], row.get('platform'),
+                            row.get('transaction_type') or 'expense', row.get('email_user'))
+        for n, row in enumerate(rows)
+    ]
+
+
+def _allocate_many_in_shard(cursor, table: str, email: str, count: int) -> Tuple[str, List[int]]:
+    path, first = _allocate_in_shard(cursor, table, email)
+    return path, [first] + [shards.allocate_id(cursor, table, email) for _ in range(count - 1)]
 
 
-def delete_transaction(transaction_id: str) -> None:
+def create_transactions(rows: List[Dict[str, Any]]) -> List[int]:
+    """Insert many transactions in one writer job per database file and return their IDs in order.
+
+    Each row needs description, amount, category and date; platform,
+    transaction_type and email_user are optional.
+    """
+    if not rows:
+        return []
+    if not shards.enabled():
+        return writer.call(_insert_transactions, None, rows)
+
+    by_email: Dict[str, List[int]] = {}
+    for n, row in enumerate(rows):
+        by_email.setdefault(row.get('email_user') or DEFAULT_EMAIL, []).append(n)
+    ids: List[int] = [0] * len(rows)
+    for email, positions in by_email.items():
+        path, new_ids = writer.call(_allocate_many_in_shard, 'transactions', email, len(positions))
+        inserted = _writer_for(path).call(_insert_transactions, new_ids, [rows[n] for n in positions])
+        for n, transaction_id in zip(positions, inserted):
+            ids[n] = transaction_id
+    return ids
+
+
+@_write_to_row('transactions')
+def delete_transaction(cursor, transaction_id: str) -> None:
     """Delete a transaction and all its associated items."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        # First delete all items associated with this transaction
-        cursor.execute("DELETE FROM items WHERE transaction_id = ?", (transaction_id,))
-        # Then delete the transaction
-        cursor.execute("DELETE FROM transactions WHERE id = ?", (transaction_id,))
+    # First delete all items associated with this transaction
+    cursor.execute("DELETE FROM items WHERE transaction_id = ?", (transaction_id,))
+    # Then delete the transaction
+    cursor.execute("DELETE FROM transactions WHERE id = ?", (transaction_id,))
+
+
+def _insert_item(cursor, item_id: Optional[int], transaction_id: str, name: str,
+                 quantity: int, unit_price: float) -> int:
+    cursor.execute('''
+        INSERT INTO items (id, transaction_id, name, quantity, unit_price)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (item_id, transaction_id, name, quantity, unit_price))
+    return cursor.lastrowid
 
 
 def add_item(transaction_id: str, name: str, quantity: int, unit_price: float) -> int:
     """Add an item to a transaction and return the item ID."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO items (transaction_id, name, quantity, unit_price)
-            VALUES (?, ?, ?, ?)
-        ''', (transaction_id, name, quantity, unit_price))
-        return cursor.lastrowid
+    email, path = _owner_of('transactions', transaction_id)
+    item_id = None
+    if email is not None:
+        item_id = writer.call(shards.allocate_id, 'items', email)
+    return _writer_for(path).call(_insert_item, item_id, transaction_id, name, quantity, unit_price)
 
 
-def update_item(item_id: int, **kwargs) -> Dict:
+@_write_to_row('items')
+def update_item(cursor, item_id: int, **kwargs) -> Dict:
     """Update an item in the database and return the updated item data."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        updates = []
-        params = []
+    updates = []
+    params = []
 
-        if 'name' in kwargs:
-            updates.append("name = ?")
-            params.append(kwargs['name'])
-        if 'quantity' in kwargs:
-            updates.append("quantity = ?")
-            params.append(kwargs['quantity'])
-        if 'unit_price' in kwargs:
-            updates.append("unit_price = ?")
-            params.append(kwargs['unit_price'])
+    if 'name' in kwargs:
+        updates.append("name = ?")
+        params.append(kwargs['name'])
+    if 'quantity' in kwargs:
+        updates.append("quantity = ?")
+        params.append(kwargs['quantity'])
+    if 'unit_price' in kwargs:
+        updates.append("unit_price = ?")
+        params.append(kwargs['unit_price'])
 
-        if not updates:
-            return get_item_by_id(item_id)
+    if not updates:
+        return _fetch_item(cursor, item_id)
 
-        params.append(item_id)
-        query = f"UPDATE items SET {', '.join(updates)} WHERE id = ?"
-        cursor.execute(query, params)
+    params.append(item_id)
+    query = f"UPDATE items SET {', '.join(updates)} WHERE id = ?"
+    cursor.execute(query, params)
 
-        return get_item_by_id(item_id)
+    # Read back on the writer's cursor so the uncommitted update is visible
+    return _fetch_item(cursor, item_id)
 
 
-def delete_item(item_id: int) -> None:
+@_write_to_row('items')
+def delete_item(cursor, item_id: int) -> None:
     """Delete an item from the database."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM items WHERE id = ?", (item_id,))
+    cursor.execute("DELETE FROM items WHERE id = ?", (item_id,))
+
+
+def _fetch_item(cursor, item_id: int) -> Optional[Dict]:
+    cursor.execute('SELECT * FROM items WHERE id = ?', (item_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return dict(row)
 
 
 def get_item_by_id(item_id: int) -> Dict:
     """Get an item by ID."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM items WHERE id = ?', (item_id,))
-        row = cursor.fetchone()
-        if not row:
-            return None
-        return dict(row)
+    with get_db_connection(_path_for_row('items', item_id)) as conn:
+        return _fetch_item(conn.cursor(), item_id)
+
+
+def _one_month_ago(today):
+    """The frontend's 1M preset: Date.setMonth(month - 1), which rolls overflowing
+    days into the next month (March 31 -> "February 31" -> March 2 or 3)."""
+    year, month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+    return datetime(year, month, 1).date() + timedelta(days=today.day - 1)
+
+
+def prewarm_caches(email: str = DEFAULT_EMAIL) -> None:
+    """Precompute lookups and the dashboard's preset-period rollups (All/1M/7D/1D)."""
+    get_all_categories()
+    get_category_colors()
+    get_platforms()
+
+    # Match the date_from values the frontend sends for its period presets
+    today = datetime.utcnow().date()
+    presets = [None, _one_month_ago(today), today - timedelta(days=7), today]
+    for date_from in presets:
+        filters = {'email': email}
+        if date_from:
+            filters['date_from'] = date_from.isoformat()
+        get_balance(filters)
+        get_summary_by_category(filters)
+        get_summary_by_date(filters)
+        get_summary_by_platform(filters)
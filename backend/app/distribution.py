@@ -0,0 +1,334 @@
+"""
+Spending distributions for Finance Dashboard.
+
+Keeps small mergeable sketches per (user, category, month), maintained by
+triggers so the finance agent's writes are included:
+
+- amount_sketch_cells:   count and total
+- amount_sketch_buckets: log-bucketed amount histogram (DDSketch-style): bucket
+                         k holds amounts in (MIN_AMOUNT * GAMMA^(k-1), MIN_AMOUNT * GAMMA^k],
+                         so any quantile is within RELATIVE_ACCURACY of the true value.
+                         Unlike t-digest/KLL, buckets support deletes, which edits need.
+- merchant_topk:         Space-Saving summary of the TOP_K most frequent merchants
+                         (description text before "(").
+
+Sketches of any set of months merge by summing counts per bucket/merchant;
+partial months at the edges of a date range are bucketed from the raw rows.
+Bucket lookups go through the amount_buckets table rather than log(), which
+SQLite builds without math functions (possibly the agent's) do not have.
+"""
+import math
+from typing import List, Dict, Any, Optional, Sequence
+
+from .cache import cached
+from .database import get_db_connection, get_data_version
+from .item_stats import collect_monthly
+
+MIN_AMOUNT = 0.01
+MAX_AMOUNT = 1e9
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+BUCKET_COUNT = math.ceil(math.log(MAX_AMOUNT / MIN_AMOUNT, GAMMA))
+TOP_K = 32
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS amount_buckets (
+        idx INTEGER PRIMARY KEY,
+        upper REAL UNIQUE NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS amount_sketch_cells (
+        email_user TEXT NOT NULL,
+        category TEXT NOT NULL,
+        month TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        total REAL NOT NULL,
+        PRIMARY KEY (email_user, category, month)
+    );
+    CREATE TABLE IF NOT EXISTS amount_sketch_buckets (
+        email_user TEXT NOT NULL,
+        category TEXT NOT NULL,
+        month TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (email_user, category, month, bucket)
+    );
+    CREATE TABLE IF NOT EXISTS merchant_topk (
+        email_user TEXT NOT NULL,
+        category TEXT NOT NULL,
+        month TEXT NOT NULL,
+        merchant TEXT NOT NULL,
+        name TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        error INTEGER NOT NULL,
+        PRIMARY KEY (email_user, category, month, merchant)
+    );
+'''
+
+_CELL = ("COALESCE({row}.email_user, ''), COALESCE({row}.category, ''), "
+         "strftime('%Y-%m', {row}.date_day * 86400, 'unixepoch')")
+_CELL_MATCH = ("email_user = COALESCE({row}.email_user, '') AND category = COALESCE({row}.category, '') "
+               "AND month = strftime('%Y-%m', {row}.date_day * 86400, 'unixepoch')")
+_GUARD = "{row}.date_day IS NOT NULL AND {row}.amount IS NOT NULL"
+
+_BUCKET_OF = f"COALESCE((SELECT idx FROM amount_buckets WHERE upper >= {{x}} ORDER BY upper LIMIT 1), {BUCKET_COUNT})"
+# Negative amounts (refunds) mirror the positive buckets; bucket 0 is "about zero"
+_BUCKET = (f"CASE WHEN {{x}} > {MIN_AMOUNT} THEN {_BUCKET_OF.format(x='{x}')} "
+           f"WHEN {{x}} < -{MIN_AMOUNT} THEN -{_BUCKET_OF.format(x='-({x})')} ELSE 0 END")
+
+_MERCHANT_NAME = ("trim(CASE WHEN instr({d}, '(') > 1 THEN substr({d}, 1, instr({d}, '(') - 1) "
+                  "ELSE COALESCE({d}, '') END)")
+_MERCHANT_KEY = "lower(" + _MERCHANT_NAME + ")"
+
+_SKETCH_DELTA_SQL = '''
+    INSERT INTO amount_sketch_cells (email_user, category, month, count, total)
+    SELECT {cell}, {sign}, {sign} * {row}.amount WHERE {guard}
+    ON CONFLICT(email_user, category, month) DO UPDATE SET
+        count = count + excluded.count,
+        total = total + excluded.total;
+    INSERT INTO amount_sketch_buckets (email_user, category, month, bucket, count)
+    SELECT {cell}, {bucket}, {sign} WHERE {guard}
+    ON CONFLICT(email_user, category, month, bucket) DO UPDATE SET
+        count = count + excluded.count;
+'''
+
+# Space-Saving: count a known merchant, else take a free slot, else replace
+# the least frequent entry and remember its count as the error bound. The
+# CASE keeps the search for that entry from running when nothing is evicted.
+_TOPK_ADD_SQL = '''
+    UPDATE merchant_topk SET count = count + 1
+    WHERE {cell_match} AND merchant = {key};
+    INSERT INTO merchant_topk (email_user, category, month, merchant, name, count, error)
+    SELECT {cell}, {key}, {name}, 1, 0
+    WHERE {guard} AND {key} != ''
+    AND NOT EXISTS (SELECT 1 FROM merchant_topk WHERE {cell_match} AND merchant = {key})
+    AND (SELECT COUNT(*) FROM merchant_topk WHERE {cell_match}) < {top_k};
+    UPDATE merchant_topk SET merchant = {key}, name = {name}, error = count, count = count + 1
+    WHERE rowid = (
+        SELECT CASE WHEN {guard} AND {key} != ''
+            AND NOT EXISTS (SELECT 1 FROM merchant_topk WHERE {cell_match} AND merchant = {key})
+            AND (SELECT COUNT(*) FROM merchant_topk WHERE {cell_match}) >= {top_k}
+        THEN (SELECT rowid FROM merchant_topk WHERE {cell_match} ORDER BY count, rowid LIMIT 1) END
+    );
+'''
+
+# Deletes can only be applied to merchants that are still tracked
+_TOPK_REMOVE_SQL = '''
+    UPDATE merchant_topk SET count = count - 1
+    WHERE {cell_match} AND merchant = {key};
+    DELETE FROM merchant_topk
+    WHERE {cell_match} AND merchant = {key} AND count <= 0;
+'''
+
+_CELL_T = _CELL.format(row='t')
+_BACKFILL_SQL = f'''
+    INSERT INTO amount_sketch_cells (email_user, category, month, count, total)
+    SELECT {_CELL_T}, COUNT(*), SUM(t.amount)
+    FROM transactions t WHERE {_GUARD.format(row='t')}
+    GROUP BY 1, 2, 3;
+
+    INSERT INTO amount_sketch_buckets (email_user, category, month, bucket, count)
+    SELECT {_CELL_T}, {_BUCKET.format(x='t.amount')}, COUNT(*)
+    FROM transactions t WHERE {_GUARD.format(row='t')}
+    GROUP BY 1, 2, 3, 4;
+
+    INSERT INTO merchant_topk (email_user, category, month, merchant, name, count, error)
+    SELECT email_user, category, month, merchant, name, count, 0 FROM (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY email_user, category, month ORDER BY count DESC) as position
+        FROM (
+            SELECT COALESCE(t.email_user, '') as email_user, COALESCE(t.category, '') as category,
+                   strftime('%Y-%m', t.date_day * 86400, 'unixepoch') as month,
+                   {_MERCHANT_KEY.format(d='t.description')} as merchant,
+                   MIN({_MERCHANT_NAME.format(d='t.description')}) as name, COUNT(*) as count
+            FROM transactions t
+            WHERE {_GUARD.format(row='t')} AND {_MERCHANT_KEY.format(d='t.description')} != ''
+            GROUP BY 1, 2, 3, 4
+        )
+    ) WHERE position <= {TOP_K};
+'''
+
+
+def _delta(row: str, sign: int) -> str:
+    args = dict(
+        row=row, sign=sign, top_k=TOP_K,
+        cell=_CELL.format(row=row),
+        cell_match=_CELL_MATCH.format(row=row),
+        guard=_GUARD.format(row=row),
+        bucket=_BUCKET.format(x=f'{row}.amount'),
+        key=_MERCHANT_KEY.format(d=f'{row}.description'),
+        name=_MERCHANT_NAME.format(d=f'{row}.description'),
+    )
+    topk = _TOPK_ADD_SQL if sign > 0 else _TOPK_REMOVE_SQL
+    return _SKETCH_DELTA_SQL.format(**args) + topk.format(**args)
+
+
+def init_distribution_sketches(path: Optional[str] = None):
+    """Create the sketch tables (backfilling them on first run) and their triggers.
+
+    `path` selects a shard or archive file; finance.db by default.
+    """
+    with get_db_connection(path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='transactions'")
+        if not cursor.fetchone():
+            return
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='amount_sketch_cells'")
+        setup = '' if cursor.fetchone() else f'''
+            {SCHEMA}
+            INSERT INTO amount_buckets (idx, upper)
+            WITH RECURSIVE bucket(idx, upper) AS (
+                SELECT 1, {MIN_AMOUNT} * {GAMMA!r}
+                UNION ALL
+                SELECT idx + 1, upper * {GAMMA!r} FROM bucket WHERE idx < {BUCKET_COUNT}
+            )
+            SELECT idx, upper FROM bucket;
+            {_BACKFILL_SQL}
+        '''
+
+        # Recreated whenever this runs, so files set up by an older version get the current triggers
+        cursor.executescript(f'''
+            BEGIN;
+            {setup}
+            DROP TRIGGER IF EXISTS trg_transactions_sketch_insert;
+            DROP TRIGGER IF EXISTS trg_transactions_sketch_update;
+            DROP TRIGGER IF EXISTS trg_transactions_sketch_delete;
+
+            CREATE TRIGGER trg_transactions_sketch_insert
+            AFTER INSERT ON transactions
+            BEGIN
+                {_delta('NEW', 1)}
+            END;
+
+            -- date_day is set by trg_transactions_date_*, so this also follows date edits
+            -- (and picks up rows inserted without date_day)
+            CREATE TRIGGER trg_transactions_sketch_update
+            AFTER UPDATE OF amount, category, date_day, email_user, description ON transactions
+            WHEN OLD.amount IS NOT NEW.amount OR OLD.category IS NOT NEW.category
+                OR OLD.date_day IS NOT NEW.date_day OR OLD.email_user IS NOT NEW.email_user
+                OR OLD.description IS NOT NEW.description
+            BEGIN
+                {_delta('OLD', -1)}
+                {_delta('NEW', 1)}
+            END;
+
+            CREATE TRIGGER trg_transactions_sketch_delete
+            AFTER DELETE ON transactions
+            BEGIN
+                {_delta('OLD', -1)}
+            END;
+            COMMIT;
+        ''')
+
+
+def _bucket_value(bucket: int) -> float:
+    """Representative amount of a bucket, within RELATIVE_ACCURACY of all its members."""
+    if bucket == 0:
+        return 0.0
+    value = 2 * MIN_AMOUNT * GAMMA ** abs(bucket) / (GAMMA + 1)
+    return round(value if bucket > 0 else -value, 2)
+
+
+def _quantiles(buckets: Dict[int, int], quantiles: Sequence[float]) -> Dict[str, Optional[float]]:
+    """Estimate `quantiles` from merged bucket counts (bucket order is amount order)."""
+    ordered = sorted((bucket, count) for bucket, count in buckets.items() if count > 0)
+    n = sum(count for _, count in ordered)
+    result: Dict[str, Optional[float]] = {}
+    for q in quantiles:
+        name = 'p' + format(q * 100, 'g')
+        if n == 0:
+            result[name] = None
+            continue
+        rank = q * (n - 1)
+        seen = 0
+        for bucket, count in ordered:
+            seen += count
+            if seen > rank:
+                result[name] = _bucket_value(bucket)
+                break
+    return result
+
+
+def _category_where(filters: Optional[Dict[str, Any]], column: str):
+    categories = (filters or {}).get('category')
+    if not categories:
+        return '', []
+    if not isinstance(categories, list):
+        categories = [categories]
+    return f" AND {column} IN ({', '.join(['?'] * len(categories))})", list(categories)
+
+
+@cached(get_data_version)
+def get_amount_distribution(filters: Optional[Dict[str, Any]] = None, top: int = 10) -> List[Dict]:
+    """Per-category count, total, mean, amount quantiles and most frequent merchants.
+
+    Counts and totals are exact. Quantiles are within RELATIVE_ACCURACY of the
+    exact values for amounts between MIN_AMOUNT and MAX_AMOUNT. Merchant counts
+    are estimates merged from per-month Space-Saving summaries: an entry that
+    evicted another is over-counted by up to its `error`, a merchant evicted in
+    some months is under-counted, and deletes only reach merchants still
+    tracked. Use them for ranking, not as exact counts.
+    """
+    where, params = _category_where(filters, 'category')
+    raw_where, raw_params = _category_where(filters, 't.category')
+    raw_guard = _GUARD.format(row='t')
+
+    cells = collect_monthly(
+        filters,
+        "SELECT category, SUM(count) as count, SUM(total) as total FROM amount_sketch_cells "
+        "{where}" + where + " GROUP BY category",
+        "SELECT COALESCE(t.category, '') as category, COUNT(*) as count, SUM(t.amount) as total "
+        "FROM transactions t {where} AND " + raw_guard + raw_where + " GROUP BY 1",
+        params,
+    )
+    buckets = collect_monthly(
+        filters,
+        "SELECT category, bucket, SUM(count) as count FROM amount_sketch_buckets "
+        "{where}" + where + " GROUP BY category, bucket",
+        f"SELECT COALESCE(t.category, '') as category, {_BUCKET.format(x='t.amount')} as bucket, COUNT(*) as count "
+        "FROM transactions t {where} AND " + raw_guard + raw_where + " GROUP BY 1, 2",
+        params,
+    )
+    merchants = collect_monthly(
+        filters,
+        "SELECT category, merchant, MIN(name) as name, SUM(count) as count, SUM(error) as error "
+        "FROM merchant_topk {where}" + where + " GROUP BY category, merchant",
+        f"SELECT COALESCE(t.category, '') as category, {_MERCHANT_KEY.format(d='t.description')} as merchant, "
+        f"MIN({_MERCHANT_NAME.format(d='t.description')}) as name, COUNT(*) as count, 0 as error "
+        "FROM transactions t {where} AND " + raw_guard + raw_where +
+        f" AND {_MERCHANT_KEY.format(d='t.description')} != '' GROUP BY 1, 2",
+        params,
+    )
+
+    by_category: Dict[str, Dict] = {}
+    for row in cells:
+        entry = by_category.setdefault(row['category'], {'count': 0, 'total': 0.0, 'buckets': {}, 'merchants': {}})
+        entry['count'] += row['count']
+        entry['total'] += row['total']
+    for row in buckets:
+        entry = by_category.get(row['category'])
+        if entry is not None:
+            entry['buckets'][row['bucket']] = entry['buckets'].get(row['bucket'], 0) + row['count']
+    for row in merchants:
+        entry = by_category.get(row['category'])
+        if entry is None:
+            continue
+        merchant = entry['merchants'].setdefault(row['merchant'], {'name': row['name'], 'count': 0, 'error': 0})
+        merchant['count'] += row['count']
+        merchant['error'] += row['error']
+
+    result = []
+    for category, entry in by_category.items():
+        if entry['count'] <= 0:
+            continue
+        top_merchants = sorted(entry['merchants'].values(), key=lambda m: m['count'], reverse=True)[:top]
+        result.append({
+            'category': category,
+            'count': entry['count'],
+            'total': entry['total'],
+            'mean': round(entry['total'] / entry['count'], 2),
+            **_quantiles(entry['buckets'], QUANTILES),
+            'top_merchants': [m for m in top_merchants if m['count'] > 0],
+        })
+    return sorted(result, key=lambda row: row['total'], reverse=True)
@@ -0,0 +1,414 @@
+"""
+Item analytics for Finance Dashboard.
+
+Receipt items are rolled up into small monthly tables that triggers keep
+current, so rows written by the finance agent are counted without any help
+from this service:
+
+- item_names:           normalized item name (lower-cased, trimmed) -> id
+- item_monthly_stats:   quantity, spend and purchases per item, user and month
+- basket_monthly_stats: baskets (transactions with items), lines, quantity
+                        and spend per user and month
+
+Whole months of a date range are answered from the monthly tables; the partial
+months at its edges are aggregated from the raw items, so 1D/7D ranges stay
+exact.
+"""
+import calendar
+from datetime import date, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+
+from .cache import cached
+from .database import get_db_connection, get_data_version, parse_day, _dict_row, _paths_for
+
+SCHEMA = '''
+    CREATE INDEX IF NOT EXISTS idx_items_transaction_id ON items(transaction_id);
+    CREATE INDEX IF NOT EXISTS idx_items_name_key ON items(lower(trim(name)));
+
+    CREATE TABLE IF NOT EXISTS item_names (
+        id INTEGER PRIMARY KEY,
+        key TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS item_monthly_stats (
+        name_id INTEGER NOT NULL,
+        email_user TEXT NOT NULL,
+        month TEXT NOT NULL,
+        quantity REAL NOT NULL,
+        spend REAL NOT NULL,
+        lines INTEGER NOT NULL,
+        PRIMARY KEY (name_id, email_user, month)
+    );
+    CREATE INDEX IF NOT EXISTS idx_item_monthly_stats_user_month ON item_monthly_stats(email_user, month);
+    CREATE TABLE IF NOT EXISTS basket_monthly_stats (
+        email_user TEXT NOT NULL,
+        month TEXT NOT NULL,
+        baskets INTEGER NOT NULL,
+        lines INTEGER NOT NULL,
+        quantity REAL NOT NULL,
+        spend REAL NOT NULL,
+        PRIMARY KEY (email_user, month)
+    );
+'''
+
+_KEY = "lower(trim({name}))"
+_MONTH = "strftime('%Y-%m', {day} * 86400, 'unixepoch')"
+_QUANTITY = "COALESCE({row}.quantity, 1)"
+_SPEND = "COALESCE({row}.quantity, 1) * COALESCE({row}.unit_price, 0)"
+
+_ADD_NAME_SQL = '''
+    INSERT OR IGNORE INTO item_names (key, name)
+    SELECT lower(trim({row}.name)), trim({row}.name) WHERE trim({row}.name) != '';
+'''
+
+_UPSERT_ITEM_STATS = '''
+    ON CONFLICT(name_id, email_user, month) DO UPDATE SET
+        quantity = quantity + excluded.quantity,
+        spend = spend + excluded.spend,
+        lines = lines + excluded.lines;
+'''
+
+_UPSERT_BASKET_STATS = '''
+    ON CONFLICT(email_user, month) DO UPDATE SET
+        baskets = baskets + excluded.baskets,
+        lines = lines + excluded.lines,
+        quantity = quantity + excluded.quantity,
+        spend = spend + excluded.spend;
+'''
+
+# Add (sign 1) or remove (sign -1) one item row; `basket` is 1 when the row
+# starts or ends its transaction's basket
+_ITEM_DELTA_SQL = '''
+    INSERT INTO item_monthly_stats (name_id, email_user, month, quantity, spend, lines)
+    SELECT n.id, COALESCE(t.email_user, ''), {month}, {sign} * {quantity}, {sign} * {spend}, {sign}
+    FROM transactions t JOIN item_names n ON n.key = {key}
+    WHERE t.id = {row}.transaction_id AND t.date_day IS NOT NULL
+    {upsert_items}
+    INSERT INTO basket_monthly_stats (email_user, month, baskets, lines, quantity, spend)
+    SELECT COALESCE(t.email_user, ''), {month}, {sign} * ({basket}), {sign}, {sign} * {quantity}, {sign} * {spend}
+    FROM transactions t
+    WHERE t.id = {row}.transaction_id AND t.date_day IS NOT NULL
+    {upsert_baskets}
+'''
+
+# Add or remove every item of transaction {row} under its user and month
+_TRANSACTION_DELTA_SQL = '''
+    INSERT INTO item_monthly_stats (name_id, email_user, month, quantity, spend, lines)
+    SELECT n.id, COALESCE({row}.email_user, ''), {month}, {sign} * SUM({quantity}), {sign} * SUM({spend}), {sign} * COUNT(*)
+    FROM items i JOIN item_names n ON n.key = {key}
+    WHERE i.transaction_id = {row}.id AND {row}.date_day IS NOT NULL
+    GROUP BY n.id
+    {upsert_items}
+    INSERT INTO basket_monthly_stats (email_user, month, baskets, lines, quantity, spend)
+    SELECT COALESCE({row}.email_user, ''), {month}, {sign}, {sign} * COUNT(*), {sign} * SUM({quantity}), {sign} * SUM({spend})
+    FROM items i
+    WHERE i.transaction_id = {row}.id AND {row}.date_day IS NOT NULL
+    GROUP BY i.transaction_id
+    {upsert_baskets}
+'''
+
+_BACKFILL_SQL = f'''
+    INSERT OR IGNORE INTO item_names (key, name)
+    SELECT {_KEY.format(name='name')}, MIN(trim(name)) FROM items
+    WHERE trim(name) != ''
+    GROUP BY {_KEY.format(name='name')};
+
+    INSERT INTO item_monthly_stats (name_id, email_user, month, quantity, spend, lines)
+    SELECT n.id, COALESCE(t.email_user, ''), {_MONTH.format(day='t.date_day')},
+           SUM({_QUANTITY.format(row='i')}), SUM({_SPEND.format(row='i')}), COUNT(*)
+    FROM items i
+    JOIN transactions t ON t.id = i.transaction_id
+    JOIN item_names n ON n.key = {_KEY.format(name='i.name')}
+    WHERE t.date_day IS NOT NULL
+    GROUP BY 1, 2, 3;
+
+    INSERT INTO basket_monthly_stats (email_user, month, baskets, lines, quantity, spend)
+    SELECT COALESCE(t.email_user, ''), {_MONTH.format(day='t.date_day')}, COUNT(DISTINCT i.transaction_id),
+           COUNT(*), SUM({_QUANTITY.format(row='i')}), SUM({_SPEND.format(row='i')})
+    FROM items i
+    JOIN transactions t ON t.id = i.transaction_id
+    WHERE t.date_day IS NOT NULL
+    GROUP BY 1, 2;
+'''
+
+
+def _item_delta(row: str, sign: int, basket: str) -> str:
+    return _ITEM_DELTA_SQL.format(
+        row=row, sign=sign, basket=basket,
+        key=_KEY.format(name=f'{row}.name'),
+        month=_MONTH.format(day='t.date_day'),
+        quantity=_QUANTITY.format(row=row),
+        spend=_SPEND.format(row=row),
+        upsert_items=_UPSERT_ITEM_STATS,
+        upsert_baskets=_UPSERT_BASKET_STATS,
+    )
+
+
+def _transaction_delta(row: str, sign: int) -> str:
+    return _TRANSACTION_DELTA_SQL.format(
+        row=row, sign=sign,
+        key=_KEY.format(name='i.name'),
+        month=_MONTH.format(day=f'{row}.date_day'),
+        quantity=_QUANTITY.format(row='i'),
+        spend=_SPEND.format(row='i'),
+        upsert_items=_UPSERT_ITEM_STATS,
+        upsert_baskets=_UPSERT_BASKET_STATS,
+    )
+
+
+def _basket_count(transaction_id: str) -> str:
+    return f"(SELECT COUNT(*) FROM items WHERE transaction_id = {transaction_id})"
+
+
+def init_item_stats(path: Optional[str] = None):
+    """Create the item dictionary and monthly rollups (backfilling them on first run) and their triggers.
+
+    `path` selects a shard or archive file; finance.db by default.
+    """
+    with get_db_connection(path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name IN ('transactions', 'items')")
+        if len(cursor.fetchall()) < 2:
+            return
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='item_monthly_stats'")
+        setup = '' if cursor.fetchone() else f'''
+            {SCHEMA}
+            {_BACKFILL_SQL}
+        '''
+
+        moved = "OLD.transaction_id IS NOT NEW.transaction_id"
+        # Recreated whenever this runs, so files set up by an older version get the current triggers
+        cursor.executescript(f'''
+            BEGIN;
+            {setup}
+            DROP TRIGGER IF EXISTS trg_items_stats_insert;
+            DROP TRIGGER IF EXISTS trg_items_stats_update;
+            DROP TRIGGER IF EXISTS trg_items_stats_delete;
+            DROP TRIGGER IF EXISTS trg_transactions_stats_update;
+            DROP TRIGGER IF EXISTS trg_transactions_stats_delete;
+
+            CREATE TRIGGER trg_items_stats_insert
+            AFTER INSERT ON items
+            BEGIN
+                {_ADD_NAME_SQL.format(row='NEW')}
+                {_item_delta('NEW', 1, _basket_count('NEW.transaction_id') + ' = 1')}
+            END;
+
+            CREATE TRIGGER trg_items_stats_update
+            AFTER UPDATE OF name, quantity, unit_price, transaction_id ON items
+            BEGIN
+                {_item_delta('OLD', -1, f"{moved} AND {_basket_count('OLD.transaction_id')} = 0")}
+                {_ADD_NAME_SQL.format(row='NEW')}
+                {_item_delta('NEW', 1, f"{moved} AND {_basket_count('NEW.transaction_id')} = 1")}
+            END;
+
+            CREATE TRIGGER trg_items_stats_delete
+            AFTER DELETE ON items
+            BEGIN
+                {_item_delta('OLD', -1, _basket_count('OLD.transaction_id') + ' = 0')}
+            END;
+
+            -- date_day is set by trg_transactions_date_*, so this also follows date edits
+            CREATE TRIGGER trg_transactions_stats_update
+            AFTER UPDATE OF date_day, email_user ON transactions
+            WHEN OLD.date_day IS NOT NEW.date_day OR OLD.email_user IS NOT NEW.email_user
+            BEGIN
+                {_transaction_delta('OLD', -1)}
+                {_transaction_delta('NEW', 1)}
+            END;
+
+            CREATE TRIGGER trg_transactions_stats_delete
+            AFTER DELETE ON transactions
+            BEGIN
+                {_transaction_delta('OLD', -1)}
+            END;
+            COMMIT;
+        ''')
+
+
+def _day_number(value: date) -> int:
+    return (value - date(1970, 1, 1)).days
+
+
+def _plan(filters: Optional[Dict[str, Any]]) -> Tuple[Optional[Tuple[Optional[str], Optional[str]]],
+                                                      List[Tuple[date, date]]]:
+    """Split a date range into whole months (from the rollups) and raw day ranges.
+
+    Returns ((first_month, last_month) or None, [(from_day, to_day), ...]);
+    months are 'YYYY-MM' strings and None means unbounded. Raises ValueError
+    for dates that are not YYYY-MM-DD.
+    """
+    filters = filters or {}
+    lo = parse_day(filters['date_from']) if filters.get('date_from') else None
+    hi = parse_day(filters['date_to']) if filters.get('date_to') else None
+    if lo and hi and lo > hi:
+        return None, []
+
+    month_lo = lo
+    if lo is not None and lo.day != 1:
+        month_lo = (lo.replace(day=1) + timedelta(days=32)).replace(day=1)
+    month_hi = hi
+    if hi is not None and hi.day != calendar.monthrange(hi.year, hi.month)[1]:
+        month_hi = hi.replace(day=1) - timedelta(days=1)
+
+    if month_lo is not None and month_hi is not None and month_lo > month_hi:
+        # No whole month inside the range
+        return None, [(lo, hi)]
+
+    raw = []
+    if lo is not None and lo != month_lo:
+        raw.append((lo, month_lo - timedelta(days=1)))
+    if hi is not None and hi != month_hi:
+        raw.append((month_hi + timedelta(days=1), hi))
+    months = (month_lo.strftime('%Y-%m') if month_lo else None, month_hi.strftime('%Y-%m') if month_hi else None)
+    return months, raw
+
+
+def collect_monthly(filters: Optional[Dict[str, Any]], monthly_sql: str, raw_sql: str,
+                    params: Optional[List[Any]] = None) -> List[Dict]:
+    """Run `monthly_sql` over the whole months and `raw_sql` over the edge days of the range.
+
+    Both get a {where} clause built from the filters; `params` bind any
+    placeholders that follow it. Shared by every table rolled up by month
+    (items here, amount sketches in app.distribution). Raises ValueError for
+    dates that are not YYYY-MM-DD.
+    """
+    months, raw_ranges = _plan(filters)
+    email = (filters or {}).get('email')
+    rows: List[Dict] = []
+
+    for path in _paths_for(filters, include_archive=True):
+        with get_db_connection(path) as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = _dict_row
+
+            if months is not None:
+                clause, values = "WHERE 1=1", []
+                if months[0]:
+                    clause += " AND month >= ?"
+                    values.append(months[0])
+                if months[1]:
+                    clause += " AND month <= ?"
+                    values.append(months[1])
+                if email:
+                    clause += " AND email_user = ?"
+                    values.append(email)
+                cursor.execute(monthly_sql.format(where=clause), values + (params or []))
+                rows.extend(cursor.fetchall())
+
+            for lo, hi in raw_ranges:
+                clause, values = "WHERE t.date_day BETWEEN ? AND ?", [_day_number(lo), _day_number(hi)]
+                if email:
+                    clause += " AND t.email_user = ?"
+                    values.append(email)
+                cursor.execute(raw_sql.format(where=clause), values + (params or []))
+                rows.extend(cursor.fetchall())
+    return rows
+
+
+def _merge(rows: List[Dict], key: str, fields: Tuple[str, ...]) -> List[Dict]:
+    """Sum `fields` of rows sharing `key` (partial months, shards and archives)."""
+    merged: Dict[Any, Dict] = {}
+    for row in rows:
+        if row[key] in merged:
+            for field in fields:
+                merged[row[key]][field] += row[field] or 0
+        else:
+            merged[row[key]] = dict(row)
+    return list(merged.values())
+
+
+def _average(total: float, count: float) -> float:
+    return round(total / count, 2) if count else 0
+
+
+@cached(get_data_version)
+def get_top_items(filters: Optional[Dict[str, Any]] = None, limit: int = 20) -> List[Dict]:
+    """Items with the highest spend (quantity x unit price) in the filtered period."""
+    rows = collect_monthly(
+        filters,
+        '''
+        SELECT n.key, n.name, SUM(s.quantity) as quantity, SUM(s.spend) as spend, SUM(s.lines) as purchases
+        FROM item_monthly_stats s JOIN item_names n ON n.id = s.name_id
+        {where}
+        GROUP BY n.id
+        HAVING SUM(s.lines) > 0
+        ''',
+        f'''
+        SELECT {_KEY.format(name='i.name')} as key, MIN(trim(i.name)) as name,
+               SUM({_QUANTITY.format(row='i')}) as quantity, SUM({_SPEND.format(row='i')}) as spend,
+               COUNT(*) as purchases
+        FROM items i JOIN transactions t ON t.id = i.transaction_id
+        {{where}} AND trim(i.name) != ''
+        GROUP BY 1
+        ''',
+    )
+    items = _merge(rows, 'key', ('quantity', 'spend', 'purchases'))
+    items.sort(key=lambda row: row['spend'], reverse=True)
+    return [{
+        'name': row['name'],
+        'quantity': row['quantity'],
+        'spend': row['spend'],
+        'purchases': row['purchases'],
+        'avg_unit_price': _average(row['spend'], row['quantity']),
+    } for row in items[:limit]]
+
+
+@cached(get_data_version)
+def get_item_price_history(name: str, filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
+    """Monthly quantity, spend and average unit price of one item (matched case-insensitively)."""
+    rows = collect_monthly(
+        filters,
+        # item_names ids differ between database files, so look the key up in each
+        '''
+        SELECT s.month, SUM(s.quantity) as quantity, SUM(s.spend) as spend, SUM(s.lines) as purchases
+        FROM item_monthly_stats s
+        {where} AND s.name_id = (SELECT id FROM item_names WHERE key = ?)
+        GROUP BY s.month
+        HAVING SUM(s.lines) > 0
+        ''',
+        f'''
+        SELECT {_MONTH.format(day='t.date_day')} as month,
+               SUM({_QUANTITY.format(row='i')}) as quantity, SUM({_SPEND.format(row='i')}) as spend,
+               COUNT(*) as purchases
+        FROM items i JOIN transactions t ON t.id = i.transaction_id
+        {{where}} AND {_KEY.format(name='i.name')} = ?
+        GROUP BY 1
+        ''',
+        [name.strip().lower()],
+    )
+    history = _merge(rows, 'month', ('quantity', 'spend', 'purchases'))
+    history.sort(key=lambda row: row['month'])
+    for row in history:
+        row['avg_unit_price'] = _average(row['spend'], row['quantity'])
+    return history
+
+
+@cached(get_data_version)
+def get_basket_sizes(filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
+    """Baskets (transactions with items) per month and their average size and spend."""
+    rows = collect_monthly(
+        filters,
+        '''
+        SELECT month, SUM(baskets) as baskets, SUM(lines) as lines, SUM(quantity) as quantity, SUM(spend) as spend
+        FROM basket_monthly_stats
+        {where}
+        GROUP BY month
+        HAVING SUM(baskets) > 0
+        ''',
+        f'''
+        SELECT {_MONTH.format(day='t.date_day')} as month, COUNT(DISTINCT i.transaction_id) as baskets,
+               COUNT(*) as lines, SUM({_QUANTITY.format(row='i')}) as quantity, SUM({_SPEND.format(row='i')}) as spend
+        FROM items i JOIN transactions t ON t.id = i.transaction_id
+        {{where}}
+        GROUP BY 1
+        ''',
+    )
+    months = _merge(rows, 'month', ('baskets', 'lines', 'quantity', 'spend'))
+    months.sort(key=lambda row: row['month'])
+    for row in months:
+        row['avg_lines'] = _average(row['lines'], row['baskets'])
+        row['avg_quantity'] = _average(row['quantity'], row['baskets'])
+        row['avg_spend'] = _average(row['spend'], row['baskets'])
+    return months
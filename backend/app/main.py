@@ -1,8 +1,13 @@
 """
 Main FastAPI application for Finance Dashboard.
 """
-from fastapi import FastAPI, HTTPException, Query
+import math
+import os
+import threading
+
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from .database import (
@@ -10,21 +15,54 @@ from .database import (
     get_transaction_by_id,
     get_summary_by_category,
     get_summary_by_date,
+    get_summary_by_platform,
+    get_period_comparison,
+    comparison_window,
+    get_platforms,
     get_category_colors,
     get_all_categories,
     get_balance,
-    init_db,
+    bootstrap,
+    parse_day,
+    prewarm_caches,
     update_transaction,
     create_transaction,
+    create_transactions,
     delete_transaction,
     add_item,
     update_item,
     delete_item,
-    get_item_by_id
+    get_item_by_id,
+    stop_writers
+)
+from . import shards
+from .responses import CompressionMiddleware, columnar_response
+from .search import search_transactions
+from .item_stats import get_top_items, get_item_price_history, get_basket_sizes
+from .distribution import get_amount_distribution
+from .rules import (
+    RuleSet,
+    list_rules,
+    get_rule,
+    validate_rule,
+    create_rule,
+    update_rule,
+    delete_rule,
+    load_ruleset,
+    categorize,
+    preview_rules,
+    apply_rules
+)
+from .profiling import (
+    ProfilingMiddleware,
+    get_settings as get_profiling_settings,
+    update_settings as update_profiling_settings,
+    list_profiles,
+    get_profile,
+    list_slow_queries
 )
-from .ai_analyzer import analyze_transactions
 
-app = FastAPI(title="Finance Dashboard API", version="1.0.0")
+app = FastAPI(title="Finance Dashboard API", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -34,22 +72,44 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+# Outermost, so profiles include compression
+app.add_middleware(ProfilingMiddleware)
+
+
+_shard_sync_stop = threading.Event()
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup."""
-    init_db()
+    """Initialize the database, then warm this worker's caches without holding up startup."""
+    # app.server bootstraps once before forking its workers; `uvicorn app.main:app` does not
+    if not os.environ.get("FINANCE_BOOTSTRAPPED"):
+        bootstrap()
+    # Requests are served meanwhile; anything not warmed yet is computed on demand
+    threading.Thread(target=prewarm_caches, name="finance-prewarm", daemon=True).start()
+    if shards.enabled():
+        # Rows the finance agent writes to finance.db reach the shards from here
+        _shard_sync_stop.clear()
+        threading.Thread(target=shards.sync_periodically, args=(_shard_sync_stop,),
+                         name="finance-shard-sync", daemon=True).start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the shard sync and flush queued writes before the process exits."""
+    _shard_sync_stop.set()
+    stop_writers()
 
 
 @app.get("/")
 async def root():
     """Root endpoint."""
-    return {
+    return ORJSONResponse({
         "message": "Finance Dashboard API",
         "version": "1.0.0",
         "docs": "/docs"
-    }
+    })
 
 
 @app.get("/api/health")
@@ -60,6 +120,7 @@ async def health_check():
 
 @app.get("/api/transactions")
 async def get_transactions_api(
+    request: Request,
     date_from: Optional[str] = Query(None, description="Filter by date from (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="Filter by date to (YYYY-MM-DD)"),
     category: Optional[str] = Query(None, description="Filter by category"),
@@ -76,6 +137,9 @@ async def get_transactions_api(
     - **transaction_type**: Transaction type (expense/income)
     - **platform**: Platform filter (e.g., K PLUS, LINE Pay, Shopee, etc.)
     - **email**: User email filter (default: ice@imice.im)
+
+    Send `Accept: application/vnd.apache.arrow.stream` or `Accept: application/msgpack`
+    for a column-oriented response (items become a nested list column).
     """
     filters = {}
     if date_from:
@@ -93,11 +157,7 @@ async def get_transactions_api(
 
     transactions = get_transactions(filters)
 
-    return {
-        "success": True,
-        "data": transactions,
-        "count": len(transactions)
-    }
+    return columnar_response(request, transactions, count=len(transactions))
 
 
 @app.get("/api/transactions/{transaction_id}")
@@ -110,14 +170,14 @@ async def get_transaction_api(transaction_id: str) -> Dict[str, Any]:
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
 
-    return {
+    return ORJSONResponse({
         "success": True,
         "data": transaction
-    }
+    })
 
 
 @app.put("/api/transactions/{transaction_id}")
-async def update_transaction_api(
+def update_transaction_api(
     transaction_id: str,
     transaction_data: Dict[str, Any]
 ) -> Dict[str, Any]:
@@ -131,19 +191,21 @@ async def update_transaction_api(
 
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
+    if transaction.get('archived'):
+        raise HTTPException(status_code=409, detail="Archived transactions are read-only")
 
     update_transaction(transaction_id, **transaction_data)
 
     updated = get_transaction_by_id(transaction_id)
-    return {
+    return ORJSONResponse({
         "success": True,
         "data": updated,
         "message": "Transaction updated successfully"
-    }
+    })
 
 
 @app.post("/api/transactions")
-async def create_transaction_api(
+def create_transaction_api(
     transaction_data: Dict[str, Any]
 ) -> Dict[str, Any]:
     """
@@ -153,15 +215,73 @@ async def create_transaction_api(
     """
     new_id = create_transaction(**transaction_data)
     new_transaction = get_transaction_by_id(new_id)
-    return {
+    return ORJSONResponse({
         "success": True,
         "data": new_transaction,
         "message": "Transaction created successfully"
-    }
+    })
+
+
+_IMPORT_REQUIRED = {'description', 'amount', 'date'}
+_IMPORT_OPTIONAL = {'category', 'platform', 'transaction_type', 'email_user'}
+
+
+def _import_row_error(row: Any) -> Optional[str]:
+    """Why a bulk import row cannot be stored, or None if it can."""
+    if not isinstance(row, dict) or not _IMPORT_REQUIRED <= set(row) or set(row) - _IMPORT_REQUIRED - _IMPORT_OPTIONAL:
+        return "needs description, amount and date and no unknown fields"
+    amount = row['amount']
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)) or not math.isfinite(amount):
+        return "amount must be a number"
+    if not isinstance(row['description'], str):
+        return "description must be a string"
+    try:
+        parse_day(row['date'])
+    except ValueError as e:
+        return str(e)
+    for key in _IMPORT_OPTIONAL:
+        if row.get(key) is not None and not isinstance(row[key], str):
+            return f"{key} must be a string"
+    return None
+
+
+@app.post("/api/transactions/bulk")
+def create_transactions_api(
+    import_data: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Import many transactions at once, categorized inline by the category rules.
+
+    - **import_data**: {"transactions": [...], "apply_rules": true}; each transaction
+      needs description, amount and date, and may have category, platform,
+      transaction_type and email_user. Rows no rule matches keep their category
+      (Miscellaneous if none is given).
+    """
+    rows = import_data.get('transactions')
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="transactions must be a list")
+    for n, row in enumerate(rows):
+        error = _import_row_error(row)
+        if error:
+            raise HTTPException(status_code=400, detail=f"Invalid transaction at index {n}: {error}")
+
+    rows = [dict(row) for row in rows]
+    recategorized = categorize(rows, load_ruleset()) if import_data.get('apply_rules', True) else 0
+    for row in rows:
+        row['category'] = row.get('category') or 'Miscellaneous'
+
+    ids = create_transactions(rows)
+    return ORJSONResponse({
+        "success": True,
+        "data": ids,
+        "count": len(ids),
+        "recategorized": recategorized,
+        "message": "Transactions imported successfully"
+    })
 
 
 @app.delete("/api/transactions/{transaction_id}")
-async def delete_transaction_api(transaction_id: str) -> Dict[str, Any]:
+def delete_transaction_api(transaction_id: str) -> Dict[str, Any]:
     """
     Delete a transaction and all its associated items.
 
@@ -171,17 +291,19 @@ async def delete_transaction_api(transaction_id: str) -> Dict[str, Any]:
 
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
+    if transaction.get('archived'):
+        raise HTTPException(status_code=409, detail="Archived transactions are read-only")
 
     delete_transaction(transaction_id)
 
-    return {
+    return ORJSONResponse({
         "success": True,
         "message": "Transaction deleted successfully"
-    }
+    })
 
 
 @app.post("/api/transactions/{transaction_id}/items")
-async def add_item_api(
+def add_item_api(
     transaction_id: str,
     name: str = Query(..., description="Item name"),
     quantity: int = Query(1, description="Item quantity"),
@@ -195,6 +317,13 @@ async def add_item_api(
     - **quantity**: Item quantity (default: 1)
     - **unit_price**: Item unit price (default: 0)
     """
+    transaction = get_transaction_by_id(transaction_id)
+
+    if not transaction:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    if transaction.get('archived'):
+        raise HTTPException(status_code=409, detail="Archived transactions are read-only")
+
     item_id = add_item(
         transaction_id=transaction_id,
         name=name,
@@ -202,15 +331,15 @@ async def add_item_api(
         unit_price=unit_price
     )
 
-    return {
+    return ORJSONResponse({
         "success": True,
         "data": {"id": item_id},
         "message": "Item added successfully"
-    }
+    })
 
 
 @app.put("/api/transactions/{transaction_id}/items/{item_id}")
-async def update_item_api(
+def update_item_api(
     transaction_id: str,
     item_id: int,
     name: Optional[str] = Query(None, description="Item name"),
@@ -230,17 +359,19 @@ async def update_item_api(
 
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
+    if transaction.get('archived'):
+        raise HTTPException(status_code=409, detail="Archived transactions are read-only")
 
     updated = update_item(item_id, name=name, quantity=quantity, unit_price=unit_price)
-    return {
+    return ORJSONResponse({
         "success": True,
         "data": updated,
         "message": "Item updated successfully"
-    }
+    })
 
 
 @app.delete("/api/transactions/{transaction_id}/items/{item_id}")
-async def delete_item_api(
+def delete_item_api(
     transaction_id: str,
     item_id: int
 ) -> Dict[str, Any]:
@@ -254,16 +385,63 @@ async def delete_item_api(
 
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
+    if transaction.get('archived'):
+        raise HTTPException(status_code=409, detail="Archived transactions are read-only")
 
     delete_item(item_id)
-    return {
+    return ORJSONResponse({
         "success": True,
         "message": "Item deleted successfully"
-    }
+    })
+
+
+@app.get("/api/search")
+async def search_transactions_api(
+    request: Request,
+    q: str = Query(..., min_length=1, description="Search text (description or item name)"),
+    page: int = Query(1, ge=1, description="Page number"),
+    page_size: int = Query(50, ge=1, le=500, description="Results per page"),
+    date_from: Optional[str] = Query(None, description="Filter by date from (YYYY-MM-DD)"),
+    date_to: Optional[str] = Query(None, description="Filter by date to (YYYY-MM-DD)"),
+    category: Optional[List[str]] = Query(None, description="Filter by category"),
+    platform: Optional[str] = Query(None, description="Filter by platform"),
+    email: Optional[str] = Query("ice@imice.im", description="Filter by user email")
+) -> Dict[str, Any]:
+    """
+    Full-text search over transaction descriptions and item names.
+
+    - **q**: Search text, Thai supported (terms are ANDed)
+    - **page** / **page_size**: Pagination
+    - Matches are wrapped in `<mark>` in `description_highlight` and `items_highlight`,
+      which are HTML-escaped otherwise
+    """
+    filters = {}
+    if date_from:
+        filters['date_from'] = date_from
+    if date_to:
+        filters['date_to'] = date_to
+    if category:
+        filters['category'] = category
+    if platform:
+        filters['platform'] = platform
+    if email:
+        filters['email'] = email
+
+    results = search_transactions(q, filters, page=page, page_size=page_size)
+
+    return columnar_response(
+        request,
+        results['data'],
+        count=len(results['data']),
+        total=results['total'],
+        page=page,
+        page_size=page_size
+    )
 
 
 @app.get("/api/summary/category")
 async def get_summary_by_category_api(
+    request: Request,
     date_from: Optional[str] = Query(None, description="Filter by date from (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="Filter by date to (YYYY-MM-DD)"),
     platform: Optional[str] = Query(None, description="Filter by platform"),
@@ -301,15 +479,12 @@ async def get_summary_by_category_api(
             "color": category_colors.get(item['category'], '#000000')
         })
 
-    return {
-        "success": True,
-        "data": result,
-        "count": len(result)
-    }
+    return columnar_response(request, result, count=len(result))
 
 
 @app.get("/api/summary/date")
 async def get_summary_by_date_api(
+    request: Request,
     date_from: Optional[str] = Query(None, description="Filter by date from (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="Filter by date to (YYYY-MM-DD)"),
     platform: Optional[str] = Query(None, description="Filter by platform"),
@@ -336,15 +511,12 @@ async def get_summary_by_date_api(
 
     summary = get_summary_by_date(filters)
 
-    return {
-        "success": True,
-        "data": summary,
-        "count": len(summary)
-    }
+    return columnar_response(request, summary, count=len(summary))
 
 
 @app.get("/api/summary/platform")
 async def get_summary_by_platform_api(
+    request: Request,
     date_from: Optional[str] = Query(None, description="Filter by date from (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="Filter by date to (YYYY-MM-DD)"),
     platform: Optional[str] = Query(None, description="Filter by platform"),
@@ -369,46 +541,178 @@ async def get_summary_by_platform_api(
     if email:
         filters['email'] = email
 
-    from .database import get_db_connection
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        query = '''
-            SELECT platform, SUM(amount) as total, COUNT(*) as count
-            FROM transactions
-            WHERE 1=1
-        '''
-        params = []
-
-        if filters.get('date_from'):
-            query += " AND date >= ?"
-            params.append(filters['date_from'])
-        if filters.get('date_to'):
-            query += " AND date <= ?"
-            params.append(filters['date_to'])
-        if filters.get('platform'):
-            query += " AND platform = ?"
-            params.append(filters['platform'])
-        if filters.get('category'):
-            if isinstance(filters['category'], list):
-                placeholders = ', '.join(['?'] * len(filters['category']))
-                query += f" AND category IN ({placeholders})"
-                params.extend(filters['category'])
-            else:
-                query += " AND category = ?"
-                params.append(filters['category'])
-        if filters.get('email'):
-            query += " AND email_user = ?"
-            params.append(filters['email'])
-
-        query += " GROUP BY platform ORDER BY total DESC"
-        cursor.execute(query, params)
-        summary = [dict(row) for row in cursor.fetchall()]
-
-    return {
-        "success": True,
-        "data": summary,
-        "count": len(summary)
-    }
+    summary = get_summary_by_platform(filters)
+
+    return columnar_response(request, summary, count=len(summary))
+
+
+@app.get("/api/summary/compare")
+async def get_period_comparison_api(
+    request: Request,
+    date_from: str = Query(..., description="Start of the current window (YYYY-MM-DD)"),
+    date_to: Optional[str] = Query(None, description="End of the current window (YYYY-MM-DD), default today"),
+    offset: List[str] = Query(["previous"], description="Baselines: 'previous' or an offset such as 7D, 2W, 1M, 1Y"),
+    platform: Optional[str] = Query(None, description="Filter by platform"),
+    category: Optional[List[str]] = Query(None, description="Filter by category"),
+    email: Optional[str] = Query("ice@imice.im", description="Filter by user email")
+) -> Dict[str, Any]:
+    """
+    Compare the current window against one or more baseline windows: totals,
+    counts, delta and percentage change overall, per category and per platform.
+
+    - **date_from**: Start of the current window (YYYY-MM-DD format)
+    - **date_to**: End of the current window (YYYY-MM-DD format)
+    - **offset**: Repeat to compare against several baselines at once
+    """
+    date_to = date_to or datetime.utcnow().date().isoformat()
+    offset = list(dict.fromkeys(offset))
+    try:
+        baselines = [dict(zip(('offset', 'date_from', 'date_to'), (o, *comparison_window(date_from, date_to, o))))
+                     for o in offset]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if date_from[:10] > date_to[:10]:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+
+    filters = {'date_from': date_from, 'date_to': date_to}
+    if platform:
+        filters['platform'] = platform
+    if category:
+        filters['category'] = category
+    if email:
+        filters['email'] = email
+
+    comparison = get_period_comparison(filters, offset)
+
+    return columnar_response(request, comparison, count=len(comparison),
+                             current={'date_from': date_from[:10], 'date_to': date_to[:10]},
+                             baselines=baselines)
+
+
+@app.get("/api/summary/distribution")
+async def get_amount_distribution_api(
+    request: Request,
+    date_from: Optional[str] = Query(None, description="Filter by date from (YYYY-MM-DD)"),
+    date_to: Optional[str] = Query(None, description="Filter by date to (YYYY-MM-DD)"),
+    category: Optional[List[str]] = Query(None, description="Filter by category"),
+    email: Optional[str] = Query("ice@imice.im", description="Filter by user email"),
+    top: int = Query(10, ge=0, le=32, description="Most frequent merchants per category")
+) -> Dict[str, Any]:
+    """
+    Get the spending distribution per category: count, total, mean, amount
+    quantiles (p10-p99, within 1%) and the most frequent merchants.
+
+    - **date_from**: Start date filter (YYYY-MM-DD format)
+    - **date_to**: End date filter (YYYY-MM-DD format)
+    - **top**: Number of merchants per category
+    """
+    filters = {}
+    if date_from:
+        filters['date_from'] = date_from
+    if date_to:
+        filters['date_to'] = date_to
+    if category:
+        filters['category'] = category
+    if email:
+        filters['email'] = email
+
+    try:
+        distribution = get_amount_distribution(filters, top)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return columnar_response(request, distribution, count=len(distribution))
+
+
+@app.get("/api/items/top")
+async def get_top_items_api(
+    request: Request,
+    date_from: Optional[str] = Query(None, description="Filter by date from (YYYY-MM-DD)"),
+    date_to: Optional[str] = Query(None, description="Filter by date to (YYYY-MM-DD)"),
+    email: Optional[str] = Query("ice@imice.im", description="Filter by user email"),
+    limit: int = Query(20, ge=1, le=500, description="Number of items")
+) -> Dict[str, Any]:
+    """
+    Get the items with the highest spend (quantity x unit price).
+
+    - **date_from**: Start date filter (YYYY-MM-DD format)
+    - **date_to**: End date filter (YYYY-MM-DD format)
+    - **limit**: Number of items to return
+    """
+    filters = {}
+    if date_from:
+        filters['date_from'] = date_from
+    if date_to:
+        filters['date_to'] = date_to
+    if email:
+        filters['email'] = email
+
+    try:
+        items = get_top_items(filters, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return columnar_response(request, items, count=len(items))
+
+
+@app.get("/api/items/price-history")
+async def get_item_price_history_api(
+    request: Request,
+    name: str = Query(..., min_length=1, description="Item name (case-insensitive)"),
+    date_from: Optional[str] = Query(None, description="Filter by date from (YYYY-MM-DD)"),
+    date_to: Optional[str] = Query(None, description="Filter by date to (YYYY-MM-DD)"),
+    email: Optional[str] = Query("ice@imice.im", description="Filter by user email")
+) -> Dict[str, Any]:
+    """
+    Get the monthly average unit price, quantity and spend of one item.
+
+    - **name**: Item name
+    - **date_from**: Start date filter (YYYY-MM-DD format)
+    - **date_to**: End date filter (YYYY-MM-DD format)
+    """
+    filters = {}
+    if date_from:
+        filters['date_from'] = date_from
+    if date_to:
+        filters['date_to'] = date_to
+    if email:
+        filters['email'] = email
+
+    try:
+        history = get_item_price_history(name, filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return columnar_response(request, history, count=len(history))
+
+
+@app.get("/api/items/basket-size")
+async def get_basket_sizes_api(
+    request: Request,
+    date_from: Optional[str] = Query(None, description="Filter by date from (YYYY-MM-DD)"),
+    date_to: Optional[str] = Query(None, description="Filter by date to (YYYY-MM-DD)"),
+    email: Optional[str] = Query("ice@imice.im", description="Filter by user email")
+) -> Dict[str, Any]:
+    """
+    Get the number of baskets (transactions with items) per month and their average size.
+
+    - **date_from**: Start date filter (YYYY-MM-DD format)
+    - **date_to**: End date filter (YYYY-MM-DD format)
+    """
+    filters = {}
+    if date_from:
+        filters['date_from'] = date_from
+    if date_to:
+        filters['date_to'] = date_to
+    if email:
+        filters['email'] = email
+
+    try:
+        months = get_basket_sizes(filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return columnar_response(request, months, count=len(months))
 
 
 @app.get("/api/categories")
@@ -428,10 +732,10 @@ async def get_categories_api() -> Dict[str, Any]:
             "color": category['color']
         })
 
-    return {
+    return ORJSONResponse({
         "success": True,
         "data": result
-    }
+    })
 
 
 @app.get("/api/platforms")
@@ -439,21 +743,12 @@ async def get_platforms_api() -> Dict[str, Any]:
     """
     Get all unique platforms from transactions.
     """
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT DISTINCT platform
-            FROM transactions
-            WHERE platform IS NOT NULL
-            AND platform != ''
-            ORDER BY platform
-        ''')
-        platforms = [row['platform'] for row in cursor.fetchall()]
-
-    return {
+    platforms = get_platforms()
+
+    return ORJSONResponse({
         "success": True,
         "data": platforms
-    }
+    })
 
 
 @app.get("/api/balance")
@@ -462,10 +757,138 @@ async def get_balance_api() -> Dict[str, Any]:
     Get current balance information.
     """
     balance = get_balance()
-    return {
+    return ORJSONResponse({
         "success": True,
         "data": balance
-    }
+    })
+
+
+@app.get("/api/rules")
+async def get_rules_api() -> Dict[str, Any]:
+    """Get all category rules, highest priority first."""
+    rules = list_rules()
+    return ORJSONResponse({
+        "success": True,
+        "data": rules,
+        "count": len(rules)
+    })
+
+
+@app.post("/api/rules")
+def create_rule_api(rule_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Create a category rule.
+
+    - **rule_data**: category (target) plus any of name, patterns (description
+      substrings), platform, min_amount, max_amount, match_category, priority, enabled
+    """
+    try:
+        rule = validate_rule(rule_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rule_id = create_rule(rule)
+    return ORJSONResponse({
+        "success": True,
+        "data": get_rule(rule_id),
+        "message": "Rule created successfully"
+    })
+
+
+@app.put("/api/rules/{rule_id}")
+def update_rule_api(rule_id: int, rule_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Update fields of a category rule.
+
+    - **rule_id**: ID of the rule to update
+    """
+    current = get_rule(rule_id)
+    if not current:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    try:
+        rule = validate_rule(rule_data, partial=True, current=current)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    update_rule(rule_id, rule)
+    return ORJSONResponse({
+        "success": True,
+        "data": get_rule(rule_id),
+        "message": "Rule updated successfully"
+    })
+
+
+@app.delete("/api/rules/{rule_id}")
+def delete_rule_api(rule_id: int) -> Dict[str, Any]:
+    """
+    Delete a category rule.
+
+    - **rule_id**: ID of the rule to delete
+    """
+    if not get_rule(rule_id):
+        raise HTTPException(status_code=404, detail="Rule not found")
+    delete_rule(rule_id)
+    return ORJSONResponse({
+        "success": True,
+        "message": "Rule deleted successfully"
+    })
+
+
+def _rules_request(body: Dict[str, Any]):
+    """Rule set and scope of a preview/apply request body."""
+    if body.get('rule') is not None:
+        try:
+            rule = validate_rule(body['rule'])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        defaults = {'id': 0, 'name': None, 'patterns': [], 'platform': None, 'min_amount': None,
+                    'max_amount': None, 'match_category': None, 'priority': 0, 'enabled': True}
+        ruleset = RuleSet([{**defaults, **rule}])
+    else:
+        rule_ids = body.get('rule_ids')
+        if rule_ids is not None and not (isinstance(rule_ids, list)
+                                         and all(isinstance(rule_id, int) for rule_id in rule_ids)):
+            raise HTTPException(status_code=400, detail="rule_ids must be a list of integers")
+        ruleset = load_ruleset(rule_ids)
+    filters = {key: body[key] for key in ('date_from', 'date_to', 'email') if body.get(key)}
+    if not all(isinstance(value, str) for value in filters.values()):
+        raise HTTPException(status_code=400, detail="date_from, date_to and email must be strings")
+    return ruleset, filters
+
+
+@app.post("/api/rules/preview")
+def preview_rules_api(request: Request, body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Preview which transactions the rules would recategorize, without changing anything.
+
+    - **body**: optional rule_ids (default: all enabled rules) or an unsaved
+      rule definition under "rule", date_from, date_to, email and limit (default 100)
+    """
+    ruleset, filters = _rules_request(body)
+    try:
+        limit = int(body.get('limit', 100))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="limit must be an integer")
+    rows, total, per_rule = preview_rules(ruleset, filters, limit)
+    return columnar_response(request, rows, count=total,
+                             rules=[{"rule_id": rule_id, "count": count} for rule_id, count in per_rule.items()])
+
+
+@app.post("/api/rules/apply")
+def apply_rules_api(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Recategorize every matching transaction with one set-based update per database file.
+
+    - **body**: optional rule_ids (default: all enabled rules), date_from, date_to and email
+    """
+    if body.get('rule') is not None:
+        raise HTTPException(status_code=400, detail="Save the rule before applying it")
+    ruleset, filters = _rules_request(body)
+    per_rule = apply_rules(ruleset, filters)
+    return ORJSONResponse({
+        "success": True,
+        "count": sum(per_rule.values()),
+        "rules": [{"rule_id": rule_id, "count": count} for rule_id, count in per_rule.items()],
+        "message": "Rules applied successfully"
+    })
 
 
 @app.post("/api/ai/analyze")
@@ -489,13 +912,88 @@ async def analyze_finance_api(
 
     transactions = get_transactions(filters)
     
+    # Imported here so requests and the AI client only load when AI is used
+    from .ai_analyzer import analyze_transactions
+
     # We only send the last 50 transactions to avoid token limit and reduce processing time
     analysis = analyze_transactions(transactions[:50], user_prompt=prompt, model_override=model)
     
-    return {
+    return ORJSONResponse({
         "success": True,
         "data": analysis
-    }
+    })
+
+
+@app.get("/api/admin/profiling")
+async def get_profiling_api() -> Dict[str, Any]:
+    """Get the profiling settings shared by all workers."""
+    return ORJSONResponse({
+        "success": True,
+        "data": get_profiling_settings(fresh=True)
+    })
+
+
+@app.put("/api/admin/profiling")
+def update_profiling_api(settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Change the profiling settings for all workers.
+
+    - **profile_all**: Profile every request (not only those sent with `X-Profile: 1`)
+    - **slow_query_ms**: Log statements slower than this with their plan; null turns the log off
+    """
+    changes = {}
+    if 'profile_all' in settings:
+        changes['profile_all'] = bool(settings['profile_all'])
+    if 'slow_query_ms' in settings:
+        threshold = settings['slow_query_ms']
+        if threshold is not None and (not isinstance(threshold, (int, float)) or threshold < 0):
+            raise HTTPException(status_code=400, detail="slow_query_ms must be a non-negative number or null")
+        changes['slow_query_ms'] = threshold
+    return ORJSONResponse({
+        "success": True,
+        "data": update_profiling_settings(**changes),
+        "message": "Profiling settings updated successfully"
+    })
+
+
+@app.get("/api/admin/profiles")
+async def get_profiles_api(
+    limit: int = Query(50, ge=1, le=200, description="Number of profiles")
+) -> Dict[str, Any]:
+    """Get the most recent request profiles (without their stacks)."""
+    profiles = list_profiles(limit)
+    return ORJSONResponse({
+        "success": True,
+        "data": profiles,
+        "count": len(profiles)
+    })
+
+
+@app.get("/api/admin/profiles/{profile_id}")
+async def get_profile_api(profile_id: str) -> PlainTextResponse:
+    """
+    Get a request profile as folded stacks, the input format of flamegraph.pl,
+    speedscope and inferno.
+
+    - **profile_id**: Value of the X-Profile-Id response header
+    """
+    folded = get_profile(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(folded)
+
+
+@app.get("/api/admin/slow-queries")
+async def get_slow_queries_api(
+    limit: int = Query(100, ge=1, le=1000, description="Number of statements")
+) -> Dict[str, Any]:
+    """Get the most recent statements over the slow-query threshold with their query plans."""
+    queries = list_slow_queries(limit)
+    return ORJSONResponse({
+        "success": True,
+        "data": queries,
+        "count": len(queries)
+    })
 
 
 @app.get("/api/dashboard")
@@ -522,7 +1020,7 @@ async def get_dashboard_api(
 
     category_colors = get_category_colors()
 
-    return {
+    return ORJSONResponse({
         "success": True,
         "data": {
             "balance": balance,
@@ -531,7 +1029,7 @@ async def get_dashboard_api(
             "dateSummary": date_summary,
             "categories": get_all_categories()
         }
-    }
+    })
 
 
 if __name__ == "__main__":
@@ -0,0 +1,368 @@
+"""
+Opt-in request profiling and slow-query log for Finance Dashboard.
+
+Request profiling: a request sent with `X-Profile: 1` (or every request while
+the admin toggle `profile_all` is on) runs under a sampling profiler that
+records the Python stack of every busy thread each millisecond - the event
+loop, the threadpool running sync endpoints and the database writers - so the
+profile shows whether time goes to SQL, building rows, parsing items or
+encoding. Samples are stored as folded stacks ("frame;frame;frame count"),
+which flamegraph.pl, speedscope and inferno read directly. The response gets
+an `X-Profile-Id` header naming the stored profile. Other requests running at
+the same time show up in it as well, so profile on a quiet instance.
+
+Slow-query log: while `slow_query_ms` is set, every connection to finance.db
+and its shards/archives gets a sqlite3 trace callback and progress handler
+that time each statement (from its start until its last VM step, so rows
+fetched lazily count). Statements over the threshold are logged with their
+EXPLAIN QUERY PLAN by a background thread, off the request path.
+
+Both go to a small SQLite file (PROFILE_PATH, FINANCE_PROFILE_PATH in the
+environment) shared by all workers; the settings there apply to every worker
+within a second. FINANCE_SLOW_QUERY_MS sets the initial threshold.
+"""
+import logging
+import math
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PATH = os.environ.get("FINANCE_PROFILE_PATH", "/tmp/finance_profile.db")
+SAMPLE_INTERVAL = 0.001
+MAX_PROFILES = 200
+MAX_SLOW_QUERIES = 1000
+# Statements shorter than this many VM steps never reach any sensible threshold
+PROGRESS_STEPS = 1000
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_SETTINGS_TTL = 1.0
+_settings: Dict[str, Any] = {}
+_settings_read_at = 0.0
+_settings_lock = threading.Lock()
+_conn_state = threading.local()
+
+
+def _env_threshold() -> Optional[float]:
+    """Initial slow-query threshold from FINANCE_SLOW_QUERY_MS; off when unset or invalid."""
+    value = os.environ.get("FINANCE_SLOW_QUERY_MS")
+    if not value:
+        return None
+    try:
+        threshold = float(value)
+    except ValueError:
+        threshold = math.nan
+    if not threshold >= 0:
+        logger.warning("Ignoring FINANCE_SLOW_QUERY_MS=%r: expected a non-negative number of "
+                       "milliseconds; the slow-query log stays off", value)
+        return None
+    return threshold
+
+
+def _profile_conn() -> sqlite3.Connection:
+    """One connection to the profile file per thread."""
+    conn = getattr(_conn_state, 'conn', None)
+    if conn is None or getattr(_conn_state, 'path', None) != PROFILE_PATH:
+        conn = sqlite3.connect(PROFILE_PATH, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS profiling_settings (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                profile_all INTEGER NOT NULL DEFAULT 0,
+                slow_query_ms REAL
+            );
+            CREATE TABLE IF NOT EXISTS request_profiles (
+                id TEXT PRIMARY KEY,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                method TEXT,
+                path TEXT,
+                query TEXT,
+                status INTEGER,
+                duration_ms REAL,
+                samples INTEGER,
+                folded TEXT
+            );
+            CREATE TABLE IF NOT EXISTS slow_queries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                db TEXT,
+                duration_ms REAL,
+                sql TEXT,
+                plan TEXT
+            );
+        ''')
+        conn.execute("INSERT OR IGNORE INTO profiling_settings (id, slow_query_ms) VALUES (1, ?)",
+                     (_env_threshold(),))
+        _conn_state.conn = conn
+        _conn_state.path = PROFILE_PATH
+    return conn
+
+
+def get_settings(fresh: bool = False) -> Dict[str, Any]:
+    """Current {'profile_all', 'slow_query_ms'}, re-read from the shared file at most once a second."""
+    global _settings, _settings_read_at
+    now = time.monotonic()
+    if fresh or now - _settings_read_at > _SETTINGS_TTL:
+        with _settings_lock:
+            try:
+                row = _profile_conn().execute(
+                    "SELECT profile_all, slow_query_ms FROM profiling_settings WHERE id = 1").fetchone()
+                _settings = {'profile_all': bool(row[0]), 'slow_query_ms': row[1]}
+            except sqlite3.Error:
+                # Profiling is best effort; an unreadable file means it is off
+                _settings = {'profile_all': False, 'slow_query_ms': None}
+            _settings_read_at = now
+    return _settings
+
+
+def update_settings(profile_all: Optional[bool] = None, slow_query_ms: Any = ...) -> Dict[str, Any]:
+    """Change the shared settings; pass slow_query_ms=None to turn the slow-query log off."""
+    conn = _profile_conn()
+    if profile_all is not None:
+        conn.execute("UPDATE profiling_settings SET profile_all = ? WHERE id = 1", (1 if profile_all else 0,))
+    if slow_query_ms is not ...:
+        conn.execute("UPDATE profiling_settings SET slow_query_ms = ? WHERE id = 1", (slow_query_ms,))
+    return get_settings(fresh=True)
+
+
+# --- Sampling profiler -------------------------------------------------------
+
+def _frame_label(frame) -> str:
+    # Current line, like py-spy, so e.g. execute() and fetchall() in one function stay apart
+    filename = frame.f_code.co_filename
+    if filename.startswith(_APP_DIR):
+        filename = 'app/' + os.path.relpath(filename, _APP_DIR)
+    else:
+        filename = os.path.basename(filename)
+    return f"{frame.f_code.co_name} ({filename}:{frame.f_lineno})"
+
+
+class Sampler(threading.Thread):
+    """Collect folded stacks of every thread that is running app code until stopped."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name="finance-profiler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                in_app = False
+                while frame is not None:
+                    code = frame.f_code
+                    if code.co_filename.startswith(_APP_DIR):
+                        in_app = True
+                        # A writer waiting for its next job is idle, not work
+                        if code.co_name == '_next_batch':
+                            in_app = False
+                            break
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if in_app:
+                    stack.append(names.get(ident, 'thread'))
+                    self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self) -> str:
+        """Stop sampling and return the folded stacks."""
+        self._stop_event.set()
+        self.join()
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+def _save_profile(profile_id: str, scope: Scope, status: int, duration_ms: float, sampler: Sampler,
+                  folded: str) -> None:
+    try:
+        conn = _profile_conn()
+        conn.execute('''
+            INSERT INTO request_profiles (id, method, path, query, status, duration_ms, samples, folded)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (profile_id, scope.get('method'), scope.get('path'), scope.get('query_string', b'').decode('latin-1'),
+              status, duration_ms, sampler.samples, folded))
+        conn.execute('''
+            DELETE FROM request_profiles WHERE id NOT IN (
+                SELECT id FROM request_profiles ORDER BY created_at DESC, rowid DESC LIMIT ?
+            )
+        ''', (MAX_PROFILES,))
+    except sqlite3.Error:
+        pass
+
+
+class ProfilingMiddleware:
+    """Profile requests carrying `X-Profile: 1`, or all requests while profile_all is on."""
+
+    def __init__(self, app: ASGIApp, header: str = "x-profile", exclude_prefix: str = "/api/admin/"):
+        self.app = app
+        self.header = header
+        self.exclude_prefix = exclude_prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_prefix):
+            await self.app(scope, receive, send)
+            return
+        requested = Headers(scope=scope).get(self.header, "").lower() in ("1", "true", "yes")
+        if not requested and not get_settings()['profile_all']:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex[:16]
+        status = 0
+        sampler = Sampler()
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(raw=message["headers"])
+                headers["X-Profile-Id"] = profile_id
+                headers.append("Server-Timing", f"app;dur={(time.perf_counter() - started) * 1000:.1f}")
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            folded = sampler.stop()
+            duration_ms = (time.perf_counter() - started) * 1000
+            _save_profile(profile_id, scope, status, duration_ms, sampler, folded)
+
+
+def list_profiles(limit: int = 50) -> List[Dict]:
+    conn = _profile_conn()
+    cursor = conn.execute('''
+        SELECT id, created_at, method, path, query, status, duration_ms, samples
+        FROM request_profiles ORDER BY created_at DESC, rowid DESC LIMIT ?
+    ''', (limit,))
+    names = [col[0] for col in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def get_profile(profile_id: str) -> Optional[str]:
+    """Folded stacks of a stored profile."""
+    row = _profile_conn().execute("SELECT folded FROM request_profiles WHERE id = ?", (profile_id,)).fetchone()
+    return row[0] if row else None
+
+
+# --- Slow-query log ------------------------------------------------------------
+
+_slow_queue: "queue.Queue" = queue.Queue()
+_slow_thread: Optional[threading.Thread] = None
+_slow_lock = threading.Lock()
+
+# Statements that only manage transactions end the previous statement but are not timed
+_CONTROL = ('BEGIN', 'COMMIT', 'END', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+
+def trace(conn: sqlite3.Connection, db_path: str) -> Callable[[], None]:
+    """Time the statements run on `conn` while the slow-query log is on.
+
+    Returns a function to call before closing the connection, so the last
+    statement is timed too. Calling trace again on a long-lived connection
+    picks up a changed setting.
+    """
+    threshold = get_settings()['slow_query_ms']
+    if threshold is None:
+        conn.set_trace_callback(None)
+        conn.set_progress_handler(None, 0)
+        return lambda: None
+
+    current: Dict[str, Any] = {'sql': None, 'start': 0.0, 'last': 0.0}
+
+    def finish() -> None:
+        if current['sql'] is not None:
+            duration_ms = (current['last'] - current['start']) * 1000
+            if duration_ms >= threshold:
+                _log_slow(db_path, current['sql'], duration_ms)
+            current['sql'] = None
+
+    def on_statement(sql: str) -> None:
+        # Trigger programs report their parent statement again and virtual tables such
+        # as FTS5 run "-- " sub-statements; both are still the same statement
+        if sql == current['sql'] or sql.startswith('--'):
+            return
+        finish()
+        if sql.lstrip()[:9].upper().startswith(_CONTROL):
+            return
+        now = time.perf_counter()
+        current.update(sql=sql, start=now, last=now)
+
+    def on_progress() -> int:
+        current['last'] = time.perf_counter()
+        return 0
+
+    conn.set_trace_callback(on_statement)
+    conn.set_progress_handler(on_progress, PROGRESS_STEPS)
+    return finish
+
+
+def _log_slow(db_path: str, sql: str, duration_ms: float) -> None:
+    global _slow_thread
+    _slow_queue.put((db_path, sql, duration_ms))
+    if _slow_thread is None:
+        with _slow_lock:
+            if _slow_thread is None:
+                _slow_thread = threading.Thread(target=_slow_query_writer, name="finance-slow-query-log",
+                                                daemon=True)
+                _slow_thread.start()
+
+
+def explain(db_path: str, sql: str) -> str:
+    """EXPLAIN QUERY PLAN of `sql` as an indented tree, run on a separate read-only connection."""
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=5)
+        try:
+            rows = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        # e.g. statements on temp tables of the original connection
+        return f"(no plan: {e})"
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return '\n'.join(lines)
+
+
+def _slow_query_writer() -> None:
+    while True:
+        db_path, sql, duration_ms = _slow_queue.get()
+        plan = explain(db_path, sql)
+        try:
+            conn = _profile_conn()
+            conn.execute("INSERT INTO slow_queries (db, duration_ms, sql, plan) VALUES (?, ?, ?, ?)",
+                         (db_path, duration_ms, sql, plan))
+            conn.execute("DELETE FROM slow_queries WHERE id <= (SELECT MAX(id) FROM slow_queries) - ?",
+                         (MAX_SLOW_QUERIES,))
+        except sqlite3.Error:
+            pass
+
+
+def list_slow_queries(limit: int = 100) -> List[Dict]:
+    conn = _profile_conn()
+    cursor = conn.execute('''
+        SELECT id, created_at, db, duration_ms, sql, plan FROM slow_queries
+        ORDER BY id DESC LIMIT ?
+    ''', (limit,))
+    names = [col[0] for col in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
@@ -0,0 +1,197 @@
+"""
+Response helpers for Finance Dashboard.
+
+Endpoints return ORJSONResponse directly so FastAPI skips jsonable_encoder (a
+deep copy of every transaction dict) and the payload is encoded by orjson in a
+single pass. CompressionMiddleware then negotiates zstd or gzip for large bodies.
+
+Read endpoints can also answer with column-oriented Arrow IPC or MessagePack
+for analytics clients (`pyarrow` / `msgpack`). A client that accepts only a
+format that is not installed gets 406 instead of JSON.
+"""
+import gzip
+import importlib.util
+from typing import List, Dict, Any, Optional
+
+import orjson
+from fastapi import HTTPException, Request
+from fastapi.responses import ORJSONResponse, Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip is always available
+    zstandard = None
+
+# pyarrow takes tens of milliseconds to import, so only check that it is
+# installed here and import it with the first Arrow response
+_arrow_available = importlib.util.find_spec("pyarrow") is not None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick 'zstd' or 'gzip' from an Accept-Encoding header, honouring q=0."""
+    accepted = {}
+    for part in accept_encoding.lower().split(','):
+        token, _, params = part.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token] = q
+
+    candidates = ['zstd', 'gzip'] if zstandard is not None else ['gzip']
+    best = None
+    for encoding in candidates:
+        q = accepted.get(encoding, accepted.get('*', 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (encoding, q)
+    return best[0] if best else None
+
+
+def compress(body: bytes, encoding: str, gzip_level: int = 6, zstd_level: int = 3) -> bytes:
+    """Compress `body` with the negotiated encoding."""
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=zstd_level).compress(body)
+    return gzip.compress(body, compresslevel=gzip_level)
+
+
+class CompressionMiddleware:
+    """Compress complete responses larger than `minimum_size` with zstd or gzip.
+
+    Streaming responses (more than one body chunk) are passed through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, zstd_level: int = 3):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            if message.get("more_body", False) or "content-encoding" in headers:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) >= self.minimum_size:
+                body = compress(body, encoding, self.gzip_level, self.zstd_level)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _accepted_media_types(accept: str) -> Dict[str, float]:
+    """Media types of an Accept header with their q values."""
+    accepted = {}
+    for part in accept.lower().split(','):
+        media_type, _, params = part.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media_type:
+            accepted[media_type.strip()] = q
+    return accepted
+
+
+def to_columns(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Pivot a list of row dicts into {column: [values]}, keeping first-seen key order."""
+    names: Dict[str, None] = {}
+    for row in rows:
+        for key in row:
+            names.setdefault(key)
+    return {name: [row.get(name) for row in rows] for name in names}
+
+
+def _arrow_body(columns: Dict[str, List[Any]], meta: Dict[str, Any]) -> bytes:
+    import pyarrow
+    import pyarrow.ipc
+
+    table = pyarrow.Table.from_pydict(columns)
+    # Scalars such as count/total travel as JSON in the schema metadata
+    table = table.replace_schema_metadata({k: orjson.dumps(v) for k, v in meta.items()})
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def columnar_response(request: Request, rows: List[Dict[str, Any]], **meta: Any) -> Response:
+    """Return `rows` as Arrow IPC, MessagePack or JSON depending on the Accept header.
+
+    JSON keeps the usual {"success", "data", **meta} envelope. The binary formats
+    are column-oriented; nested values such as transaction items become list columns.
+    """
+    accepted = _accepted_media_types(request.headers.get("accept", ""))
+    if not accepted:
+        accepted = {"*/*": 1.0}
+    any_q = accepted.get("*/*", 0.0)
+    json_q = max(accepted.get("application/json", 0.0), accepted.get("application/*", any_q))
+
+    # Highest q wins; on ties the binary formats go first, as they are only ever asked for explicitly
+    candidates = [("json", json_q)]
+    if msgpack is not None:
+        candidates.insert(0, ("msgpack", max(accepted.get(m, 0.0) for m in MSGPACK_MEDIA_TYPES)))
+    if _arrow_available:
+        candidates.insert(0, ("arrow", accepted.get(ARROW_MEDIA_TYPE, 0.0)))
+    best, q = max(candidates, key=lambda candidate: candidate[1])
+    if q <= 0:
+        raise HTTPException(status_code=406, detail="Acceptable formats: application/json"
+                            + (f", {ARROW_MEDIA_TYPE}" if _arrow_available else "")
+                            + (f", {MSGPACK_MEDIA_TYPES[0]}" if msgpack is not None else ""))
+
+    if best == "arrow":
+        response = Response(_arrow_body(to_columns(rows), meta), media_type=ARROW_MEDIA_TYPE)
+    elif best == "msgpack":
+        media_type = next(m for m in MSGPACK_MEDIA_TYPES if accepted.get(m, 0.0) == q)
+        body = msgpack.packb({"success": True, **meta, "columns": to_columns(rows)}, use_bin_type=True)
+        response = Response(body, media_type=media_type)
+    else:
+        response = ORJSONResponse({"success": True, "data": rows, **meta})
+    response.headers.append("Vary", "Accept")
+    return response
@@ -0,0 +1,385 @@
+"""
+Rule-based recategorization for Finance Dashboard.
+
+A rule sets `category` on every transaction it matches:
+
+- patterns:       case-insensitive substrings of the description (any one matches);
+                  no patterns matches every description
+- platform:       exact platform
+- min_amount /
+  max_amount:     inclusive amount range
+- match_category: current category, e.g. to fold the overlapping seeded
+                  "Food" into "Food & Dining" or "Transport" into "Transportation"
+
+A rule needs at least one of these conditions.
+
+All patterns of all rules are compiled into one Aho-Corasick automaton, so a
+description is scanned once however many rules there are. When several rules
+match, the highest priority wins (then the oldest rule); a rule matching the
+category another rule just set is followed as well, so running twice changes
+nothing more.
+
+Rules are applied to the whole hot history in one pass per database file: rows
+are evaluated and the changes written with a single set-based UPDATE inside
+one writer job, so no edit can slip in between. Archived rows are read-only and
+are not touched. The bulk import endpoint runs the same rules inline.
+"""
+import functools
+from collections import deque
+from typing import List, Dict, Any, Optional, Tuple
+
+import orjson
+
+from .database import get_db_connection, writer, _writer_for, _paths_for, _DAY_PARAM_SQL
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS category_rules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        patterns TEXT NOT NULL DEFAULT '[]',
+        platform TEXT,
+        min_amount REAL,
+        max_amount REAL,
+        match_category TEXT,
+        category TEXT NOT NULL,
+        priority INTEGER NOT NULL DEFAULT 0,
+        enabled INTEGER NOT NULL DEFAULT 1,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+'''
+
+RULE_FIELDS = ('name', 'patterns', 'platform', 'min_amount', 'max_amount', 'match_category',
+               'category', 'priority', 'enabled')
+
+
+class Automaton:
+    """Aho-Corasick automaton over a list of lower-case patterns.
+
+    Failure links are folded into a full transition table, so scanning a text
+    is one dict lookup per character.
+    """
+
+    def __init__(self, patterns: List[str]):
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[set] = [set()]
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for ch in pattern:
+                if ch not in goto[state]:
+                    goto.append({})
+                    outputs.append(set())
+                    goto[state][ch] = len(goto) - 1
+                state = goto[state][ch]
+            outputs[state].add(index)
+
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            delta[state] = dict(delta[fail[state]])
+            delta[state].update(goto[state])
+            for ch, child in goto[state].items():
+                fail[child] = delta[fail[state]].get(ch, 0)
+                outputs[child] |= outputs[fail[child]]
+                queue.append(child)
+            outputs[state] |= outputs[fail[state]]
+
+        self._delta = delta
+        self._outputs = [frozenset(out) for out in outputs]
+
+    def search(self, text: str) -> set:
+        """Indexes of the patterns occurring in `text`."""
+        delta, outputs = self._delta, self._outputs
+        found: set = set()
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if outputs[state]:
+                found |= outputs[state]
+        return found
+
+
+class RuleSet:
+    """Compiled rules; `match` returns the winning rule for one transaction."""
+
+    def __init__(self, rules: List[Dict]):
+        self.rules = sorted(rules, key=lambda rule: (-rule['priority'], rule['id']))
+        patterns: Dict[str, int] = {}
+        self._pattern_rules: List[List[int]] = []
+        self._unconditional: List[int] = []
+        for position, rule in enumerate(self.rules):
+            if not rule['patterns']:
+                self._unconditional.append(position)
+            for pattern in rule['patterns']:
+                key = pattern.lower()
+                if key not in patterns:
+                    patterns[key] = len(patterns)
+                    self._pattern_rules.append([])
+                self._pattern_rules[patterns[key]].append(position)
+        self._automaton = Automaton(list(patterns))
+        self._hits: Dict[str, Tuple[int, ...]] = {}
+
+    def _candidates(self, description: Optional[str]) -> Tuple[int, ...]:
+        # Descriptions repeat a lot (same merchants), so remember the candidates per text
+        text = description or ''
+        hits = self._hits.get(text)
+        if hits is None:
+            positions = set(self._unconditional)
+            for index in self._automaton.search(text.lower()):
+                positions.update(self._pattern_rules[index])
+            hits = tuple(sorted(positions))
+            if len(self._hits) > 100000:
+                self._hits.clear()
+            self._hits[text] = hits
+        return hits
+
+    def match(self, description: Optional[str], amount: Optional[float], platform: Optional[str],
+              category: Optional[str]) -> Optional[Dict]:
+        for position in self._candidates(description):
+            rule = self.rules[position]
+            if rule['platform'] is not None and rule['platform'] != platform:
+                continue
+            if rule['match_category'] is not None and rule['match_category'] != category:
+                continue
+            if rule['min_amount'] is not None and (amount is None or amount < rule['min_amount']):
+                continue
+            if rule['max_amount'] is not None and (amount is None or amount > rule['max_amount']):
+                continue
+            return rule
+        return None
+
+    def resolve(self, description: Optional[str], amount: Optional[float], platform: Optional[str],
+                category: Optional[str]) -> Optional[Dict]:
+        """Rule that sets the final category, following rules that match the category set by another.
+
+        This makes a run idempotent; cycles stop after every rule had a turn.
+        Returns None when the category would not change.
+        """
+        final = None
+        current = category
+        for _ in range(len(self.rules)):
+            rule = self.match(description, amount, platform, current)
+            if rule is None or rule['category'] == current:
+                break
+            final, current = rule, rule['category']
+        return final if current != category else None
+
+
+def init_rules() -> None:
+    with get_db_connection() as conn:
+        conn.executescript(SCHEMA)
+
+
+def _rule_from_row(row) -> Dict:
+    rule = dict(row)
+    rule['patterns'] = orjson.loads(rule['patterns'])
+    rule['enabled'] = bool(rule['enabled'])
+    return rule
+
+
+def list_rules() -> List[Dict]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM category_rules ORDER BY priority DESC, id')
+        return [_rule_from_row(row) for row in cursor.fetchall()]
+
+
+def get_rule(rule_id: int) -> Optional[Dict]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM category_rules WHERE id = ?', (rule_id,))
+        row = cursor.fetchone()
+        return _rule_from_row(row) if row else None
+
+
+def _has_condition(rule: Dict[str, Any]) -> bool:
+    return bool(rule.get('patterns') or rule.get('platform') or rule.get('match_category')
+                or rule.get('min_amount') is not None or rule.get('max_amount') is not None)
+
+
+def validate_rule(data: Dict[str, Any], partial: bool = False,
+                  current: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Normalize rule fields from a request body, raising ValueError on bad input.
+
+    `current` is the stored rule a partial update applies to.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("A rule must be an object")
+    unknown = set(data) - set(RULE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown rule fields: {', '.join(sorted(unknown))}")
+    rule = dict(data)
+    for field in ('name', 'platform', 'match_category', 'category'):
+        if rule.get(field) is not None and not isinstance(rule[field], str):
+            raise ValueError(f"{field} must be a string")
+    if (not partial or 'category' in rule) and not rule.get('category'):
+        raise ValueError("category is required")
+    if 'patterns' in rule:
+        patterns = rule['patterns'] or []
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        if not all(isinstance(p, str) and p.strip() for p in patterns):
+            raise ValueError("patterns must be non-empty strings")
+        rule['patterns'] = sorted({p.strip() for p in patterns})
+    for field in ('min_amount', 'max_amount'):
+        if rule.get(field) is not None:
+            try:
+                rule[field] = float(rule[field])
+            except (TypeError, ValueError):
+                raise ValueError(f"{field} must be a number") from None
+    if 'priority' in rule:
+        try:
+            rule['priority'] = int(rule['priority'] or 0)
+        except (TypeError, ValueError):
+            raise ValueError("priority must be an integer") from None
+    if 'enabled' in rule:
+        rule['enabled'] = 1 if rule['enabled'] else 0
+    if (not partial or current is not None) and not _has_condition({**(current or {}), **rule}):
+        # Without one the rule would recategorize every transaction
+        raise ValueError("A rule needs patterns, platform, match_category, min_amount or max_amount")
+
+    names = [rule[field] for field in ('category', 'match_category') if rule.get(field)]
+    if names:
+        with get_db_connection() as conn:
+            placeholders = ', '.join(['?'] * len(names))
+            known = {row[0] for row in conn.execute(
+                f"SELECT name FROM categories WHERE name IN ({placeholders})", names)}
+        missing = [name for name in names if name not in known]
+        if missing:
+            raise ValueError(f"Unknown category: {missing[0]}")
+    return rule
+
+
+def _write_rule(cursor, rule_id: Optional[int], rule: Dict[str, Any]) -> int:
+    values = dict(rule)
+    if 'patterns' in values:
+        values['patterns'] = orjson.dumps(values['patterns']).decode()
+    columns = list(values)
+    if rule_id is None:
+        placeholders = ', '.join(['?'] * len(columns))
+        cursor.execute(f"INSERT INTO category_rules ({', '.join(columns)}) VALUES ({placeholders})",
+                       [values[c] for c in columns])
+        return cursor.lastrowid
+    if columns:
+        assignments = ', '.join(f"{c} = ?" for c in columns)
+        cursor.execute(f"UPDATE category_rules SET {assignments} WHERE id = ?",
+                       [values[c] for c in columns] + [rule_id])
+    return rule_id
+
+
+def create_rule(rule: Dict[str, Any]) -> int:
+    return writer.call(_write_rule, None, rule)
+
+
+def update_rule(rule_id: int, rule: Dict[str, Any]) -> int:
+    return writer.call(_write_rule, rule_id, rule)
+
+
+def _delete_rule(cursor, rule_id: int) -> None:
+    cursor.execute("DELETE FROM category_rules WHERE id = ?", (rule_id,))
+
+
+def delete_rule(rule_id: int) -> None:
+    writer.call(_delete_rule, rule_id)
+
+
+@functools.lru_cache(maxsize=8)
+def _compile(rules: bytes) -> RuleSet:
+    return RuleSet(orjson.loads(rules))
+
+
+def load_ruleset(rule_ids: Optional[List[int]] = None) -> RuleSet:
+    """Compile the enabled rules (or only `rule_ids`); recompiled only when the rules change."""
+    rules = [rule for rule in list_rules() if rule['enabled'] and (rule_ids is None or rule['id'] in rule_ids)]
+    return _compile(orjson.dumps(rules, option=orjson.OPT_SORT_KEYS))
+
+
+def categorize(transactions: List[Dict], ruleset: RuleSet) -> int:
+    """Set the category of each transaction dict a rule matches; returns how many changed."""
+    changed = 0
+    for transaction in transactions:
+        rule = ruleset.resolve(transaction.get('description'), transaction.get('amount'),
+                               transaction.get('platform'), transaction.get('category'))
+        if rule is not None:
+            transaction['category'] = rule['category']
+            changed += 1
+    return changed
+
+
+def _scope(filters: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+    where = "WHERE 1=1"
+    params: List[Any] = []
+    if filters:
+        if filters.get('date_from'):
+            where += f" AND date_day >= {_DAY_PARAM_SQL}"
+            params.append(filters['date_from'])
+        if filters.get('date_to'):
+            where += f" AND date_day <= {_DAY_PARAM_SQL}"
+            params.append(filters['date_to'])
+        if filters.get('email'):
+            where += " AND email_user = ?"
+            params.append(filters['email'])
+    return where, params
+
+
+def _evaluate(cursor, ruleset: RuleSet, filters: Optional[Dict[str, Any]]):
+    """Yield (row, rule) for every transaction in scope whose category a rule would change."""
+    where, params = _scope(filters)
+    cursor.execute(f'''
+        SELECT id, date, description, amount, platform, category, email_user
+        FROM transactions {where}
+    ''', params)
+    for row in cursor:
+        rule = ruleset.resolve(row[2], row[3], row[4], row[5])
+        if rule is not None:
+            yield row, rule
+
+
+def preview_rules(ruleset: RuleSet, filters: Optional[Dict[str, Any]] = None,
+                  limit: int = 100) -> Tuple[List[Dict], int, Dict[int, int]]:
+    """Rows the rules would recategorize: (first `limit` rows, total count, count per rule id)."""
+    rows: List[Dict] = []
+    total = 0
+    per_rule: Dict[int, int] = {}
+    for path in _paths_for(filters):
+        with get_db_connection(path) as conn:
+            for row, rule in _evaluate(conn.cursor(), ruleset, filters):
+                total += 1
+                per_rule[rule['id']] = per_rule.get(rule['id'], 0) + 1
+                if len(rows) < limit:
+                    rows.append({
+                        'id': row[0], 'date': row[1], 'description': row[2], 'amount': row[3],
+                        'platform': row[4], 'email_user': row[6], 'category': row[5],
+                        'new_category': rule['category'], 'rule_id': rule['id'],
+                    })
+    return rows, total, per_rule
+
+
+def _apply(cursor, ruleset: RuleSet, filters: Optional[Dict[str, Any]]) -> Dict[int, int]:
+    changes: List[Tuple[int, str]] = []
+    per_rule: Dict[int, int] = {}
+    for row, rule in _evaluate(cursor, ruleset, filters):
+        changes.append((row[0], rule['category']))
+        per_rule[rule['id']] = per_rule.get(rule['id'], 0) + 1
+    if changes:
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS rule_changes (id INTEGER PRIMARY KEY, category TEXT)")
+        cursor.execute("DELETE FROM temp.rule_changes")
+        cursor.executemany("INSERT INTO temp.rule_changes (id, category) VALUES (?, ?)", changes)
+        # A correlated subquery rather than UPDATE ... FROM, which needs SQLite 3.33+
+        cursor.execute('''
+            UPDATE transactions
+            SET category = (SELECT c.category FROM temp.rule_changes c WHERE c.id = transactions.id)
+            WHERE id IN (SELECT id FROM temp.rule_changes)
+        ''')
+        cursor.execute("DELETE FROM temp.rule_changes")
+    return per_rule
+
+
+def apply_rules(ruleset: RuleSet, filters: Optional[Dict[str, Any]] = None) -> Dict[int, int]:
+    """Recategorize every transaction in scope; returns the number of rows changed per rule id."""
+    per_rule: Dict[int, int] = {}
+    for path in _paths_for(filters):
+        for rule_id, count in _writer_for(path).call(_apply, ruleset, filters).items():
+            per_rule[rule_id] = per_rule.get(rule_id, 0) + count
+    return per_rule
@@ -0,0 +1,257 @@
+"""
+Full-text search for Finance Dashboard.
+
+Keeps an SQLite FTS5 index over transaction descriptions and their item names
+in sync through triggers, so rows written by the finance agent are searchable
+without any help from this service.
+"""
+import html
+import re
+import sqlite3
+from typing import List, Dict, Any, Optional
+
+from .database import (get_db_connection, _attach_items, _dict_row, _paths_for, _DAY_PARAM_SQL,
+                       _PARSED_ITEMS_COLUMNS, _PARSED_ITEMS_JOIN)
+
+# Thai is written without spaces between words, so a word tokenizer sees whole
+# phrases as a single token. The trigram tokenizer (SQLite >= 3.34) matches any
+# substring of 3+ characters instead; unicode61 is the fallback on older builds.
+TOKENIZERS = ("trigram", "unicode61 remove_diacritics 2")
+
+HIGHLIGHT_OPEN = "<mark>"
+HIGHLIGHT_CLOSE = "</mark>"
+
+# Private-use characters marking matches until the text has been HTML-escaped
+_MARK_OPEN, _MARK_CLOSE = "\ue000", "\ue001"
+
+_ITEM_NAMES_SQL = "(SELECT group_concat(name, ' ') FROM items WHERE transaction_id = {id})"
+
+
+def init_search_index(path: Optional[str] = None):
+    """Create the FTS5 index (backfilling it on first run) and its sync triggers.
+
+    `path` selects a shard file; finance.db by default.
+    """
+    with get_db_connection(path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name IN ('transactions', 'items')")
+        if len(cursor.fetchall()) < 2:
+            return
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='transactions_fts'")
+        created = cursor.fetchone() is None
+        if created:
+            for tokenizer in TOKENIZERS:
+                try:
+                    cursor.execute(f'''
+                        CREATE VIRTUAL TABLE transactions_fts
+                        USING fts5(description, items, tokenize='{tokenizer}')
+                    ''')
+                    break
+                except sqlite3.OperationalError:
+                    continue
+            else:
+                return
+
+        backfill = f'''
+            INSERT INTO transactions_fts(rowid, description, items)
+            SELECT t.id, t.description, {_ITEM_NAMES_SQL.format(id='t.id')}
+            FROM transactions t;
+        ''' if created else ''
+
+        # Recreated whenever this runs, so files set up by an older version get the current triggers
+        cursor.executescript(f'''
+            BEGIN;
+            DROP TRIGGER IF EXISTS trg_transactions_fts_insert;
+            DROP TRIGGER IF EXISTS trg_transactions_fts_update;
+            DROP TRIGGER IF EXISTS trg_transactions_fts_delete;
+            DROP TRIGGER IF EXISTS trg_items_fts_insert;
+            DROP TRIGGER IF EXISTS trg_items_fts_update;
+            DROP TRIGGER IF EXISTS trg_items_fts_delete;
+
+            CREATE TRIGGER trg_transactions_fts_insert
+            AFTER INSERT ON transactions
+            BEGIN
+                INSERT INTO transactions_fts(rowid, description, items)
+                VALUES (NEW.id, NEW.description, {_ITEM_NAMES_SQL.format(id='NEW.id')});
+            END;
+
+            CREATE TRIGGER trg_transactions_fts_update
+            AFTER UPDATE OF description ON transactions
+            BEGIN
+                UPDATE transactions_fts SET description = NEW.description WHERE rowid = NEW.id;
+            END;
+
+            CREATE TRIGGER trg_transactions_fts_delete
+            AFTER DELETE ON transactions
+            BEGIN
+                DELETE FROM transactions_fts WHERE rowid = OLD.id;
+            END;
+
+            CREATE TRIGGER trg_items_fts_insert
+            AFTER INSERT ON items
+            BEGIN
+                UPDATE transactions_fts SET items = {_ITEM_NAMES_SQL.format(id='NEW.transaction_id')}
+                WHERE rowid = NEW.transaction_id;
+            END;
+
+            CREATE TRIGGER trg_items_fts_update
+            AFTER UPDATE OF name, transaction_id ON items
+            BEGIN
+                UPDATE transactions_fts SET items = {_ITEM_NAMES_SQL.format(id='OLD.transaction_id')}
+                WHERE rowid = OLD.transaction_id;
+                UPDATE transactions_fts SET items = {_ITEM_NAMES_SQL.format(id='NEW.transaction_id')}
+                WHERE rowid = NEW.transaction_id;
+            END;
+
+            CREATE TRIGGER trg_items_fts_delete
+            AFTER DELETE ON items
+            BEGIN
+                UPDATE transactions_fts SET items = {_ITEM_NAMES_SQL.format(id='OLD.transaction_id')}
+                WHERE rowid = OLD.transaction_id;
+            END;
+            {backfill}
+            COMMIT;
+        ''')
+
+
+def _uses_trigram(cursor) -> bool:
+    cursor.execute("SELECT sql FROM sqlite_master WHERE name='transactions_fts'")
+    row = cursor.fetchone()
+    return bool(row) and 'trigram' in row['sql']
+
+
+def _build_match(terms: List[str], trigram: bool) -> str:
+    """Quote each term so user input can never be parsed as FTS5 query syntax."""
+    quoted = ['"' + term.replace('"', '""') + '"' for term in terms]
+    if not trigram:
+        quoted = [q + '*' for q in quoted]
+    return ' AND '.join(quoted)
+
+
+def _uses_like(terms: List[str], trigram: bool) -> bool:
+    # Trigram MATCH needs at least 3 characters per term. Shorter terms fall back to
+    # LIKE over the index's text, which cannot use the index: it scans the whole FTS
+    # table, without bm25 ranking, and matches are highlighted in Python instead.
+    return trigram and min(len(t) for t in terms) < 3
+
+
+def _build_where(terms: List[str], trigram: bool, filters: Optional[Dict[str, Any]]):
+    """WHERE clause, its parameters and the ranking expression for a search."""
+    params: List[Any] = []
+
+    if _uses_like(terms, trigram):
+        where = ' AND '.join(['(transactions_fts.description LIKE ? OR transactions_fts.items LIKE ?)'] * len(terms))
+        for term in terms:
+            pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            params.extend([pattern, pattern])
+        where = where.replace('LIKE ?', "LIKE ? ESCAPE '\\'")
+        rank = "0"
+    else:
+        where = 'transactions_fts MATCH ?'
+        params.append(_build_match(terms, trigram))
+        rank = 'bm25(transactions_fts, 2.0, 1.0)'
+
+    if filters:
+        if filters.get('date_from'):
+            where += f" AND t.date_day >= {_DAY_PARAM_SQL}"
+            params.append(filters['date_from'])
+        if filters.get('date_to'):
+            where += f" AND t.date_day <= {_DAY_PARAM_SQL}"
+            params.append(filters['date_to'])
+        if filters.get('category'):
+            if isinstance(filters['category'], list):
+                placeholders = ', '.join(['?'] * len(filters['category']))
+                where += f" AND t.category IN ({placeholders})"
+                params.extend(filters['category'])
+            else:
+                where += " AND t.category = ?"
+                params.append(filters['category'])
+        if filters.get('platform'):
+            where += " AND t.platform = ?"
+            params.append(filters['platform'])
+        if filters.get('email'):
+            where += " AND t.email_user = ?"
+            params.append(filters['email'])
+    return where, params, rank
+
+
+def _to_html(text: Optional[str]) -> Optional[str]:
+    """Escape `text` and turn the match markers into <mark> tags."""
+    if text is None:
+        return None
+    return html.escape(text).replace(_MARK_OPEN, HIGHLIGHT_OPEN).replace(_MARK_CLOSE, HIGHLIGHT_CLOSE)
+
+
+def _mark_terms(text: Optional[str], pattern: re.Pattern) -> Optional[str]:
+    if text is None:
+        return None
+    return pattern.sub(lambda m: _MARK_OPEN + m.group(0) + _MARK_CLOSE, text)
+
+
+def search_transactions(query: str, filters: Optional[Dict[str, Any]] = None,
+                        page: int = 1, page_size: int = 50) -> Dict[str, Any]:
+    """Ranked, highlighted and paginated search over descriptions and item names.
+
+    Results are ranked by relevance within one database file and newest first
+    when they come from several shards or archives.
+    """
+    terms = query.split()
+    if not terms:
+        return {'data': [], 'total': 0}
+
+    paths = _paths_for(filters, include_archive=True)
+    # With several shards or archives each one returns its first page * page_size hits and
+    # the page is cut after merging. bm25 scores depend on each file's own index statistics
+    # and cannot be compared across files, so merged results are ordered newest first.
+    merged = len(paths) > 1
+    limit, offset = (page * page_size, 0) if merged else (page_size, (page - 1) * page_size)
+    order = "t.date_epoch DESC, t.id DESC" if merged else "score, t.date_epoch DESC"
+    results: List[Dict] = []
+    total = 0
+
+    for path in paths:
+        with get_db_connection(path) as conn:
+            cursor = conn.cursor()
+            trigram = _uses_trigram(cursor)
+            where, params, rank = _build_where(terms, trigram, filters)
+            like = _uses_like(terms, trigram)
+            if like:
+                description, items = 'transactions_fts.description', 'transactions_fts.items'
+            else:
+                description = f"highlight(transactions_fts, 0, '{_MARK_OPEN}', '{_MARK_CLOSE}')"
+                items = f"highlight(transactions_fts, 1, '{_MARK_OPEN}', '{_MARK_CLOSE}')"
+
+            source = "FROM transactions_fts JOIN transactions t ON t.id = transactions_fts.rowid"
+            cursor.execute(f"SELECT COUNT(*) {source} WHERE {where}", params)
+            total += cursor.fetchone()[0]
+
+            cursor.row_factory = _dict_row
+            cursor.execute(f'''
+                SELECT t.id, t.date, t.amount, t.category, t.description, 'expense' as transaction_type,
+                       t.platform, t.email_user,
+                       {description} as description_highlight, {items} as items_highlight,
+                       {rank} as score, t.date_epoch, {_PARSED_ITEMS_COLUMNS}
+                {source} {_PARSED_ITEMS_JOIN.format(id='t.id')}
+                WHERE {where}
+                ORDER BY {order}
+                LIMIT ? OFFSET ?
+            ''', params + [limit, offset])
+            rows = cursor.fetchall()
+            if like:
+                pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+                for row in rows:
+                    row['description_highlight'] = _mark_terms(row['description_highlight'], pattern)
+                    row['items_highlight'] = _mark_terms(row['items_highlight'], pattern)
+            results.extend(_attach_items(cursor, rows, path))
+
+    if merged:
+        results.sort(key=lambda row: (row['date_epoch'] is not None, row['date_epoch'] or 0, row['id']),
+                     reverse=True)
+        results = results[(page - 1) * page_size:page * page_size]
+    for row in results:
+        del row['date_epoch']
+        # Descriptions come from parsed emails and receipts, so escape them before adding tags
+        row['description_highlight'] = _to_html(row['description_highlight'])
+        row['items_highlight'] = _to_html(row['items_highlight'])
+    return {'data': results, 'total': total}
@@ -0,0 +1,54 @@
+"""
+Production entry point for Finance Dashboard.
+
+Runs the API in a pool of uvicorn worker processes without the reloader:
+
+    python -m app.server --host 127.0.0.1 --port 8001 --workers 4
+
+bootstrap() (schema migrations, triggers, the search index and rollups) runs
+once in the parent process before workers start, so workers never race on it;
+they skip it on startup. Each worker then warms
+its caches in the background on startup; cached results are shared between
+workers and invalidated for all of them by the data generation counter (see
+app.cache).
+"""
+import argparse
+import os
+
+import uvicorn
+
+from . import cache, shards
+from .database import bootstrap
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the Finance Dashboard API with multiple workers.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--shard-dir", default=os.environ.get("FINANCE_SHARD_DIR"),
+                        help="Enable per-user sharded storage in this directory (see app.shards)")
+    args = parser.parse_args()
+
+    if args.shard_dir:
+        # Workers are separate processes and read the setting from the environment
+        os.environ["FINANCE_SHARD_DIR"] = args.shard_dir
+        shards.SHARD_DIR = args.shard_dir
+
+    bootstrap()
+    os.environ["FINANCE_BOOTSTRAPPED"] = "1"
+    # Entries left over from a previous deployment may predate schema changes
+    cache.clear()
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
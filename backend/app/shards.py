@@ -0,0 +1,342 @@
+"""
+Optional per-user sharded storage for Finance Dashboard.
+
+When SHARD_DIR is set (FINANCE_SHARD_DIR in the environment), every user's transactions and items live in their own
+SQLite file under it, so one user's queries and writes never scan or lock
+another user's data. finance.db keeps the categories plus a small directory:
+
+- shards:             email -> shard file
+- shard_transactions: transaction id -> email
+- shard_items:        item id -> email
+- shard_changes:      ids of copied rows the finance agent has since updated
+                      or deleted in finance.db (filled by triggers)
+
+Ids stay globally unique: new ids are allocated from the directory, which is
+kept ahead of finance.db's own AUTOINCREMENT sequence so rows the finance agent
+writes later can still be imported without clashing.
+
+Split an existing finance.db once with:
+
+    python -m app.shards split --db /data/finance.db --shard-dir /data/shards
+
+Rows the finance agent keeps writing to finance.db are imported by the
+running server on startup and every SYNC_INTERVAL seconds (see
+sync_periodically); `python -m app.shards sync` does the same by hand. Its
+later updates and deletes of rows already imported are replayed on the shard
+copies the same way; an agent update replaces the whole row, including
+columns edited through the dashboard since.
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SHARD_DIR: Optional[str] = os.environ.get("FINANCE_SHARD_DIR") or None
+
+# Seconds between background imports of agent rows into the shards (0: startup only)
+SYNC_INTERVAL = float(os.environ.get("FINANCE_SHARD_SYNC_SECONDS", "30"))
+
+DIRECTORY_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS shards (
+        email TEXT PRIMARY KEY,
+        filename TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS shard_transactions (
+        id INTEGER PRIMARY KEY,
+        email TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS shard_items (
+        id INTEGER PRIMARY KEY,
+        email TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS shard_changes (
+        tbl TEXT NOT NULL,
+        id INTEGER NOT NULL,
+        PRIMARY KEY (tbl, id)
+    );
+'''
+
+# Directory table and the finance.db table whose sequence it must stay ahead of
+_ID_TABLES = {'transactions': 'shard_transactions', 'items': 'shard_items'}
+
+
+def enabled() -> bool:
+    return SHARD_DIR is not None
+
+
+def shard_filename(email: str) -> str:
+    """Stable, filesystem-safe file name for a user's shard."""
+    email = email.strip().lower()
+    slug = re.sub(r'[^a-z0-9]+', '_', email).strip('_')[:40]
+    digest = hashlib.sha1(email.encode('utf-8')).hexdigest()[:8]
+    return f"{slug}_{digest}.db"
+
+
+def shard_path(filename: str) -> str:
+    return os.path.join(SHARD_DIR, filename)
+
+
+def init_directory(cursor) -> None:
+    cursor.executescript(DIRECTORY_SCHEMA)
+
+
+def init_change_log(cursor) -> None:
+    """Create the finance.db triggers logging changes to rows already copied into a shard."""
+    from .database import _recreate_trigger
+
+    for table, directory in _ID_TABLES.items():
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,))
+        if not cursor.fetchone():
+            continue
+        for event in ('UPDATE', 'DELETE'):
+            _recreate_trigger(cursor, f'trg_{table}_shard_{event.lower()}', f'''
+                AFTER {event} ON {table}
+                WHEN OLD.id IN (SELECT id FROM {directory})
+                BEGIN
+                    INSERT OR IGNORE INTO shard_changes (tbl, id) VALUES ('{table}', OLD.id);
+                END
+            ''')
+
+
+def list_shards(cursor) -> Dict[str, str]:
+    """Map of email -> shard file path."""
+    cursor.execute("SELECT email, filename FROM shards ORDER BY email")
+    return {row[0]: shard_path(row[1]) for row in cursor.fetchall()}
+
+
+def lookup(cursor, table: str, row_id) -> Optional[str]:
+    """Email owning transaction/item `row_id`, or None if it is not in the directory."""
+    cursor.execute(f"SELECT email FROM {_ID_TABLES[table]} WHERE id = ?", (row_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _autoincrement(cursor, table: str) -> bool:
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    row = cursor.fetchone()
+    return bool(row) and 'AUTOINCREMENT' in row[0].upper()
+
+
+def allocate_id(cursor, table: str, email: str) -> int:
+    """Reserve a new globally unique id for a row of `table` owned by `email`."""
+    directory = _ID_TABLES[table]
+    autoincrement = _autoincrement(cursor, table)
+    row = None
+    if autoincrement:
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,))
+        row = cursor.fetchone()
+    if row is None:
+        # No sequence row (no AUTOINCREMENT, or nothing inserted yet): start above the table's own ids
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+        row = cursor.fetchone()
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {directory}")
+    new_id = max(row[0], cursor.fetchone()[0]) + 1
+    cursor.execute(f"INSERT INTO {directory} (id, email) VALUES (?, ?)", (new_id, email))
+    if autoincrement:
+        # Keep the agent's AUTOINCREMENT from handing out the same id later
+        cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (new_id, table))
+        if cursor.rowcount == 0:
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, new_id))
+    # Without AUTOINCREMENT the agent reuses MAX(id) + 1 of its own table, which
+    # cannot be reserved; such a clash shows up as an agent row that sync skips
+    return new_id
+
+
+def copy_table_schema(main_cursor, path: str) -> None:
+    """Create finance.db's transactions/items tables and indexes in the database at `path`.
+
+    Triggers and derived indexes are added by database.migrate_partition.
+    """
+    main_cursor.execute('''
+        SELECT sql FROM sqlite_master
+        WHERE tbl_name IN ('transactions', 'items') AND type IN ('table', 'index') AND sql IS NOT NULL
+        ORDER BY type DESC
+    ''')
+    statements = [row[0] for row in main_cursor.fetchall()]
+
+    conn = sqlite3.connect(path, timeout=20, isolation_level=None)
+    try:
+        # Another process may be creating the same shard
+        conn.execute("BEGIN IMMEDIATE")
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+        for sql in statements:
+            name = re.match(r'CREATE\s+(?:UNIQUE\s+)?(?:TABLE|INDEX)\s+(?:IF NOT EXISTS\s+)?"?(\w+)"?', sql, re.I)
+            if name and name.group(1) in existing:
+                continue
+            conn.execute(sql)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def create_shard(main_cursor, email: str) -> str:
+    """Create (if needed) and register the shard for `email`, returning its path."""
+    filename = shard_filename(email)
+    path = shard_path(filename)
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    copy_table_schema(main_cursor, path)
+    main_cursor.execute("INSERT OR IGNORE INTO shards (email, filename) VALUES (?, ?)", (email, filename))
+    return path
+
+
+def _columns(conn, schema: str, table: str):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _replay_changes(conn, table: str, columns, email: str) -> None:
+    """Apply the logged finance.db updates and deletes of `email`'s rows of `table` to its shard."""
+    changed = f'''
+        SELECT c.id FROM shard_changes c JOIN {_ID_TABLES[table]} d ON d.id = c.id
+        WHERE c.tbl = '{table}' AND d.email = ?
+    '''
+    assigned = ', '.join(column for column in columns if column != 'id')
+    # UPDATE rather than REPLACE, so the shard's rollup and search triggers see an update
+    conn.execute(f'''
+        UPDATE shard.{table} SET ({assigned}) = (SELECT {assigned} FROM main.{table} m WHERE m.id = {table}.id)
+        WHERE id IN ({changed}) AND id IN (SELECT id FROM main.{table})
+    ''', (email,))
+    conn.execute(f'''
+        DELETE FROM shard.{table}
+        WHERE id IN ({changed}) AND id NOT IN (SELECT id FROM main.{table})
+    ''', (email,))
+    conn.execute(f"DELETE FROM shard_changes WHERE tbl = '{table}' AND id IN ({changed})", (email,))
+
+
+def sync(db_path: str) -> Dict[str, int]:
+    """Bring the shards up to date with finance.db.
+
+    Copies rows that are not in the directory yet into their shards, then
+    replays the agent's updates and deletes of rows copied earlier. Run once
+    to split an existing database; the server then runs it in the background
+    (see sync_periodically). Returns the number of transactions copied per
+    email.
+    """
+    from . import database
+
+    conn = sqlite3.connect(db_path, timeout=20, isolation_level=None)
+    copied: Dict[str, int] = {}
+    try:
+        cursor = conn.cursor()
+        init_directory(cursor)
+        cursor.execute('''
+            SELECT DISTINCT COALESCE(email_user, ?) FROM transactions
+            WHERE id NOT IN (SELECT id FROM shard_transactions)
+            UNION
+            SELECT email FROM shard_transactions
+            WHERE id IN (SELECT transaction_id FROM items WHERE id NOT IN (SELECT id FROM shard_items))
+            UNION
+            SELECT email FROM shard_transactions
+            WHERE id IN (SELECT id FROM shard_changes WHERE tbl = 'transactions')
+            UNION
+            SELECT email FROM shard_items
+            WHERE id IN (SELECT id FROM shard_changes WHERE tbl = 'items')
+        ''', (database.DEFAULT_EMAIL,))
+        emails = [row[0] for row in cursor.fetchall()]
+
+        for email in emails:
+            # Readers only see the shard in the directory once it is fully migrated;
+            # existing shards were brought up to date at startup
+            conn.execute("BEGIN IMMEDIATE")
+            path = list_shards(cursor).get(email)
+            if path is None:
+                path = create_shard(cursor, email)
+                database.migrate_partition(path)
+            conn.execute("COMMIT")
+
+            conn.execute("ATTACH DATABASE ? AS shard", (path,))
+            try:
+                # Reads and writes below see one snapshot of the directory
+                conn.execute("BEGIN IMMEDIATE")
+                tx_columns = _columns(conn, 'shard', 'transactions')
+                item_columns = _columns(conn, 'shard', 'items')
+                tx_cols, item_cols = ', '.join(tx_columns), ', '.join(item_columns)
+                pending = '''
+                    SELECT id FROM main.transactions
+                    WHERE COALESCE(email_user, ?) = ? AND id NOT IN (SELECT id FROM shard_transactions)
+                '''
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO shard.transactions ({tx_cols})
+                    SELECT {tx_cols} FROM main.transactions WHERE id IN ({pending})
+                ''', (database.DEFAULT_EMAIL, email))
+                copied[email] = conn.execute("SELECT changes()").fetchone()[0]
+                conn.execute(f"INSERT INTO shard_transactions (id, email) SELECT id, ? FROM ({pending})",
+                             (email, database.DEFAULT_EMAIL, email))
+
+                # Items of every transaction this user owns, including items the
+                # agent added to transactions that were copied in an earlier sync
+                owned_items = '''
+                    SELECT id FROM main.items
+                    WHERE transaction_id IN (SELECT id FROM shard_transactions WHERE email = ?)
+                    AND id NOT IN (SELECT id FROM shard_items)
+                '''
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO shard.items ({item_cols})
+                    SELECT {item_cols} FROM main.items WHERE id IN ({owned_items})
+                ''', (email,))
+                conn.execute(f"INSERT INTO shard_items (id, email) SELECT id, ? FROM ({owned_items})",
+                             (email, email))
+
+                _replay_changes(conn, 'transactions', tx_columns, email)
+                _replay_changes(conn, 'items', item_columns, email)
+                conn.execute("COMMIT")
+            finally:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                conn.execute("DETACH DATABASE shard")
+    finally:
+        conn.close()
+    return copied
+
+
+def sync_periodically(stop: threading.Event) -> None:
+    """Run sync() on finance.db now and every SYNC_INTERVAL seconds until `stop` is set.
+
+    Every worker runs this; a lock file in SHARD_DIR lets one of them sync at a
+    time and the others skip that round.
+    """
+    import fcntl
+
+    from . import database
+
+    while True:
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        with open(os.path.join(SHARD_DIR, ".sync.lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                pass
+            else:
+                try:
+                    sync(database.DB_PATH)
+                except sqlite3.Error:
+                    logger.exception("Shard sync failed")
+        if SYNC_INTERVAL <= 0 or stop.wait(SYNC_INTERVAL):
+            return
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Split finance.db into per-user shards.")
+    parser.add_argument("command", choices=["split", "sync"],
+                        help="split: initial split of finance.db; sync: import rows written since")
+    parser.add_argument("--db", default="/data/finance.db", help="Path to finance.db")
+    parser.add_argument("--shard-dir", required=True, help="Directory for the per-user shard files")
+    args = parser.parse_args()
+
+    global SHARD_DIR
+    from . import database
+    database.DB_PATH = args.db
+    SHARD_DIR = args.shard_dir
+
+    database.init_db()
+    for email, count in sync(args.db).items():
+        print(f"{email}: {count} transactions copied")
+
+
+if __name__ == "__main__":
+    main()
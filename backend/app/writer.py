@@ -0,0 +1,153 @@
+"""
+Single-writer queue for Finance Dashboard.
+
+All mutations of a database file made by this process are funnelled through
+one writer thread with its own connection. Jobs that queue up while a commit is
+in flight are executed together and committed in a single transaction (group
+commit), each inside its own SAVEPOINT so one failing job does not roll back
+the others. Callers block on a per-job future for their result (see
+WriteQueue.call).
+
+If the connection cannot be opened, or fails outside a job (BEGIN, RELEASE,
+COMMIT), every job of that batch fails with the error and the next batch
+starts over on a fresh connection, so the queue never stalls.
+"""
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+_STOP = object()
+
+# Seconds a caller waits for its write; long enough for a full rules apply
+WRITE_TIMEOUT = 120.0
+
+
+class WriteQueue:
+    """Serialize write jobs onto one connection and group-commit them in batches."""
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], max_batch: int = 64,
+                 prepare: Optional[Callable[[sqlite3.Connection], Any]] = None):
+        self._connect = connect
+        self.max_batch = max_batch
+        # Called with the connection before each batch, e.g. to follow changed tracing settings
+        self._prepare = prepare
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """Queue `fn(cursor, *args, **kwargs)` for the writer thread."""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((fn, args, kwargs, future))
+        return future
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `fn(cursor, *args, **kwargs)` on the writer thread and wait for its result."""
+        return self.submit(fn, *args, **kwargs).result(timeout=WRITE_TIMEOUT)
+
+    def stop(self) -> None:
+        """Finish queued jobs and stop the writer thread."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="finance-db-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        conn = None
+        try:
+            while True:
+                batch, stop = self._next_batch()
+                if batch:
+                    try:
+                        if conn is None:
+                            conn = self._connect()
+                            # Transactions are managed explicitly below
+                            conn.isolation_level = None
+                        self._execute(conn, batch)
+                    except Exception as e:
+                        for _, _, _, future in batch:
+                            if not future.done():
+                                future.set_exception(e)
+                        # Closing rolls back whatever the batch left open
+                        if conn is not None:
+                            _close_quietly(conn)
+                            conn = None
+                if stop:
+                    return
+        finally:
+            if conn is not None:
+                _close_quietly(conn)
+
+    def _next_batch(self) -> Tuple[List[tuple], bool]:
+        """Block for one job, then take whatever else is already queued."""
+        job = self._queue.get()
+        if job is _STOP:
+            return [], True
+        batch = [job]
+        while len(batch) < self.max_batch:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is _STOP:
+                return batch, True
+            batch.append(job)
+        return batch, False
+
+    def _execute(self, conn: sqlite3.Connection, batch: List[tuple]) -> None:
+        outcomes = []
+        if self._prepare is not None:
+            self._prepare(conn)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            for _, _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        for fn, args, kwargs, future in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            conn.execute("SAVEPOINT job")
+            try:
+                result = fn(conn.cursor(), *args, **kwargs)
+            except Exception as e:
+                conn.execute("ROLLBACK TO job")
+                outcomes.append((future, None, e))
+            else:
+                outcomes.append((future, result, None))
+            conn.execute("RELEASE job")
+
+        try:
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            conn.execute("ROLLBACK")
+            for future, _, _ in outcomes:
+                future.set_exception(e)
+            return
+
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+def _close_quietly(conn: sqlite3.Connection) -> None:
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
@@ -0,0 +1,618 @@
+"""
+Benchmarks for the Finance Dashboard backend.
+
+Seeds a throwaway SQLite database shaped like the finance agent's finance.db
+and times the hot paths against it.
+
+Usage:
+    python benchmark.py dates [--rows 200000]
+    python benchmark.py serialize [--rows 200000]
+    python benchmark.py writes [--rows 200000] [--threads 16] [--writes 200]
+    python benchmark.py archive [--rows 200000]
+    python benchmark.py items [--rows 200000]
+    python benchmark.py item-stats [--rows 200000]
+    python benchmark.py distribution [--rows 200000]
+    python benchmark.py compare [--rows 200000]
+    python benchmark.py rules [--rows 200000]
+    python benchmark.py profiling [--rows 200000]
+    python benchmark.py startup [--rows 200000]
+
+Every benchmark also takes --workdir DIR (default: a temp dir). The seeded
+databases and the cache and profile files all go there, so a run never reads
+from or writes to the running service's files.
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app import cache, database, profiling
+
+CATEGORIES = ["Food & Dining", "Transportation", "Shopping", "Entertainment", "Bills & Utilities", "Healthcare"]
+PLATFORMS = ["K PLUS", "LINE Pay", "Shopee", "TrueMoney", "Lazada"]
+USERS = ["ice@imice.im", "family@imice.im"]
+
+
+def seed_database(path: str, rows: int) -> None:
+    """Create the agent schema at `path` and fill it with `rows` random transactions."""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT,
+            amount REAL,
+            category TEXT,
+            description TEXT,
+            platform TEXT,
+            transaction_type TEXT DEFAULT 'expense',
+            email_user TEXT DEFAULT 'ice@imice.im'
+        );
+        CREATE TABLE items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id INTEGER,
+            name TEXT,
+            quantity REAL DEFAULT 1,
+            unit_price REAL DEFAULT 0
+        );
+    ''')
+    rng = random.Random(42)
+    start = datetime(2021, 1, 1)
+    batch = []
+    for i in range(rows):
+        when = start + timedelta(seconds=rng.randrange(5 * 365 * 86400))
+        # The agent writes a mix of plain dates and full timestamps
+        date = when.strftime('%Y-%m-%d') if i % 3 == 0 else when.strftime('%Y-%m-%d %H:%M:%S')
+        batch.append((
+            date,
+            round(rng.uniform(20, 2500), 2),
+            rng.choice(CATEGORIES),
+            f"Shop {rng.randrange(500)} (item {rng.randrange(50)}, item {rng.randrange(50)})",
+            rng.choice(PLATFORMS),
+            rng.choice(USERS),
+        ))
+    conn.executemany(
+        'INSERT INTO transactions (date, amount, category, description, platform, email_user) VALUES (?, ?, ?, ?, ?, ?)',
+        batch,
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(fn, repeat: int = 5) -> float:
+    """Return the best wall time of `repeat` runs in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def bench_dates(args) -> None:
+    """Compare the legacy strftime/text-range queries with the date_day columns."""
+    path = os.path.join(args.workdir, 'bench_dates.db')
+    seed_database(path, args.rows)
+    conn = sqlite3.connect(path)
+    filters = ('ice@imice.im', '2024-01-01', '2024-12-31')
+
+    def legacy_date_summary():
+        conn.execute('''
+            SELECT strftime('%Y-%m-%d', date) as date, SUM(amount), COUNT(*) FROM transactions
+            WHERE email_user = ? AND date >= ? AND date <= ?
+            GROUP BY strftime('%Y-%m-%d', date) ORDER BY date ASC
+        ''', filters).fetchall()
+
+    def legacy_range_count():
+        conn.execute('SELECT COUNT(*) FROM transactions WHERE email_user = ? AND date >= ? AND date <= ?', filters).fetchall()
+
+    before = {
+        'summary by date': timed(legacy_date_summary),
+        'range filter': timed(legacy_range_count),
+    }
+
+    t0 = time.perf_counter()
+    database.DB_PATH = path
+    database.init_db()
+    migrate_ms = (time.perf_counter() - t0) * 1000
+
+    def range_count():
+        conn.execute(f'''
+            SELECT COUNT(*) FROM transactions
+            WHERE email_user = ? AND date_day >= {database._DAY_PARAM_SQL} AND date_day <= {database._DAY_PARAM_SQL}
+        ''', filters).fetchall()
+
+    db_filters = {'email': filters[0], 'date_from': filters[1], 'date_to': filters[2]}
+    after = {
+        'summary by date': timed(lambda: database.get_summary_by_date.uncached(db_filters)),
+        'range filter': timed(range_count),
+    }
+
+    print(f"rows: {args.rows}, migration + backfill: {migrate_ms:.1f} ms")
+    for name in before:
+        print(f"{name:<18} before {before[name]:8.2f} ms   after {after[name]:8.2f} ms")
+    conn.close()
+
+
+def bench_serialize(args) -> None:
+    """Encode a full-history /api/dashboard payload the old and the new way."""
+    import orjson
+
+    path = os.path.join(args.workdir, 'bench_serialize.db')
+    seed_database(path, args.rows)
+    database.DB_PATH = path
+    database.init_db()
+
+    filters = {'email': 'ice@imice.im'}
+    payload = {
+        "success": True,
+        "data": {
+            "balance": database.get_balance(filters),
+            "transactions": database.get_transactions(filters),
+            "categorySummary": database.get_summary_by_category(filters),
+            "dateSummary": database.get_summary_by_date(filters),
+            "categories": database.get_all_categories()
+        }
+    }
+
+    results = {}
+    try:
+        from fastapi.encoders import jsonable_encoder
+        # FastAPI's default path: deep-copy through jsonable_encoder, then json.dumps
+        results['jsonable_encoder + json'] = timed(
+            lambda: json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode('utf-8'), 3)
+    except ImportError:
+        pass
+    results['json.dumps'] = timed(lambda: json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode('utf-8'), 3)
+    results['orjson'] = timed(lambda: orjson.dumps(payload), 3)
+
+    body = orjson.dumps(payload)
+    sizes = {'identity': len(body), 'gzip': len(gzip.compress(body, compresslevel=6))}
+    try:
+        import zstandard
+        sizes['zstd'] = len(zstandard.ZstdCompressor(level=3).compress(body))
+    except ImportError:
+        pass
+
+    print(f"rows: {args.rows}, transactions in payload: {len(payload['data']['transactions'])}")
+    for name, ms in results.items():
+        print(f"{name:<26} {ms:8.2f} ms")
+    for name, size in sizes.items():
+        print(f"{name:<26} {size / 1024:8.1f} KiB on the wire")
+
+
+def bench_writes(args) -> None:
+    """Concurrent create_transaction bursts: connection-per-write vs the writer queue."""
+    path = os.path.join(args.workdir, 'bench_writes.db')
+    seed_database(path, args.rows)
+    database.DB_PATH = path
+    database.init_db()
+
+    def burst(write_one) -> float:
+        def worker(n):
+            for i in range(args.writes):
+                write_one(f"burst {n}-{i}")
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - t0
+
+    def legacy_write(description):
+        # What every mutation did before: own connection, own commit
+        conn = sqlite3.connect(path, timeout=20)
+        conn.execute(
+            'INSERT INTO transactions (description, amount, category, date, platform, transaction_type) VALUES (?, ?, ?, ?, ?, ?)',
+            (description, 100, 'Shopping', '2025-01-01', 'K PLUS', 'expense'))
+        conn.commit()
+        conn.close()
+
+    def queued_write(description):
+        database.create_transaction(description, 100, 'Shopping', '2025-01-01', 'K PLUS')
+
+    total = args.threads * args.writes
+    for name, fn in (('connection per write', legacy_write), ('writer queue', queued_write)):
+        elapsed = burst(fn)
+        print(f"{name:<22} {total} writes in {elapsed * 1000:8.1f} ms  ({total / elapsed:8.0f} writes/s)")
+    database.writer.stop()
+
+
+def bench_archive(args) -> None:
+    """Recent-window and full-history reads before and after moving old years into archives."""
+    from app import archive
+
+    path = os.path.join(args.workdir, 'bench_archive.db')
+    seed_database(path, args.rows)
+    database.DB_PATH = path
+    database.init_db()
+
+    conn = sqlite3.connect(path)
+    last_day = conn.execute("SELECT MAX(date_day) FROM transactions").fetchone()[0]
+    conn.close()
+    last = datetime(1970, 1, 1) + timedelta(days=last_day)
+    recent = {'email': 'ice@imice.im', 'date_from': (last - timedelta(days=30)).strftime('%Y-%m-%d')}
+    everything = {'email': 'ice@imice.im'}
+
+    def measure():
+        return {
+            '1M transactions': timed(lambda: database.get_transactions(recent)),
+            '1M summary': timed(lambda: database.get_summary_by_category.uncached(recent)),
+            'all-time summary': timed(lambda: database.get_summary_by_category.uncached(everything)),
+            'all-time balance': timed(lambda: database.get_balance.uncached(everything)),
+        }
+
+    before = measure()
+    t0 = time.perf_counter()
+    moved = archive.archive_before(path, os.path.join(args.workdir, 'archive'),
+                                   archive.cutoff_day(2, last.date()))
+    archive_ms = (time.perf_counter() - t0) * 1000
+    after = measure()
+
+    print(f"rows: {args.rows}, archived: {sum(moved.values())} in {len(moved)} partitions ({archive_ms:.0f} ms)")
+    for name in before:
+        print(f"{name:<18} before {before[name]:8.2f} ms   after {after[name]:8.2f} ms")
+
+
+def bench_items(args) -> None:
+    """Description-derived items: parsed on every read vs read back from parsed_items."""
+    import orjson
+
+    path = os.path.join(args.workdir, 'bench_items.db')
+    seed_database(path, args.rows)
+    database.DB_PATH = path
+    t0 = time.perf_counter()
+    database.init_db()
+    init_ms = (time.perf_counter() - t0) * 1000
+
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    rows = [dict(row) for row in conn.execute(f'''
+        SELECT id, description, {database._PARSED_ITEMS_COLUMNS}
+        FROM transactions {database._PARSED_ITEMS_JOIN.format(id='transactions.id')}
+    ''')]
+    conn.close()
+
+    def parse_each():
+        for row in rows:
+            [{"name": name, "quantity": 1, "unit_price": 0, "formatted": name}
+             for name in database._parse_items(row['description'])]
+
+    def read_cached():
+        for row in rows:
+            if row['parsed_hash'] == database._description_hash(row['description']):
+                [{"name": name, "quantity": 1, "unit_price": 0, "formatted": name}
+                 for name in orjson.loads(row['parsed_names'])]
+
+    print(f"rows: {args.rows}, init_db incl. parsed_items backfill: {init_ms:.0f} ms")
+    print(f"{'parse on every read':<22} {timed(parse_each, 5):8.2f} ms")
+    print(f"{'read parsed_items':<22} {timed(read_cached, 5):8.2f} ms")
+
+
+def bench_item_stats(args) -> None:
+    """Item analytics from the monthly rollups vs aggregating the raw items table."""
+    from app import item_stats
+
+    path = os.path.join(args.workdir, 'bench_item_stats.db')
+    seed_database(path, args.rows)
+    rng = random.Random(7)
+    names = [f"Item {n}" for n in range(300)]
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        'INSERT INTO items (transaction_id, name, quantity, unit_price) VALUES (?, ?, ?, ?)',
+        ((rng.randrange(1, args.rows + 1), rng.choice(names), rng.randrange(1, 4), rng.randrange(10, 300))
+         for _ in range(args.rows * 2)),
+    )
+    conn.commit()
+
+    database.DB_PATH = path
+    database.init_db()
+    t0 = time.perf_counter()
+    item_stats.init_item_stats()
+    backfill_ms = (time.perf_counter() - t0) * 1000
+
+    last_day = conn.execute("SELECT MAX(date_day) FROM transactions").fetchone()[0]
+    recent = (datetime(1970, 1, 1) + timedelta(days=last_day - 30)).strftime('%Y-%m-%d')
+
+    def raw_top_items(date_from=None):
+        where = "WHERE t.email_user = ?" + (f" AND t.date_day >= {database._DAY_PARAM_SQL}" if date_from else "")
+        conn.execute(f'''
+            SELECT lower(trim(i.name)), SUM(i.quantity), SUM(i.quantity * i.unit_price) as spend, COUNT(*)
+            FROM items i JOIN transactions t ON t.id = i.transaction_id
+            {where} GROUP BY 1 ORDER BY spend DESC LIMIT 20
+        ''', ['ice@imice.im'] + ([date_from] if date_from else [])).fetchall()
+
+    everything = {'email': 'ice@imice.im'}
+    last_month = {'email': 'ice@imice.im', 'date_from': recent}
+    results = {
+        'top items, all time': (timed(raw_top_items), timed(lambda: item_stats.get_top_items.uncached(everything))),
+        'top items, 1M': (timed(lambda: raw_top_items(recent)),
+                          timed(lambda: item_stats.get_top_items.uncached(last_month))),
+        'price history': (None, timed(lambda: item_stats.get_item_price_history.uncached('item 7', everything))),
+        'basket sizes': (None, timed(lambda: item_stats.get_basket_sizes.uncached(everything))),
+    }
+    conn.close()
+
+    print(f"rows: {args.rows}, items: {args.rows * 2}, rollup backfill: {backfill_ms:.0f} ms")
+    for name, (raw, rollup) in results.items():
+        raw_text = f"{raw:8.2f} ms" if raw is not None else f"{'-':>11}"
+        print(f"{name:<20} raw items {raw_text}   rollups {rollup:8.2f} ms")
+
+
+def bench_distribution(args) -> None:
+    """Per-category percentiles from the amount sketches vs sorting raw amounts."""
+    from app import distribution
+
+    path = os.path.join(args.workdir, 'bench_distribution.db')
+    seed_database(path, args.rows)
+    database.DB_PATH = path
+    database.init_db()
+    t0 = time.perf_counter()
+    distribution.init_distribution_sketches()
+    backfill_ms = (time.perf_counter() - t0) * 1000
+
+    conn = sqlite3.connect(path)
+    last_day = conn.execute("SELECT MAX(date_day) FROM transactions").fetchone()[0]
+    recent = (datetime(1970, 1, 1) + timedelta(days=last_day - 30)).strftime('%Y-%m-%d')
+
+    def exact(date_from=None):
+        where = "WHERE date_day IS NOT NULL" + (f" AND date_day >= {database._DAY_PARAM_SQL}" if date_from else "")
+        amounts = {}
+        for category, amount in conn.execute(
+            f"SELECT category, amount FROM transactions {where} ORDER BY category, amount",
+            [date_from] if date_from else [],
+        ):
+            amounts.setdefault(category, []).append(amount)
+        return {
+            category: {q: values[int(q * (len(values) - 1))] for q in distribution.QUANTILES}
+            for category, values in amounts.items()
+        }
+
+    def worst_error(date_from=None):
+        truth = exact(date_from)
+        filters = {'date_from': date_from} if date_from else {}
+        worst = 0.0
+        for row in distribution.get_amount_distribution.uncached(filters):
+            for q, value in truth[row['category']].items():
+                worst = max(worst, abs(row[f"p{q * 100:g}"] - value) / value)
+        return worst
+
+    results = {
+        'all time': (timed(exact), timed(lambda: distribution.get_amount_distribution.uncached({})),
+                     worst_error()),
+        '1M': (timed(lambda: exact(recent)),
+               timed(lambda: distribution.get_amount_distribution.uncached({'date_from': recent})),
+               worst_error(recent)),
+    }
+    conn.close()
+
+    print(f"rows: {args.rows}, sketch backfill: {backfill_ms:.0f} ms")
+    for name, (raw, sketch, error) in results.items():
+        print(f"{name:<10} sorted amounts {raw:8.2f} ms   sketches {sketch:8.2f} ms   worst error {error:.2%}")
+
+
+def bench_compare(args) -> None:
+    """One-pass period comparison vs separate category/platform summaries per window."""
+    path = os.path.join(args.workdir, 'bench_compare.db')
+    seed_database(path, args.rows)
+    database.DB_PATH = path
+    database.init_db()
+
+    conn = sqlite3.connect(path)
+    last_day = conn.execute("SELECT MAX(date_day) FROM transactions").fetchone()[0]
+    conn.close()
+    end = datetime(1970, 1, 1) + timedelta(days=last_day)
+    current = {'email': 'ice@imice.im', 'date_from': end.replace(day=1).strftime('%Y-%m-%d'),
+               'date_to': end.strftime('%Y-%m-%d')}
+    offsets = ['previous', '1Y']
+
+    def separate():
+        windows = [current] + [
+            dict(current, **dict(zip(('date_from', 'date_to'),
+                                     database.comparison_window(current['date_from'], current['date_to'], o))))
+            for o in offsets
+        ]
+        for filters in windows:
+            database.get_summary_by_category.uncached(filters)
+            database.get_summary_by_platform.uncached(filters)
+
+    separate_ms = timed(separate)
+    single_ms = timed(lambda: database.get_period_comparison.uncached(current, offsets))
+    print(f"rows: {args.rows}, current window {current['date_from']}..{current['date_to']}, baselines {offsets}")
+    print(f"separate summaries (6 queries) {separate_ms:8.2f} ms   one-pass compare {single_ms:8.2f} ms")
+
+
+def bench_rules(args) -> None:
+    """Rule evaluation over the whole history, set-based apply and bulk import with inline rules."""
+    from app import rules
+
+    path = os.path.join(args.workdir, 'bench_rules.db')
+    seed_database(path, args.rows)
+    database.DB_PATH = path
+    database.init_db()
+    rules.init_rules()
+
+    rng = random.Random(11)
+    for n in range(200):
+        rules.create_rule(rules.validate_rule({'patterns': [f"shop {n} ("], 'category': rng.choice(CATEGORIES)}))
+    rules.create_rule(rules.validate_rule({'match_category': 'Food', 'category': 'Food & Dining'}))
+    ruleset = rules.load_ruleset()
+
+    t0 = time.perf_counter()
+    _, matched, _ = rules.preview_rules(ruleset, limit=0)
+    evaluate_s = time.perf_counter() - t0
+    print(f"rows: {args.rows}, rules: {len(ruleset.rules)}")
+    print(f"evaluate whole history   {evaluate_s * 1000:8.0f} ms  ({args.rows / evaluate_s:8.0f} rows/s, {matched} to change)")
+
+    sample, _, _ = rules.preview_rules(ruleset, limit=1000)
+    t0 = time.perf_counter()
+    for row in sample:
+        database.update_transaction(row['id'], category=row['new_category'])
+    per_row_s = time.perf_counter() - t0
+    print(f"update_transaction loop  {per_row_s * 1000:8.0f} ms  ({len(sample) / per_row_s:8.0f} rows/s, {len(sample)} rows)")
+
+    t0 = time.perf_counter()
+    changed = sum(rules.apply_rules(ruleset).values())
+    apply_s = time.perf_counter() - t0
+    print(f"set-based apply          {apply_s * 1000:8.0f} ms  ({changed / apply_s:8.0f} rows/s, {changed} rows)")
+
+    batch = [{'description': f"Shop {rng.randrange(500)} (item {rng.randrange(50)})",
+              'amount': round(rng.uniform(20, 2500), 2), 'date': '2026-01-15', 'platform': 'K PLUS',
+              'category': 'Miscellaneous'} for _ in range(5000)]
+    t0 = time.perf_counter()
+    rules.categorize(batch, ruleset)
+    database.create_transactions(batch)
+    bulk_s = time.perf_counter() - t0
+    print(f"bulk import with rules   {bulk_s * 1000:8.0f} ms  ({len(batch) / bulk_s:8.0f} rows/s)")
+    database.stop_writers()
+
+
+def bench_profiling(args) -> None:
+    """Cost of the slow-query log and of profiling a request, on typical dashboard reads."""
+    path = os.path.join(args.workdir, 'bench_profiling.db')
+    seed_database(path, args.rows)
+    database.DB_PATH = path
+    database.init_db()
+
+    recent = {'email': 'ice@imice.im', 'date_from': '2025-12-01'}
+
+    def reads():
+        database.get_summary_by_category.uncached(recent)
+        database.get_summary_by_date.uncached(recent)
+        database.get_transactions(dict(recent, limit=500))
+
+    profiling.update_settings(slow_query_ms=None)
+    reads()
+    off_ms = timed(reads)
+    # A threshold nothing reaches measures the tracing alone
+    profiling.update_settings(slow_query_ms=1e9)
+    on_ms = timed(reads)
+    profiling.update_settings(slow_query_ms=None)
+
+    def sampled():
+        sampler = profiling.Sampler()
+        sampler.start()
+        reads()
+        sampler.stop()
+
+    sampled_ms = timed(sampled)
+    print(f"rows: {args.rows}, recent-window dashboard reads")
+    print(f"plain {off_ms:8.2f} ms   slow-query tracing {on_ms:8.2f} ms   sampling profiler {sampled_ms:8.2f} ms")
+
+
+# Child process for the startup benchmark: imports the app and runs the startup
+# work of one mode, printing a line as each stage is reached
+_STARTUP_SCRIPT = """
+import sys, threading
+mode, db_path, cache_path, profile_path = sys.argv[1:]
+from app import cache, database, profiling
+database.DB_PATH = db_path
+cache.CACHE_PATH = cache_path
+profiling.PROFILE_PATH = profile_path
+from app import main
+if mode == 'eager':
+    import app.ai_analyzer, pyarrow
+print('imported', flush=True)
+if mode == 'eager':
+    from app.distribution import init_distribution_sketches
+    from app.item_stats import init_item_stats
+    from app.rules import init_rules
+    from app.search import init_search_index
+    database.init_db()
+    init_rules()
+    init_search_index()
+    init_item_stats()
+    init_distribution_sketches()
+    database.prewarm_caches()
+    print('ready', flush=True)
+else:
+    database.bootstrap()
+    prewarm = threading.Thread(target=database.prewarm_caches)
+    prewarm.start()
+    print('ready', flush=True)
+    prewarm.join()
+print('warm', flush=True)
+"""
+
+
+def bench_startup(args) -> None:
+    """Time from process start until a worker can serve, and until its caches are warm."""
+    path = os.path.join(args.workdir, 'bench_startup.db')
+    seed_database(path, args.rows)
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = [0]
+
+    def start(mode: str, db_path: str):
+        runs[0] += 1
+        cache_path = os.path.join(args.workdir, f'bench_startup_cache_{runs[0]}.db')
+        profile_path = os.path.join(args.workdir, 'bench_startup_profile.db')
+        began = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, '-c', _STARTUP_SCRIPT, mode, db_path, cache_path, profile_path],
+                                cwd=here, stdout=subprocess.PIPE, text=True)
+        stages = {}
+        for line in proc.stdout:
+            stages[line.strip()] = (time.perf_counter() - began) * 1000
+        if proc.wait() != 0:
+            raise RuntimeError(f'{mode} startup failed')
+        return stages
+
+    def report(label: str, mode: str, db_path: str, repeat: int = 3):
+        results = [start(mode, db_path) for _ in range(repeat)]
+        best = {stage: min(r[stage] for r in results) for stage in ('imported', 'ready', 'warm')}
+        print(f"{label:<34} imported {best['imported']:8.1f} ms   ready {best['ready']:8.1f} ms   "
+              f"warm {best['warm']:8.1f} ms")
+
+    print(f"rows: {args.rows}, best of 3 process starts")
+    report("first boot (bootstrap runs)", 'lazy', path, repeat=1)
+    report("eager imports + full init, restart", 'eager', path)
+    report("lazy imports + bootstrap, restart", 'lazy', path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--rows', type=int, default=200000, help='Number of seeded transactions')
+    common.add_argument('--workdir', default=None,
+                        help='Directory for the seeded database and its cache files (default: temp dir)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def command(name, func, help):
+        command_parser = sub.add_parser(name, help=help, parents=[common])
+        command_parser.set_defaults(func=func)
+        return command_parser
+
+    command('dates', bench_dates, 'date_day/date_epoch columns vs per-row strftime')
+    command('serialize', bench_serialize, 'orjson vs default encoder, compressed sizes')
+    writes = command('writes', bench_writes, 'group-commit writer queue vs per-call commits')
+    writes.add_argument('--threads', type=int, default=16, help='Concurrent writers')
+    writes.add_argument('--writes', type=int, default=200, help='Writes per thread')
+    command('archive', bench_archive, 'hot table + yearly archives vs one full table')
+    command('items', bench_items, 'parsed_items cache vs parsing descriptions per read')
+    command('item-stats', bench_item_stats, 'monthly item rollups vs raw items aggregation')
+    command('distribution', bench_distribution, 'amount sketches vs exact per-category percentiles')
+    command('compare', bench_compare, 'one-pass period comparison vs per-window summaries')
+    command('rules', bench_rules, 'rule evaluation, set-based apply and bulk import')
+    command('profiling', bench_profiling, 'slow-query tracing and sampling profiler overhead')
+    command('startup', bench_startup, 'worker start-up time: eager init vs versioned bootstrap')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        args.workdir = args.workdir or tmp
+        # Never read from or write to the running service's cache and profile files
+        cache.CACHE_PATH = os.path.join(args.workdir, 'bench_cache.db')
+        profiling.PROFILE_PATH = os.path.join(args.workdir, 'bench_profile.db')
+        args.func(args)
+
+
+if __name__ == "__main__":
+    main()
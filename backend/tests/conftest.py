@@ -0,0 +1,73 @@
+"""
+Shared fixtures for the backend tests.
+
+Each test gets its own finance.db with the finance agent's schema, plus its
+own cache and profiling files, set up the way the server does on startup.
+"""
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import cache, database, profiling, shards  # noqa: E402
+
+# Tables owned by the finance agent; the dashboard adds its own on top
+AGENT_SCHEMA = '''
+    CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT,
+        amount REAL,
+        category TEXT,
+        description TEXT,
+        platform TEXT,
+        transaction_type TEXT DEFAULT 'expense',
+        email_user TEXT DEFAULT 'ice@imice.im'
+    );
+    CREATE TABLE items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        transaction_id INTEGER,
+        name TEXT,
+        quantity REAL DEFAULT 1,
+        unit_price REAL DEFAULT 0
+    );
+'''
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Path of a bootstrapped, empty finance.db."""
+    path = str(tmp_path / 'finance.db')
+    with sqlite3.connect(path) as conn:
+        conn.executescript(AGENT_SCHEMA)
+    monkeypatch.setattr(database, 'DB_PATH', path)
+    monkeypatch.setattr(cache, 'CACHE_PATH', str(tmp_path / 'cache.db'))
+    monkeypatch.setattr(profiling, 'PROFILE_PATH', str(tmp_path / 'profile.db'))
+    monkeypatch.setattr(shards, 'SHARD_DIR', None)
+    cache.clear()
+    database.bootstrap()
+    yield path
+    database.stop_writers()
+
+
+@pytest.fixture
+def agent(db):
+    """Connection writing to finance.db the way the finance agent does."""
+    conn = sqlite3.connect(db, isolation_level=None)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    """TestClient for the API on the `db` database."""
+    from fastapi.testclient import TestClient
+
+    from app import main
+
+    # Prewarming would outlive the test in its own thread
+    monkeypatch.setattr(main, 'prewarm_caches', lambda: None)
+    with TestClient(main.app) as client:
+        yield client
@@ -0,0 +1,66 @@
+import sqlite3
+
+from app import database
+
+
+def _triggers(path):
+    with sqlite3.connect(path) as conn:
+        return dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"))
+
+
+def test_restart_recreates_every_trigger(db, agent):
+    current = _triggers(db)
+    assert current
+    # Stand-ins with the same names, as left behind by an older version
+    for name in current:
+        agent.execute(f"DROP TRIGGER {name}")
+        agent.execute(f"CREATE TRIGGER {name} AFTER INSERT ON transactions BEGIN SELECT 1; END")
+    assert database._schema_version() == database.SCHEMA_VERSION
+
+    database.bootstrap()
+    assert _triggers(db) == current
+
+
+def test_restart_parses_items_of_agent_rows(db, agent):
+    agent.execute("INSERT INTO transactions (date, amount, category, description, platform, email_user) "
+                  "VALUES ('2025-01-05', 120, 'Food', 'Coffee 2x60', 'K PLUS', 'ice@imice.im')")
+    pending = "SELECT COUNT(*) FROM transactions WHERE id NOT IN (SELECT transaction_id FROM parsed_items)"
+    assert agent.execute(pending).fetchone()[0] == 1
+
+    database.bootstrap()
+    assert agent.execute(pending).fetchone()[0] == 0
+
+
+def test_bootstrap_before_the_agent_creates_its_tables(db, tmp_path, monkeypatch):
+    from conftest import AGENT_SCHEMA
+
+    path = str(tmp_path / 'empty.db')
+    monkeypatch.setattr(database, 'DB_PATH', path)
+    database.bootstrap()
+    assert database._schema_version() == 0
+
+    with sqlite3.connect(path) as conn:
+        conn.executescript(AGENT_SCHEMA)
+        conn.execute("INSERT INTO transactions (date, amount, category, description, platform) "
+                     "VALUES ('2025-01-05', 42, 'Food', 'noodles', 'K PLUS')")
+
+    database.bootstrap()
+    assert database._schema_version() == database.SCHEMA_VERSION
+    assert [t['description'] for t in database.get_transactions({'date_from': '2025-01-01'})] == ['noodles']
+
+
+def test_workers_skip_bootstrap_under_app_server(db, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import main
+
+    calls = []
+    monkeypatch.setattr(main, 'bootstrap', lambda: calls.append(1))
+    monkeypatch.setattr(main, 'prewarm_caches', lambda: None)
+    monkeypatch.setenv('FINANCE_BOOTSTRAPPED', '1')
+    with TestClient(main.app):
+        pass
+    monkeypatch.delenv('FINANCE_BOOTSTRAPPED')
+    with TestClient(main.app):
+        pass
+    assert calls == [1]
@@ -0,0 +1,49 @@
+import os
+import sqlite3
+
+from conftest import AGENT_SCHEMA
+
+from app import database
+
+
+def _new_db(path, amount):
+    with sqlite3.connect(path) as conn:
+        conn.executescript(AGENT_SCHEMA)
+    database.DB_PATH = path
+    database.bootstrap()
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO transactions (date, amount, category, description, platform) "
+                     "VALUES ('2025-01-05', ?, 'Bills', 'pay', 'K PLUS')", (amount,))
+
+
+def test_writes_invalidate_cached_results(db, agent):
+    assert database.get_balance()['expenses'] == 0
+    agent.execute("INSERT INTO transactions (date, amount, category, description, platform) "
+                  "VALUES ('2025-01-05', 10, 'Bills', 'pay', 'K PLUS')")
+    assert database.get_balance()['expenses'] == 10
+
+
+def test_databases_never_share_entries(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DB_PATH', database.DB_PATH)
+    a, b = str(tmp_path / 'a.db'), str(tmp_path / 'b.db')
+    _new_db(a, 10)
+    _new_db(b, 99999)
+    database.DB_PATH = a
+    generation = database.get_data_version()[1]
+    assert database.get_balance()['expenses'] == 10
+    database.DB_PATH = b
+    assert database.get_data_version()[1] == generation
+    assert database.get_balance()['expenses'] == 99999
+
+
+def test_recreated_database_is_not_served_old_entries(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DB_PATH', database.DB_PATH)
+    path = str(tmp_path / 'recreated.db')
+    _new_db(path, 10)
+    generation = database.get_data_version()[1]
+    assert database.get_balance()['expenses'] == 10
+
+    os.remove(path)
+    _new_db(path, 20)
+    assert database.get_data_version()[1] == generation
+    assert database.get_balance()['expenses'] == 20
@@ -0,0 +1,44 @@
+import pytest
+
+
+def _insert(agent, date, amount, category):
+    agent.execute("INSERT INTO transactions (date, amount, category, description, platform) "
+                  "VALUES (?, ?, ?, 'shop', 'K PLUS')", (date, amount, category))
+
+
+def test_compares_against_baseline_windows(client, agent):
+    _insert(agent, '2025-02-10', 300, 'Food')
+    _insert(agent, '2025-02-20', 100, 'Shopping')
+    _insert(agent, '2025-01-15', 200, 'Food')
+    _insert(agent, '2024-02-05', 50, 'Food')
+
+    body = client.get('/api/summary/compare', params=[
+        ('date_from', '2025-02-01'), ('date_to', '2025-02-28'), ('offset', '1M'), ('offset', '1Y'),
+    ]).json()
+    assert body['baselines'] == [
+        {'offset': '1M', 'date_from': '2025-01-01', 'date_to': '2025-01-28'},
+        {'offset': '1Y', 'date_from': '2024-02-01', 'date_to': '2024-02-28'},
+    ]
+    totals = {row['baseline']: row for row in body['data'] if row['dimension'] == 'total'}
+    assert (totals['1M']['current_total'], totals['1M']['baseline_total'], totals['1M']['delta']) == (400, 200, 200)
+    assert totals['1M']['pct_change'] == 100
+    assert (totals['1Y']['baseline_total'], totals['1Y']['baseline_count']) == (50, 1)
+    food = [row for row in body['data'] if row['dimension'] == 'category' and row['key'] == 'Food']
+    assert {row['baseline']: row['baseline_total'] for row in food} == {'1M': 200, '1Y': 50}
+
+
+@pytest.mark.parametrize('params', [
+    {'date_from': 'last month'},
+    {'date_from': '2025-02-01', 'date_to': '2025-13-01'},
+    {'date_from': '2025-03-01', 'date_to': '2025-02-01'},
+    {'date_from': '2025-02-01', 'offset': 'fortnight'},
+])
+def test_invalid_requests_are_rejected(client, params):
+    assert client.get('/api/summary/compare', params=params).status_code == 400
+
+
+@pytest.mark.parametrize('offset', ['99999999D', '99999Y', '999999999999999999999W'])
+def test_out_of_range_offsets_are_rejected(client, offset):
+    response = client.get('/api/summary/compare',
+                          params={'date_from': '2025-02-01', 'date_to': '2025-02-28', 'offset': offset})
+    assert response.status_code == 400
@@ -0,0 +1,50 @@
+from app import database
+
+
+def _insert(agent, date, amount=100.0):
+    agent.execute("INSERT INTO transactions (date, amount, category, description, platform) "
+                  "VALUES (?, ?, 'Food', 'lunch', 'K PLUS')", (date, amount))
+    return agent.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+
+def _day(agent, row_id):
+    return agent.execute("SELECT date(date_day * 86400, 'unixepoch') FROM transactions WHERE id = ?",
+                         (row_id,)).fetchone()[0]
+
+
+def test_unix_timestamps_are_normalized(agent):
+    # 2024-02-01 00:00:00 UTC, written both as an integer and as text
+    as_int = _insert(agent, 1706745600)
+    as_text = _insert(agent, '1706745600')
+    assert _day(agent, as_int) == '2024-02-01'
+    assert _day(agent, as_text) == '2024-02-01'
+
+    rows = database.get_transactions({'date_from': '2024-02-01', 'date_to': '2024-02-01'})
+    assert {t['id'] for t in rows} == {as_int, as_text}
+    assert database.get_summary_by_date({'date_from': '2024-02-01'}) == [
+        {'date': '2024-02-01', 'total': 200.0, 'count': 2}
+    ]
+
+
+def test_offset_dates_keep_their_local_day(agent):
+    row_id = _insert(agent, '2024-02-01T01:00:00+07:00')
+    assert _day(agent, row_id) == '2024-02-01'
+    rows = database.get_transactions({'date_from': '2024-02-01'})
+    assert [t['id'] for t in rows] == [row_id]
+
+
+def test_backfill_renormalizes_existing_rows(agent):
+    row_id = _insert(agent, '1706745600')
+    agent.execute("UPDATE transactions SET date_day = NULL, date_epoch = NULL WHERE id = ?", (row_id,))
+    agent.execute(f"PRAGMA user_version = {database.SCHEMA_VERSION - 1}")
+    with database.get_db_connection() as conn:
+        database._migrate_date_columns(conn.cursor())
+    assert _day(agent, row_id) == '2024-02-01'
+
+
+def test_internal_date_columns_are_not_returned(agent):
+    row_id = _insert(agent, '2024-02-01')
+    transaction = database.get_transaction_by_id(str(row_id))
+    assert transaction['date'] == '2024-02-01'
+    assert 'date_epoch' not in transaction and 'date_day' not in transaction
+    assert 'date_epoch' not in database.get_transactions()[0]
@@ -0,0 +1,60 @@
+import math
+import random
+
+import pytest
+
+from app.distribution import QUANTILES, RELATIVE_ACCURACY, get_amount_distribution
+
+CATEGORIES = ('Food', 'Shopping', 'Transportation')
+MERCHANTS = ('Cafe Amazon (latte)', 'Big C (rice, eggs)', 'GRAB ride', '7-Eleven', 'Makro')
+
+
+def _random_date(rng):
+    return f"2024-{rng.randint(1, 6):02d}-{rng.randint(1, 28):02d}"
+
+
+@pytest.fixture
+def history(agent):
+    rng = random.Random(7)
+    rows = [(_random_date(rng), round(math.exp(rng.uniform(0, 9)), 2), rng.choice(CATEGORIES), rng.choice(MERCHANTS))
+            for _ in range(600)]
+    agent.executemany("INSERT INTO transactions (date, amount, category, description, platform) "
+                      "VALUES (?, ?, ?, ?, 'K PLUS')", rows)
+    # Edits and deletes after the fact go through the sketch triggers
+    ids = [row[0] for row in agent.execute("SELECT id FROM transactions")]
+    for row_id in rng.sample(ids, 150):
+        agent.execute("UPDATE transactions SET amount = ?, category = ?, date = ? WHERE id = ?",
+                      (round(math.exp(rng.uniform(0, 9)), 2), rng.choice(CATEGORIES), _random_date(rng), row_id))
+    agent.execute("DELETE FROM transactions WHERE id IN (%s)" % ', '.join(map(str, rng.sample(ids, 100))))
+    return agent
+
+
+@pytest.mark.parametrize('filters', [
+    None,
+    {'date_from': '2024-02-10', 'date_to': '2024-05-20'},
+    {'date_from': '2024-03-01', 'date_to': '2024-03-31', 'category': ['Food']},
+])
+def test_counts_totals_and_quantiles_match_raw_sql(history, filters):
+    filters = filters or {}
+    where, params = "1=1", []
+    if filters.get('date_from'):
+        where += " AND date >= ? AND date <= ?"
+        params += [filters['date_from'], filters['date_to']]
+    if filters.get('category'):
+        where += " AND category IN (%s)" % ', '.join('?' * len(filters['category']))
+        params += filters['category']
+
+    result = {row['category']: row for row in get_amount_distribution(filters or None)}
+    expected = history.execute(f"SELECT category, COUNT(*), SUM(amount) FROM transactions WHERE {where} "
+                               "GROUP BY category", params).fetchall()
+    assert set(result) == {category for category, _, _ in expected}
+    for category, count, total in expected:
+        row = result[category]
+        assert row['count'] == count
+        assert row['total'] == pytest.approx(total)
+        amounts = [a for (a,) in history.execute(f"SELECT amount FROM transactions WHERE {where} AND category = ? "
+                                                 "ORDER BY amount", params + [category])]
+        for q in QUANTILES:
+            exact = amounts[int(q * (len(amounts) - 1))]
+            estimate = row['p' + format(q * 100, 'g')]
+            assert abs(estimate - exact) <= RELATIVE_ACCURACY * exact * (1 + 1e-9)
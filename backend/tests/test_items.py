@@ -0,0 +1,22 @@
+import pytest
+
+
+@pytest.mark.parametrize('path', ['/api/items/top', '/api/items/basket-size', '/api/summary/distribution'])
+@pytest.mark.parametrize('params', [{'date_from': 'garbage'}, {'date_to': '2024-13-01'}])
+def test_invalid_dates_are_rejected(client, path, params):
+    response = client.get(path, params=params)
+    assert response.status_code == 400
+    assert 'expected YYYY-MM-DD' in response.json()['detail']
+
+
+def test_invalid_price_history_dates_are_rejected(client):
+    assert client.get('/api/items/price-history', params={'name': 'latte', 'date_from': 'x'}).status_code == 400
+
+
+def test_valid_dates_still_work(client, agent):
+    agent.execute("INSERT INTO transactions (date, amount, category, description, platform) "
+                  "VALUES ('2024-02-10', 90, 'Food', 'cafe', 'K PLUS')")
+    agent.execute("INSERT INTO items (transaction_id, name, quantity, unit_price) VALUES (1, 'latte', 2, 45)")
+    response = client.get('/api/items/top', params={'date_from': '2024-02-01', 'date_to': '2024-02-29'})
+    assert response.status_code == 200
+    assert [(item['name'], item['spend']) for item in response.json()['data']] == [('latte', 90)]
@@ -0,0 +1,18 @@
+from datetime import date
+
+import pytest
+
+from app import database
+
+
+@pytest.mark.parametrize('today, expected', [
+    (date(2025, 6, 15), date(2025, 5, 15)),
+    (date(2025, 1, 31), date(2024, 12, 31)),
+    # Date.setMonth rolls "February 31" over into March
+    (date(2025, 3, 31), date(2025, 3, 3)),
+    (date(2024, 3, 31), date(2024, 3, 2)),
+    (date(2025, 5, 31), date(2025, 5, 1)),
+])
+def test_one_month_ago_matches_the_frontend(today, expected):
+    assert database._one_month_ago(today) == expected
+
@@ -0,0 +1,75 @@
+import logging
+import time
+
+import pytest
+
+from app import profiling
+
+
+@pytest.fixture(autouse=True)
+def profiling_off(db):
+    yield
+    # Settings are cached process-wide for a second; don't let them leak into other tests
+    profiling.update_settings(profile_all=False, slow_query_ms=None)
+
+
+def test_profile_header_stores_a_folded_profile(client):
+    assert 'x-profile-id' not in client.get('/api/transactions').headers
+
+    response = client.get('/api/transactions', headers={'X-Profile': '1'})
+    profile_id = response.headers['x-profile-id']
+    assert 'server-timing' in response.headers
+    assert profile_id in [p['id'] for p in client.get('/api/admin/profiles').json()['data']]
+
+    folded = client.get(f'/api/admin/profiles/{profile_id}')
+    assert folded.status_code == 200
+    for line in folded.text.splitlines():
+        stack, count = line.rsplit(' ', 1)
+        assert stack and int(count) > 0
+    assert client.get('/api/admin/profiles/missing').status_code == 404
+
+
+def test_admin_toggle_profiles_every_request(client):
+    assert client.get('/api/admin/profiling').json()['data'] == {'profile_all': False, 'slow_query_ms': None}
+
+    body = client.put('/api/admin/profiling', json={'profile_all': True, 'slow_query_ms': 250}).json()
+    assert body['data'] == {'profile_all': True, 'slow_query_ms': 250}
+    assert 'x-profile-id' in client.get('/api/transactions').headers
+    # Admin endpoints are never profiled
+    assert 'x-profile-id' not in client.get('/api/admin/profiles').headers
+
+    client.put('/api/admin/profiling', json={'profile_all': False})
+    assert client.get('/api/admin/profiling').json()['data'] == {'profile_all': False, 'slow_query_ms': 250}
+
+
+@pytest.mark.parametrize('threshold', [-1, 'fast', [5]])
+def test_admin_toggle_rejects_invalid_thresholds(client, threshold):
+    assert client.put('/api/admin/profiling', json={'slow_query_ms': threshold}).status_code == 400
+
+
+def test_slow_query_log_records_statements_with_their_plan(client):
+    client.put('/api/admin/profiling', json={'slow_query_ms': 0})
+    client.get('/api/transactions')
+
+    deadline = time.monotonic() + 5
+    queries = []
+    while not queries and time.monotonic() < deadline:
+        queries = [q for q in client.get('/api/admin/slow-queries').json()['data'] if 'transactions' in q['sql']]
+        time.sleep(0.05)
+    assert queries
+    assert all(q['duration_ms'] >= 0 and q['plan'] for q in queries)
+
+
+@pytest.mark.parametrize('value', ['fast', '-5', 'nan'])
+def test_invalid_env_threshold_falls_back_to_off(db, tmp_path, monkeypatch, caplog, value):
+    monkeypatch.setattr(profiling, 'PROFILE_PATH', str(tmp_path / 'fresh_profile.db'))
+    monkeypatch.setenv('FINANCE_SLOW_QUERY_MS', value)
+    with caplog.at_level(logging.WARNING, logger='app.profiling'):
+        assert profiling.get_settings(fresh=True)['slow_query_ms'] is None
+    assert 'FINANCE_SLOW_QUERY_MS' in caplog.text
+
+
+def test_env_threshold_sets_the_initial_threshold(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_PATH', str(tmp_path / 'fresh_profile.db'))
+    monkeypatch.setenv('FINANCE_SLOW_QUERY_MS', '12.5')
+    assert profiling.get_settings(fresh=True)['slow_query_ms'] == 12.5
@@ -0,0 +1,120 @@
+import gzip
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+from app import responses
+
+ROWS = [{'id': 1, 'amount': 10.5}, {'id': 2, 'amount': 3.0}]
+
+
+def _respond(accept=None):
+    headers = [(b'accept', accept.encode())] if accept is not None else []
+    return responses.columnar_response(Request({'type': 'http', 'headers': headers}), ROWS, count=2)
+
+
+@pytest.mark.parametrize('accept, media_type', [
+    (None, 'application/json'),
+    ('*/*', 'application/json'),
+    ('text/html,application/xhtml+xml,*/*;q=0.8', 'application/json'),
+    (responses.ARROW_MEDIA_TYPE, responses.ARROW_MEDIA_TYPE),
+    ('application/x-msgpack', 'application/x-msgpack'),
+    (f'application/json, {responses.ARROW_MEDIA_TYPE};q=0.5', 'application/json'),
+])
+def test_negotiated_format(accept, media_type):
+    response = _respond(accept)
+    assert response.media_type == media_type
+    assert response.headers['vary'] == 'Accept'
+
+
+def test_unavailable_format_is_not_acceptable(monkeypatch):
+    monkeypatch.setattr(responses, '_arrow_available', False)
+    with pytest.raises(HTTPException) as error:
+        _respond(responses.ARROW_MEDIA_TYPE)
+    assert error.value.status_code == 406
+    # A client that also takes JSON still gets JSON
+    assert _respond(f'{responses.ARROW_MEDIA_TYPE}, application/json;q=0.1').media_type == 'application/json'
+
+
+BODY = b'{"amount": 10.5}' * 100
+
+
+def _compressing_client(minimum_size=1024):
+    async def large(request):
+        return Response(BODY, media_type='application/json')
+
+    async def small(request):
+        return Response(BODY[:100], media_type='application/json')
+
+    async def streamed(request):
+        return StreamingResponse(iter([BODY, BODY]), media_type='application/json')
+
+    app = Starlette(routes=[Route('/large', large), Route('/small', small), Route('/streamed', streamed)])
+    return TestClient(responses.CompressionMiddleware(app, minimum_size=minimum_size))
+
+
+def _raw_get(client, path, accept_encoding):
+    with client.stream('GET', path, headers={'Accept-Encoding': accept_encoding}) as response:
+        return response.headers, b''.join(response.iter_raw())
+
+
+def _decompress(body, encoding):
+    if encoding == 'zstd':
+        return responses.zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    return gzip.decompress(body)
+
+
+@pytest.fixture(params=['zstd', 'gzip'])
+def codecs(request, monkeypatch):
+    """Run with zstandard installed and without it."""
+    if request.param == 'gzip':
+        monkeypatch.setattr(responses, 'zstandard', None)
+    elif responses.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    return request.param
+
+
+@pytest.mark.parametrize('accept_encoding, with_zstd, gzip_only', [
+    ('gzip', 'gzip', 'gzip'),
+    ('gzip, deflate, br', 'gzip', 'gzip'),
+    ('zstd, gzip', 'zstd', 'gzip'),
+    ('zstd;q=0.5, gzip', 'gzip', 'gzip'),
+    ('zstd, gzip;q=0', 'zstd', None),
+    ('*', 'zstd', 'gzip'),
+    ('br', None, None),
+    ('identity', None, None),
+    ('gzip;q=0', None, None),
+    ('', None, None),
+])
+def test_compression_negotiation(codecs, accept_encoding, with_zstd, gzip_only):
+    expected = with_zstd if codecs == 'zstd' else gzip_only
+    headers, body = _raw_get(_compressing_client(), '/large', accept_encoding)
+    assert headers.get('content-encoding') == expected
+    if expected:
+        assert _decompress(body, expected) == BODY
+        assert int(headers['content-length']) == len(body) < len(BODY)
+        assert 'Accept-Encoding' in headers['vary']
+    else:
+        assert body == BODY
+        assert 'vary' not in headers
+
+
+def test_bodies_below_minimum_size_are_not_compressed():
+    client = _compressing_client(minimum_size=len(BODY))
+    headers, body = _raw_get(client, '/small', 'gzip')
+    assert 'content-encoding' not in headers
+    assert body == BODY[:100]
+    # The threshold itself is inclusive
+    headers, body = _raw_get(client, '/large', 'gzip')
+    assert headers['content-encoding'] == 'gzip' and gzip.decompress(body) == BODY
+
+
+def test_streaming_responses_pass_through():
+    headers, body = _raw_get(_compressing_client(), '/streamed', 'gzip')
+    assert 'content-encoding' not in headers
+    assert body == BODY * 2
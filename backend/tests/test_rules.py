@@ -0,0 +1,73 @@
+import pytest
+
+
+@pytest.mark.parametrize('rule', [
+    {'category': 'Food', 'min_amount': [1]},
+    {'category': 'Food', 'max_amount': 'lots'},
+    {'category': 'Food', 'priority': {'high': True}},
+    {'category': ['Food']},
+    {'category': 'Food', 'platform': 7},
+    {'category': 'Food'},
+    {'category': 'Food', 'patterns': [], 'platform': ''},
+    'Food',
+])
+def test_invalid_rules_are_rejected(client, rule):
+    assert client.post('/api/rules', json=rule).status_code in (400, 422)
+    assert client.post('/api/rules/preview', json={'rule': rule}).status_code == 400
+
+
+@pytest.mark.parametrize('body', [
+    {'limit': 'ten'},
+    {'limit': [1]},
+    {'rule_ids': 'all'},
+    {'date_from': ['2024-01-01']},
+])
+def test_invalid_preview_requests_are_rejected(client, body):
+    assert client.post('/api/rules/preview', json=body).status_code == 400
+
+
+def test_update_cannot_remove_every_condition(client):
+    rule = client.post('/api/rules', json={'platform': 'K PLUS', 'category': 'Food'}).json()['data']
+    assert client.put(f"/api/rules/{rule['id']}", json={'platform': None}).status_code == 400
+    assert client.put(f"/api/rules/{rule['id']}", json={'platform': None, 'patterns': ['grab']}).status_code == 200
+
+
+def test_apply_recategorizes_matching_rows(client, agent):
+    agent.execute("INSERT INTO transactions (date, amount, category, description, platform) "
+                  "VALUES ('2024-02-01', 60, 'Miscellaneous', 'GRAB ride home', 'K PLUS')")
+    agent.execute("INSERT INTO transactions (date, amount, category, description, platform) "
+                  "VALUES ('2023-02-01', 60, 'Miscellaneous', 'GRAB ride to work', 'K PLUS')")
+    rule = client.post('/api/rules', json={'patterns': ['grab'], 'category': 'Transportation'}).json()['data']
+
+    preview = client.post('/api/rules/preview', json={'date_from': '2024-01-01', 'limit': '5'}).json()
+    assert preview['count'] == 1
+    applied = client.post('/api/rules/apply', json={'date_from': '2024-01-01'}).json()
+    assert applied['rules'] == [{'rule_id': rule['id'], 'count': 1}]
+    categories = dict(agent.execute("SELECT date, category FROM transactions").fetchall())
+    assert categories == {'2024-02-01': 'Transportation', '2023-02-01': 'Miscellaneous'}
+
+
+@pytest.mark.parametrize('row', [
+    {'description': 'noodles', 'amount': 'abc', 'date': '2025-01-05'},
+    {'description': None, 'amount': 42, 'date': '2025-01-05'},
+    {'description': 'noodles', 'amount': True, 'date': '2025-01-05'},
+    {'description': 'noodles', 'amount': 42, 'date': 'yesterday'},
+    {'description': 'noodles', 'amount': 42, 'date': 20250105},
+    {'description': 'noodles', 'amount': 42, 'date': '2025-01-05', 'platform': 7},
+    {'description': 'noodles', 'amount': 42},
+])
+def test_invalid_bulk_rows_are_rejected(client, agent, row):
+    response = client.post('/api/transactions/bulk', json={'transactions': [row]})
+    assert response.status_code == 400
+    assert agent.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 0
+
+
+def test_bulk_import_applies_rules(client, agent):
+    client.post('/api/rules', json={'patterns': ['grab'], 'category': 'Transportation'})
+    response = client.post('/api/transactions/bulk', json={'transactions': [
+        {'description': 'GRAB ride home', 'amount': 60, 'date': '2025-01-05'},
+        {'description': 'noodles', 'amount': 42.5, 'date': '2025-01-05 12:30:00', 'platform': 'K PLUS'},
+    ]})
+    assert response.json()['recategorized'] == 1
+    rows = agent.execute("SELECT description, category FROM transactions ORDER BY id").fetchall()
+    assert rows == [('GRAB ride home', 'Transportation'), ('noodles', 'Miscellaneous')]
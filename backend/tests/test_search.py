@@ -0,0 +1,60 @@
+import os
+import sqlite3
+from datetime import date
+
+import pytest
+
+from app import archive, database
+from app.search import search_transactions
+
+
+def _insert(agent, date, description):
+    agent.execute("INSERT INTO transactions (date, amount, category, description, platform) "
+                  "VALUES (?, 50, 'Food', ?, 'K PLUS')", (date, description))
+
+
+def test_results_across_archives_are_newest_first(db, agent, tmp_path):
+    _insert(agent, '2022-05-01', 'coffee')
+    _insert(agent, '2022-06-01', 'coffee coffee coffee beans')
+    _insert(agent, '2025-01-01', 'coffee')
+    _insert(agent, '2025-02-01', 'iced coffee with milk and sugar')
+    archive.archive_before(db, str(tmp_path / 'archive'), archive.cutoff_day(1, date(2024, 1, 15)))
+
+    assert os.listdir(tmp_path / 'archive')
+    dates = [row['date'] for row in search_transactions('coffee')['data']]
+    assert dates == ['2025-02-01', '2025-01-01', '2022-06-01', '2022-05-01']
+    second_page = search_transactions('coffee', page=2, page_size=3)
+    assert [row['date'] for row in second_page['data']] == ['2022-05-01']
+    assert second_page['total'] == 4
+
+
+def test_archives_are_not_written_to_when_read(db, agent, tmp_path):
+    _insert(agent, '2022-05-01', 'Market (eggs, rice)')
+    archive.archive_before(db, str(tmp_path / 'archive'), archive.cutoff_day(1, date(2024, 1, 15)))
+    archive_path = str(tmp_path / 'archive' / archive.archive_filename(2022))
+    with sqlite3.connect(archive_path) as conn:
+        conn.execute("DELETE FROM parsed_items")
+    mtime = os.stat(archive_path).st_mtime_ns
+
+    rows = database.get_transactions({'date_from': '2022-01-01', 'date_to': '2022-12-31'})
+    assert [item['name'] for item in rows[0]['items']] == ['eggs', 'rice']
+    database.stop_writers()
+    assert os.stat(archive_path).st_mtime_ns == mtime
+    with sqlite3.connect(archive_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM parsed_items").fetchone()[0] == 0
+
+
+def test_highlights_escape_description_text(db, agent):
+    _insert(agent, '2025-01-01', '<img src=x onerror=alert(1)> coffee & cake')
+    row = search_transactions('coffee')['data'][0]
+    assert row['description_highlight'] == '&lt;img src=x onerror=alert(1)&gt; <mark>coffee</mark> &amp; cake'
+    assert row['description'] == '<img src=x onerror=alert(1)> coffee & cake'
+
+
+def test_short_terms_are_highlighted(db, agent):
+    _insert(agent, '2025-01-01', 'KFC <b>7-11</b>')
+    with database.get_db_connection() as conn:
+        if 'trigram' not in conn.execute("SELECT sql FROM sqlite_master WHERE name='transactions_fts'").fetchone()[0]:
+            pytest.skip("short terms only take the LIKE path with the trigram tokenizer")
+    row = search_transactions('kf 7')['data'][0]
+    assert row['description_highlight'] == '<mark>KF</mark>C &lt;b&gt;<mark>7</mark>-11&lt;/b&gt;'
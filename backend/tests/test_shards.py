@@ -0,0 +1,93 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database, shards
+
+
+@pytest.fixture
+def sharded(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(shards, 'SHARD_DIR', str(tmp_path / 'shards'))
+    monkeypatch.setattr(shards, 'SYNC_INTERVAL', 0)
+    database.bootstrap()
+    return db
+
+
+def _agent_insert(db, description):
+    with sqlite3.connect(db) as conn:
+        conn.execute("INSERT INTO transactions (date, amount, category, description, platform, email_user) "
+                     "VALUES ('2025-01-05', 42, 'Food', ?, 'K PLUS', 'ice@imice.im')", (description,))
+
+
+def test_agent_rows_reach_the_shards(sharded):
+    _agent_insert(sharded, 'noodles')
+    shards.sync_periodically(threading.Event())
+    assert [t['description'] for t in database.get_transactions({'email': 'ice@imice.im'})] == ['noodles']
+    # Nothing is copied twice
+    assert shards.sync(sharded) == {}
+
+
+def test_server_syncs_on_startup(sharded, monkeypatch):
+    from app import main
+
+    # Prewarming would outlive the test in its own thread
+    monkeypatch.setattr(main, 'prewarm_caches', lambda: None)
+    _agent_insert(sharded, 'khao soi')
+    with TestClient(main.app) as client:
+        for _ in range(50):
+            data = client.get('/api/transactions', params={'email': 'ice@imice.im'}).json()['data']
+            if data:
+                break
+            time.sleep(0.05)
+    assert [t['description'] for t in data] == ['khao soi']
+
+
+def test_allocate_id_without_a_sequence_row(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'plain.db'))
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE transactions (id INTEGER PRIMARY KEY, description TEXT)")
+    cursor.execute("INSERT INTO transactions (id, description) VALUES (7, 'agent row')")
+    shards.init_directory(cursor)
+    assert shards.allocate_id(cursor, 'transactions', 'ice@imice.im') == 8
+    assert shards.allocate_id(cursor, 'transactions', 'ice@imice.im') == 9
+
+
+def test_allocate_id_seeds_an_empty_autoincrement_sequence(db):
+    conn = sqlite3.connect(db)
+    cursor = conn.cursor()
+    shards.init_directory(cursor)
+    new_id = shards.allocate_id(cursor, 'transactions', 'ice@imice.im')
+    cursor.execute("INSERT INTO transactions (description) VALUES ('agent row')")
+    assert cursor.lastrowid > new_id
+
+
+def test_agent_updates_and_deletes_reach_the_shards(sharded):
+    _agent_insert(sharded, 'noodles')
+    _agent_insert(sharded, 'khao soi')
+    with sqlite3.connect(sharded) as conn:
+        conn.execute("INSERT INTO items (transaction_id, name, quantity, unit_price) "
+                     "SELECT id, 'noodle soup', 1, 42 FROM transactions WHERE description = 'noodles'")
+    shards.sync(sharded)
+
+    with sqlite3.connect(sharded) as conn:
+        conn.execute("UPDATE transactions SET amount = 99, category = 'Shopping', date = '2025-02-01' "
+                     "WHERE description = 'noodles'")
+        conn.execute("UPDATE items SET name = 'pad thai', unit_price = 99")
+        conn.execute("DELETE FROM transactions WHERE description = 'khao soi'")
+    assert shards.sync(sharded) == {'ice@imice.im': 0}
+
+    rows = database.get_transactions({'email': 'ice@imice.im'})
+    assert [(t['description'], t['amount'], t['category']) for t in rows] == [('noodles', 99, 'Shopping')]
+    assert [t['description'] for t in database.get_transactions({'email': 'ice@imice.im',
+                                                                 'date_from': '2025-02-01'})] == ['noodles']
+    shard = sqlite3.connect(shards.shard_path(shards.shard_filename('ice@imice.im')))
+    assert shard.execute("SELECT name, unit_price FROM items").fetchall() == [('pad thai', 99)]
+    # Rollups maintained by the shard's own triggers follow the replayed changes
+    assert shard.execute("SELECT n.name, s.month, s.spend FROM item_monthly_stats s "
+                         "JOIN item_names n ON n.id = s.name_id WHERE s.lines > 0").fetchall() == \
+        [('pad thai', '2025-02', 99)]
+    with sqlite3.connect(sharded) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM shard_changes").fetchone()[0] == 0
@@ -0,0 +1,65 @@
+import sqlite3
+import time
+from concurrent.futures import TimeoutError
+
+import pytest
+
+from app import writer as writer_module
+from app.writer import WriteQueue
+
+
+def _insert(cursor, value):
+    cursor.execute("INSERT INTO t (v) VALUES (?)", (value,))
+    return cursor.lastrowid
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'w.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE t (v INTEGER)")
+    return path
+
+
+def test_failed_connect_fails_the_batch_and_recovers(path):
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise sqlite3.OperationalError("unable to open database file")
+        return sqlite3.connect(path, check_same_thread=False)
+
+    queue = WriteQueue(connect)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            queue.call(_insert, 1)
+        assert queue.call(_insert, 2) == 1
+    finally:
+        queue.stop()
+
+
+def test_failure_outside_a_job_does_not_stall_the_queue(path):
+    def breaks_savepoint(cursor):
+        # Leaves nothing for the queue's own RELEASE, which then raises
+        cursor.execute("RELEASE job")
+
+    queue = WriteQueue(lambda: sqlite3.connect(path, check_same_thread=False))
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            queue.call(breaks_savepoint)
+        assert queue.call(_insert, 3)
+    finally:
+        queue.stop()
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT v FROM t").fetchall() == [(3,)]
+
+
+def test_callers_stop_waiting_after_the_timeout(path, monkeypatch):
+    monkeypatch.setattr(writer_module, 'WRITE_TIMEOUT', 0.05)
+    queue = WriteQueue(lambda: sqlite3.connect(path, check_same_thread=False))
+    try:
+        with pytest.raises(TimeoutError):
+            queue.call(lambda cursor: time.sleep(0.3))
+    finally:
+        queue.stop()
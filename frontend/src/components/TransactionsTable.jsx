@@ -2,9 +2,15 @@ import React, { useState, useEffect } from 'react'
 import { MoreHorizontal, Search, ChevronDown, ChevronUp, Loader2, Download, Edit, Trash2 } from 'lucide-react'
 import { EditModal } from './EditModal'
 
+// Search hits fetched per "Load more"
+const SEARCH_PAGE_SIZE = 100
+
 export function TransactionsTable({ filters, platformFilter, categoryFilter, userEmail }) {
   const [transactions, setTransactions] = useState([])
   const [filter, setFilter] = useState('')
+  // Server-side search results: { query, data, total, page }; null while the search box is empty
+  const [searchResults, setSearchResults] = useState(null)
+  const [searching, setSearching] = useState(false)
   const [loading, setLoading] = useState(true)
   const [expandedRows, setExpandedRows] = useState(new Set())
   const [sortBy, setSortBy] = useState('date')
@@ -51,6 +57,68 @@ export function TransactionsTable({ filters, platformFilter, categoryFilter, use
     fetchTransactions();
   }, [filters, platformFilter, categoryFilter, userEmail])
 
+  const fetchSearchPage = async (query, page) => {
+    const params = new URLSearchParams();
+    params.append('q', query);
+    params.append('page', String(page));
+    params.append('page_size', String(SEARCH_PAGE_SIZE));
+    if (filters?.from) params.append('date_from', filters.from);
+    if (filters?.to) params.append('date_to', filters.to);
+    if (platformFilter && platformFilter !== 'all') params.append('platform', platformFilter);
+    if (userEmail) params.append('email', userEmail);
+    if (categoryFilter && categoryFilter.length > 0) {
+      categoryFilter.forEach(cat => params.append('category', cat));
+    }
+
+    const response = await fetch(`/api/search?${params.toString()}`);
+    return response.json();
+  }
+
+  useEffect(() => {
+    const query = filter.trim()
+    if (!query) {
+      setSearchResults(null)
+      setSearching(false)
+      return
+    }
+    // Earlier results stay on screen until the new ones arrive; responses for
+    // an outdated query are dropped
+    let cancelled = false
+    setSearching(true)
+    // Wait for a pause in typing before hitting /api/search
+    const timer = setTimeout(async () => {
+      try {
+        const data = await fetchSearchPage(query, 1);
+        if (!cancelled) setSearchResults({ query, data: data.data || [], total: data.total || 0, page: 1 })
+      } catch (error) {
+        console.error('Error searching transactions:', error)
+      } finally {
+        if (!cancelled) setSearching(false)
+      }
+    }, 250)
+    return () => {
+      cancelled = true
+      clearTimeout(timer)
+    }
+  }, [filter, filters, platformFilter, categoryFilter, userEmail])
+
+  const loadMoreResults = async () => {
+    if (!searchResults || searching) return
+    const { query, page } = searchResults
+    setSearching(true)
+    try {
+      const data = await fetchSearchPage(query, page + 1);
+      // Ignore the page if the search changed meanwhile
+      setSearchResults(current => current && current.query === query && current.page === page
+        ? { ...current, data: [...current.data, ...(data.data || [])], total: data.total || 0, page: page + 1 }
+        : current)
+    } catch (error) {
+      console.error('Error searching transactions:', error)
+    } finally {
+      setSearching(false)
+    }
+  }
+
   const toggleRow = (id) => {
     const newExpanded = new Set(expandedRows)
     if (newExpanded.has(id)) {
@@ -191,10 +259,18 @@ export function TransactionsTable({ filters, platformFilter, categoryFilter, use
     URL.revokeObjectURL(url)
   }
 
-  const filteredTransactions = sortTransactions(transactions).filter(transaction =>
-    transaction.description?.toLowerCase().includes(filter.toLowerCase()) ||
-    transaction.category?.toLowerCase().includes(filter.toLowerCase())
-  )
+  // Descriptions and item names are matched by /api/search; category names are still matched locally
+  const searchedTransactions = () => {
+    if (!filter.trim()) return transactions
+    const matches = searchResults?.data || []
+    const ids = new Set(matches.map(t => t.id))
+    const byCategory = transactions.filter(t =>
+      !ids.has(t.id) && t.category?.toLowerCase().includes(filter.trim().toLowerCase())
+    )
+    return [...matches, ...byCategory]
+  }
+
+  const filteredTransactions = sortTransactions(searchedTransactions())
 
   const formatCurrency = (val) => "฿" + Number(val).toLocaleString(undefined, { minimumFractionDigits: 2 });
 
@@ -351,8 +427,26 @@ export function TransactionsTable({ filters, platformFilter, categoryFilter, use
           </tbody>
         </table>
       </div>
-      <div className="mt-4 pt-4 border-t border-gray-100 dark:border-gray-700 text-xs text-gray-400 dark:text-gray-500 italic animate-fadeIn">
-        Total {filteredTransactions.length} records found
+      <div className="mt-4 pt-4 border-t border-gray-100 dark:border-gray-700 text-xs text-gray-400 dark:text-gray-500 italic animate-fadeIn flex items-center gap-3">
+        {searchResults ? (
+          <span>
+            Showing {searchResults.data.length} of {searchResults.total} matches
+            {filteredTransactions.length > searchResults.data.length &&
+              ` (+${filteredTransactions.length - searchResults.data.length} by category)`}
+          </span>
+        ) : (
+          <span>Total {filteredTransactions.length} records found</span>
+        )}
+        {searching && <Loader2 className="w-3 h-3 animate-spin" />}
+        {searchResults && searchResults.data.length < searchResults.total && (
+          <button
+            onClick={loadMoreResults}
+            disabled={searching}
+            className="not-italic px-3 py-1 rounded-md bg-gray-100 dark:bg-gray-700 text-gray-600 dark:text-gray-300 hover:bg-gray-200 dark:hover:bg-gray-600 transition-colors disabled:opacity-50"
+          >
+            Load more
+          </button>
+        )}
       </div>
 
       {/* Edit Modal */}
@@ -50,6 +50,10 @@ export const api = {
     const response = await axios.delete(`${API_BASE_URL}/api/transactions/${transactionId}/items/${itemId}`)
     return response.data
   },
+  createTransactions: async (transactions, applyRules = true) => {
+    const response = await axios.post(`${API_BASE_URL}/api/transactions/bulk`, { transactions, apply_rules: applyRules })
+    return response.data
+  },
   getCategorySummary: async (filters = {}) => {
     const response = await axios.get(`${API_BASE_URL}/api/summary/category`, { params: filters })
     return response.data
@@ -58,6 +62,53 @@ export const api = {
     const response = await axios.get(`${API_BASE_URL}/api/summary/date`, { params: filters })
     return response.data
   },
+  getPeriodComparison: async (filters = {}) => {
+    const response = await axios.get(`${API_BASE_URL}/api/summary/compare`, {
+      params: filters,
+      paramsSerializer: { indexes: null }
+    })
+    return response.data
+  },
+  getDistributionSummary: async (filters = {}) => {
+    const response = await axios.get(`${API_BASE_URL}/api/summary/distribution`, { params: filters })
+    return response.data
+  },
+  getTopItems: async (filters = {}) => {
+    const response = await axios.get(`${API_BASE_URL}/api/items/top`, { params: filters })
+    return response.data
+  },
+  getItemPriceHistory: async (name, filters = {}) => {
+    const response = await axios.get(`${API_BASE_URL}/api/items/price-history`, { params: { name, ...filters } })
+    return response.data
+  },
+  getBasketSizes: async (filters = {}) => {
+    const response = await axios.get(`${API_BASE_URL}/api/items/basket-size`, { params: filters })
+    return response.data
+  },
+  getRules: async () => {
+    const response = await axios.get(`${API_BASE_URL}/api/rules`)
+    return response.data
+  },
+  createRule: async (data) => {
+    const response = await axios.post(`${API_BASE_URL}/api/rules`, data)
+    return response.data
+  },
+  updateRule: async (ruleId, data) => {
+    const response = await axios.put(`${API_BASE_URL}/api/rules/${ruleId}`, data)
+    return response.data
+  },
+  deleteRule: async (ruleId) => {
+    const response = await axios.delete(`${API_BASE_URL}/api/rules/${ruleId}`)
+    return response.data
+  },
+  previewRules: async (body = {}) => {
+    const response = await axios.post(`${API_BASE_URL}/api/rules/preview`, body)
+    return response.data
+  },
+  applyRules: async (body = {}) => {
+    const response = await axios.post(`${API_BASE_URL}/api/rules/apply`, body)
+    return response.data
+  },
   getCategories: async () => {
     const response = await axios.get(`${API_BASE_URL}/api/categories`)
     return response.data